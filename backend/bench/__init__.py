@@ -0,0 +1,5 @@
+"""
+マイクロベンチマーク
+
+backend/ ディレクトリで `python -m bench [suite ...]` として実行します（詳しくは bench/__main__.py）。
+"""
@@ -0,0 +1,78 @@
+"""
+ベンチマークの実行と基準値（baseline.json）との比較
+
+    python -m bench                    # 全スイートを実行し、基準値との差分（%）を表示
+    python -m bench parser ranking     # 指定したスイートのみ実行
+    python -m bench --update           # 実行結果で baseline.json を更新
+    python -m bench --fail-over 20     # 基準値より20%以上遅い項目があれば終了コード1
+"""
+import argparse
+import importlib
+import json
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+
+SUITES = ["normalize", "parser", "estat", "ranking", "leaderboard", "receipts", "startup", "units"]
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+
+def _load_baseline() -> dict[str, float]:
+    if not BASELINE_PATH.exists():
+        return {}
+    data = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+    return {k: float(v) for k, v in data.get("results", {}).items()}
+
+
+def _save_baseline(results: dict[str, float]) -> None:
+    merged = _load_baseline() | results
+    data = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+            "unit": "microseconds per operation",
+        },
+        "results": {k: round(v, 3) for k, v in sorted(merged.items())},
+    }
+    BASELINE_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    parser.add_argument("suites", nargs="*", choices=SUITES, help="実行するスイート（省略時は全て）")
+    parser.add_argument("--update", action="store_true", help="結果を baseline.json に保存する")
+    parser.add_argument("--fail-over", type=float, default=None, help="この割合（%%）以上遅くなったら失敗とする")
+    args = parser.parse_args()
+
+    baseline = _load_baseline()
+    results: dict[str, float] = {}
+    regressions: list[str] = []
+
+    for suite in args.suites or SUITES:
+        module = importlib.import_module(f"bench.{suite}")
+        for name, us in module.run().items():
+            key = f"{suite}.{name}"
+            results[key] = us
+            base = baseline.get(key)
+            if base:
+                delta = (us - base) / base * 100
+                print(f"{key:<45} {us:14.2f} us  (baseline {base:12.2f} us, {delta:+7.1f}%)")
+                if args.fail_over is not None and delta >= args.fail_over:
+                    regressions.append(key)
+            else:
+                print(f"{key:<45} {us:14.2f} us  (no baseline)")
+
+    if args.update:
+        _save_baseline(results)
+        print(f"baseline updated: {BASELINE_PATH}")
+
+    if regressions:
+        print(f"regressions over {args.fail_over}%: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+"""
+e-Stat メタデータ解析（extract_class_maps）のベンチマーク
+    python -m bench estat
+"""
+from schemas import EStatClient
+
+from bench.fixtures import synthetic_meta
+from bench.timing import measure
+
+
+def run() -> dict[str, float]:
+    """各処理の1回あたり時間（マイクロ秒）を返します。"""
+    client = EStatClient()
+    meta = synthetic_meta()
+
+    return {
+        "extract_class_maps.25k_classes": measure(lambda: client.extract_class_maps(meta), 5),
+    }
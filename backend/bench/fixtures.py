@@ -0,0 +1,161 @@
+"""
+ベンチマーク用の合成データ
+
+小売物価統計調査（e-Stat）の品目分類・メタデータと、ランキングの行を
+実データに近い規模・表記で生成します。乱数は固定シードで再現可能です。
+"""
+import random
+import uuid
+from typing import Any
+
+from services.leaderboard import UserTotals
+
+# 小売物価統計調査の品目名に近い表記
+ESTAT_ITEM_NAMES: list[str] = [
+    "うるち米(単一原料米,「コシヒカリ」)", "うるち米(単一原料米,「コシヒカリ」を除く)", "食パン", "あんパン",
+    "カレーパン", "ゆでうどん", "干しうどん", "スパゲッティ", "即席めん(カップ麺)", "即席めん(袋麺)",
+    "まぐろ", "あじ", "いわし", "かつお", "さけ", "さば", "さんま", "たい", "ぶり", "いか", "えび",
+    "あさり", "かき(貝)", "しじみ", "ほたて貝", "塩さけ", "たらこ", "しらす干し", "さば缶詰",
+    "まぐろ缶詰", "牛肉(国産品,ロース)", "牛肉(輸入品,肩肉)", "豚肉(国産品,ばら)", "豚肉(国産品,もも)",
+    "鶏肉", "ハム", "ソーセージ", "ベーコン", "牛乳", "粉ミルク", "ヨーグルト", "バター", "チーズ",
+    "鶏卵", "キャベツ", "ほうれんそう", "はくさい", "ねぎ", "レタス", "ブロッコリー", "もやし",
+    "アスパラガス", "さつまいも", "じゃがいも", "さといも", "だいこん", "にんじん", "ごぼう", "たまねぎ",
+    "れんこん", "しょうが", "生しいたけ", "えのきだけ", "しめじ", "かぼちゃ", "きゅうり", "なす",
+    "トマト", "ピーマン", "りんご(ふじ)", "りんご(つがる)", "みかん", "グレープフルーツ", "オレンジ",
+    "なし", "ぶどう(巨峰)", "かき", "もも", "すいか", "メロン", "いちご", "バナナ", "キウイフルーツ",
+    "食用油", "マーガリン", "しょう油", "みそ", "砂糖", "酢", "ソース", "ケチャップ", "マヨネーズ",
+    "アイスクリーム", "チョコレート", "ポテトチップス", "緑茶(煎茶)", "紅茶(ティーバッグ)",
+    "インスタントコーヒー", "ミネラルウォーター", "ビール", "発泡酒", "ティシュペーパー", "トイレットペーパー",
+]
+
+# レシートに印字される品目名（略称・半角カナ・数量付き）
+RECEIPT_NAMES: list[str] = [
+    "ｷｬﾍﾞﾂ 1玉", "玉ねぎ 3コ", "国産豚バラ切落し", "タマゴ Lサイズ10コ", "明治おいしい牛乳 1000ml",
+    "超熟 食パン 6枚", "カップヌードル", "サバ水煮缶 190g", "ﾊﾞﾅﾅ", "じゃがいも 袋", "きつねうどん",
+    "ｱｲｽｸﾘｰﾑ ﾊﾞﾆﾗ", "トマト 2コ", "しめじ", "特売 鶏むね肉", "ヨーグルト 400g", "謎の商品A",
+]
+
+
+def synthetic_class_maps(variants: int = 6) -> dict[str, dict[str, str]]:
+    """
+    品目（cat01）・規格（cat02）・地域・時間を含む分類マップを生成します。
+    品目ごとに銘柄・規格違いの派生名を作り、数百〜数千件規模にします。
+    """
+    cat01: dict[str, str] = {}
+    cat02: dict[str, str] = {}
+    for i, name in enumerate(ESTAT_ITEM_NAMES):
+        code = f"01{i:03d}"
+        cat01[f"{1000 + i} {name}"] = code
+        for v in range(variants):
+            cat02[f"{1000 + i}{v} {name}【銘柄{v}】({100 * (v + 1)}g)"] = f"{code}{v}"
+    return {
+        "tab": {"価格": "01"},
+        "cat01": cat01,
+        "cat02": cat02,
+        "area": {"全国": "00000", "東京都区部": "13100"},
+        "time": {f"{y}年{m}月": f"{y}00{m:02d}{m:02d}" for y in range(2020, 2026) for m in range(1, 13)},
+    }
+
+
+def synthetic_meta(classes_per_obj: int = 5000) -> dict[str, Any]:
+    """getMetaInfo のレスポンスを模した大きなメタデータを生成します。"""
+    class_objs = []
+    for obj_id in ("tab", "cat01", "cat02", "area", "time"):
+        classes = [
+            {"@code": f"{obj_id}{i:06d}", "@name": f"{i} {ESTAT_ITEM_NAMES[i % len(ESTAT_ITEM_NAMES)]}", "@level": "1"}
+            for i in range(classes_per_obj)
+        ]
+        class_objs.append({"@id": obj_id, "@name": obj_id, "CLASS": classes})
+    return {"GET_META_INFO": {"METADATA_INF": {"CLASS_INF": {"CLASS_OBJ": class_objs}}}}
+
+
+def synthetic_ranking_rows(limit: int, seed: int = 42) -> list[dict[str, Any]]:
+    """get_ranking の結果（上位 limit 名 + is_me=true の自分の行）を生成します。"""
+    rng = random.Random(seed)
+    rows: list[dict[str, Any]] = []
+    net = 200_000
+    for rank in range(1, limit + 1):
+        net -= rng.randrange(0, 2000)
+        rows.append({
+            "rank": rank,
+            "user_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "nickname": f"user{rank}" if rank % 3 else None,
+            "total_saved": net,
+            "total_overpaid": rng.randrange(0, 50_000),
+            "is_me": False,
+        })
+    rows.append({
+        "rank": 54_321,
+        "user_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "nickname": "me",
+        "total_saved": 1234,
+        "total_overpaid": 567,
+        "is_me": True,
+    })
+    return rows
+
+
+def synthetic_user_totals(users: int, seed: int = 42) -> dict[str, UserTotals]:
+    """user_savings_totals 相当のユーザーごとの合計（user_id → UserTotals）を生成します。"""
+    rng = random.Random(seed)
+    return {
+        str(uuid.UUID(int=rng.getrandbits(128))): UserTotals(
+            net_saved=rng.randrange(-20_000, 200_000),
+            total_overpaid=rng.randrange(0, 50_000),
+            nickname=f"user{i}" if i % 3 else None,
+        )
+        for i in range(users)
+    }
+
+
+def synthetic_receipt_rows(receipts: int, items_per_receipt: int = 15, seed: int = 42) -> list[dict[str, Any]]:
+    """receipts テーブルの行（Receipt の列、result は解析結果JSON）を新しい順に生成します。"""
+    rng = random.Random(seed)
+    user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    rows: list[dict[str, Any]] = []
+    for i in range(receipts):
+        items = []
+        saved = overpaid = payment = 0.0
+        for _ in range(items_per_receipt):
+            paid = float(rng.randrange(80, 1200))
+            stat = round(paid * rng.uniform(0.8, 1.2), 1)
+            diff = round(stat - paid, 1)
+            judgement = "DEAL" if paid <= stat * 0.95 else "OVERPAY" if paid >= stat * 1.05 else "FAIR"
+            saved += abs(diff) if judgement == "DEAL" else 0
+            overpaid += abs(diff) if judgement == "OVERPAY" else 0
+            payment += paid
+            items.append({
+                "raw_name": rng.choice(RECEIPT_NAMES),
+                "canonical": rng.choice(ESTAT_ITEM_NAMES),
+                "paid_unit_price": paid,
+                "quantity": 1.0,
+                "estat": {
+                    "found": True,
+                    "stat_price": stat,
+                    "stat_unit": "1kg",
+                    "diff": diff,
+                    "rate": round(paid / stat, 3),
+                    "judgement": judgement,
+                    "note": "市場単価 × 推定重量",
+                },
+            })
+        day = 28 - i % 28
+        rows.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": user_id,
+            "purchase_date": f"2026-{12 - i // 28 % 12:02d}-{day:02d}",
+            "store_name": f"スーパー{rng.randrange(1, 20)} 店",
+            "result": {
+                "purchase_date": f"2026-01-{day:02d}",
+                "store_name": "スーパー",
+                "items": items,
+                "summary": {
+                    "total_payment": payment,
+                    "total_saved_amount": round(saved, 1),
+                    "total_overpaid_amount": round(overpaid, 1),
+                },
+            },
+            "created_at": f"2026-10-{day:02d}T12:{i % 60:02d}:00.000000+00:00",
+            "updated_at": f"2026-10-{day:02d}T12:{i % 60:02d}:00.000000+00:00",
+        })
+    return rows
@@ -0,0 +1,39 @@
+"""
+プロセス内ランキング（services.leaderboard）のベンチマーク
+
+100万ユーザーの順位表で、構築・加算・順位・上位抽出・/ranking レスポンス生成を計測します。
+    python -m bench leaderboard
+"""
+import time
+
+from services.leaderboard import Leaderboard
+
+from bench.fixtures import synthetic_user_totals
+from bench.timing import measure
+
+USERS = 1_000_000
+
+
+def run() -> dict[str, float]:
+    """各処理の1回あたり時間（マイクロ秒）を返します。"""
+    users = synthetic_user_totals(USERS)
+    user_ids = list(users)
+    me = user_ids[len(user_ids) // 2]
+
+    board = Leaderboard()
+    build_us = measure(lambda: board.replace(dict(users), time.time()), 1, repeat=3)
+
+    i = 0
+
+    def record() -> None:
+        nonlocal i
+        i += 1
+        board.record(user_ids[i % USERS], 300, 100)
+
+    return {
+        "replace.1m_users": build_us,
+        "record": measure(record, 20000),
+        "rank": measure(lambda: board.rank(me), 20000),
+        "top10": measure(lambda: board.top(10), 20000),
+        "ranking.top10": measure(lambda: board.ranking(me, 10), 5000),
+    }
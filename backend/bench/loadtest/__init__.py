@@ -0,0 +1,6 @@
+"""
+オフライン負荷試験
+
+Gemini / Supabase を応答時間・エラー率を設定できる代替クライアントに差し替えた
+アプリを起動し、合成ユーザーで負荷をかけます。python -m bench.loadtest --help を参照。
+"""
@@ -0,0 +1,280 @@
+"""
+オフライン負荷試験のドライバー
+
+bench.loadtest.app を uvicorn（複数ワーカー）で起動し、合成ユーザーを同時に走らせて
+RPS・レイテンシ（p50/p95/p99）・イベントループ遅延・ワーカーごとのメモリを集計します。
+Gemini / Supabase / e-Stat には一切接続しません。
+
+    python -m bench.loadtest --users 200 --duration 60 --workers 4
+    python -m bench.loadtest --gemini-median 6 --gemini-p99 30 --gemini-error-rate 0.05
+    python -m bench.loadtest --mix analyze=1,ranking=4,receipts=4,text=1 --json result.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any
+
+import httpx
+from jose import jwt  # type: ignore
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+JWT_SECRET = "loadtest-secret"
+
+# 本物のプロジェクトに接続しないよう、サーバーにはダミーの認証情報だけを渡す
+SERVER_ENV = {
+    "SUPABASE_URL": "https://loadtest.supabase.co",
+    "SUPABASE_SERVICE_ROLE_KEY": "eyJhbGciOiJIUzI1NiJ9.e30.loadtest",
+    "SUPABASE_JWT_SECRET": JWT_SECRET,
+    "GEMINI_API_KEY": "loadtest",
+    "ESTAT_APP_ID": "",
+}
+
+RECEIPT_TEXT = "スーパーマルエツ\n2025/11/08\nｷｬﾍﾞﾂ 1玉 198\nタマゴ Lサイズ10コ 298\n牛乳 1000ml 278\n合計 774"
+
+type Sample = tuple[str, int, float]  # (エンドポイント, ステータス, 秒)
+
+
+def _mint_token(user_id: str) -> str:
+    now = int(time.time())
+    claims = {"sub": user_id, "aud": "authenticated", "role": "authenticated", "iat": now, "exp": now + 86400}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+def _receipt_png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (600, 1200), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _parse_mix(spec: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint: {name} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _analyze(client: httpx.AsyncClient, png: bytes) -> httpx.Response:
+    return await client.post("/analyzeReceipt", files={"file": ("receipt.png", png, "image/png")})
+
+
+async def _analyze_text(client: httpx.AsyncClient, png: bytes) -> httpx.Response:
+    return await client.post("/analyzeReceiptText", data={"text": RECEIPT_TEXT})
+
+
+async def _ranking(client: httpx.AsyncClient, png: bytes) -> httpx.Response:
+    return await client.get("/ranking")
+
+
+async def _receipts(client: httpx.AsyncClient, png: bytes) -> httpx.Response:
+    return await client.get("/receipts")
+
+
+ENDPOINTS = {
+    "analyze": _analyze,
+    "text": _analyze_text,
+    "ranking": _ranking,
+    "receipts": _receipts,
+}
+
+
+async def _user(
+    base_url: str,
+    mix: dict[str, float],
+    deadline: float,
+    think: float,
+    timeout: float,
+    png: bytes,
+    rng: random.Random,
+    samples: list[Sample],
+) -> None:
+    """1人の合成ユーザー。締め切りまで、リクエスト → 思考時間 を繰り返します。"""
+    names, weights = list(mix), list(mix.values())
+    headers = {"Authorization": f"Bearer {_mint_token(str(uuid.UUID(int=rng.getrandbits(128))))}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout) as client:
+        # 開始時刻をずらし、全員が同時に最初のリクエストを送らないようにする
+        await asyncio.sleep(rng.uniform(0, think))
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = (await ENDPOINTS[name](client, png)).status_code
+            except httpx.TimeoutException:
+                status = 0
+            except httpx.TransportError:
+                status = -1
+            samples.append((name, status, time.perf_counter() - started))
+            if think > 0:
+                await asyncio.sleep(rng.expovariate(1 / think))
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    pick = lambda q: values[min(int(len(values) * q), len(values) - 1)]  # noqa: E731
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+
+def _summarize(samples: list[Sample], elapsed: float, worker_stats: list[dict[str, Any]]) -> dict[str, Any]:
+    by_endpoint: dict[str, list[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample[0]].append(sample)
+    return {
+        "requests": len(samples),
+        "elapsed_s": elapsed,
+        "rps": len(samples) / elapsed if elapsed else 0.0,
+        "latency_s": _percentiles([s[2] for s in samples]),
+        "status": dict(Counter(str(s[1]) for s in samples)),
+        "endpoints": {
+            name: {
+                "requests": len(rows),
+                "rps": len(rows) / elapsed if elapsed else 0.0,
+                "latency_s": _percentiles([s[2] for s in rows]),
+                "status": dict(Counter(str(s[1]) for s in rows)),
+            }
+            for name, rows in sorted(by_endpoint.items())
+        },
+        "workers": worker_stats,
+    }
+
+
+def _print_report(report: dict[str, Any]) -> None:
+    lat = report["latency_s"]
+    print(f"requests {report['requests']}  elapsed {report['elapsed_s']:.1f}s  rps {report['rps']:.1f}")
+    print(f"latency  p50 {lat['p50'] * 1000:.0f}ms  p95 {lat['p95'] * 1000:.0f}ms  "
+          f"p99 {lat['p99'] * 1000:.0f}ms  max {lat['max'] * 1000:.0f}ms")
+    print(f"status   {report['status']}  (0 = client timeout, -1 = connection error)")
+    print()
+    print(f"{'endpoint':<10} {'reqs':>7} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  status")
+    for name, row in report["endpoints"].items():
+        lat = row["latency_s"]
+        print(f"{name:<10} {row['requests']:>7} {row['rps']:>7.1f} {lat['p50'] * 1000:>9.0f} "
+              f"{lat['p95'] * 1000:>9.0f} {lat['p99'] * 1000:>9.0f}  {row['status']}")
+    print()
+    print(f"{'worker':<10} {'lag p50':>9} {'lag p99':>9} {'lag max':>9} {'rss MB':>8} {'peak MB':>8}")
+    for w in report["workers"]:
+        rss = f"{w['rss_kb'] / 1024:.0f}" if w.get("rss_kb") else "-"
+        print(f"{w['pid']:<10} {w['loop_lag_p50_ms']:>7.1f}ms {w['loop_lag_p99_ms']:>7.1f}ms "
+              f"{w['loop_lag_max_ms']:>7.1f}ms {rss:>8} {w['max_rss_kb'] / 1024:>8.0f}")
+
+
+def _start_server(args: argparse.Namespace, port: int, stats_dir: Path) -> subprocess.Popen[bytes]:
+    config = {
+        "gemini": {"median": args.gemini_median, "p99": args.gemini_p99, "error_rate": args.gemini_error_rate},
+        "supabase": {"median": args.supabase_median, "p99": args.supabase_p99, "error_rate": args.supabase_error_rate},
+        "responses_dir": str(args.responses_dir) if args.responses_dir else None,
+        "seed": args.seed,
+        "log_level": args.log_level,
+    }
+    env = os.environ | SERVER_ENV | {
+        "LOADTEST_CONFIG": json.dumps(config),
+        "LOADTEST_STATS_DIR": str(stats_dir),
+        "SAVINGS_SPILL_DIR": str(stats_dir / "spill"),
+        "MARKET_SNAPSHOT_DIR": str(stats_dir / "market_snapshot"),
+        "PYTHONPATH": str(BACKEND_DIR),
+    }
+    cmd = [
+        sys.executable, "-m", "uvicorn", "bench.loadtest.app:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.workers), "--no-access-log", "--log-level", "warning",
+    ]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+
+
+async def _wait_ready(base_url: str, server: subprocess.Popen[bytes], timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2.0) as client:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with code {server.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError("server did not become ready")
+
+
+async def _run(args: argparse.Namespace, base_url: str) -> tuple[list[Sample], float]:
+    png = _receipt_png()
+    samples: list[Sample] = []
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        _user(base_url, args.mix, deadline, args.think, args.timeout, png, random.Random(rng.getrandbits(64)), samples)
+        for _ in range(args.users)
+    ))
+    return samples, time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.loadtest")
+    parser.add_argument("--users", type=int, default=50, help="同時に動かす合成ユーザー数")
+    parser.add_argument("--duration", type=float, default=30.0, help="計測時間（秒）")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn のワーカープロセス数")
+    parser.add_argument("--think", type=float, default=1.0, help="リクエスト間の平均思考時間（秒、指数分布）")
+    parser.add_argument("--timeout", type=float, default=120.0, help="クライアント側のタイムアウト（秒）")
+    parser.add_argument("--mix", type=_parse_mix, default="analyze=2,text=1,ranking=3,receipts=4",
+                        help="エンドポイントの比率（例: analyze=2,ranking=3）")
+    parser.add_argument("--gemini-median", type=float, default=4.0, help="Gemini 応答時間の中央値（秒）")
+    parser.add_argument("--gemini-p99", type=float, default=20.0, help="Gemini 応答時間の p99（秒）")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.01, help="Gemini のエラー率")
+    parser.add_argument("--supabase-median", type=float, default=0.02, help="Supabase 応答時間の中央値（秒）")
+    parser.add_argument("--supabase-p99", type=float, default=0.15, help="Supabase 応答時間の p99（秒）")
+    parser.add_argument("--supabase-error-rate", type=float, default=0.0, help="Supabase のエラー率")
+    parser.add_argument("--responses-dir", type=Path, default=None, help="記録済み Gemini 応答（*.json）のディレクトリ")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING", help="サーバー側 loguru のログレベル")
+    parser.add_argument("--json", type=Path, default=None, help="集計結果を JSON で保存する")
+    args = parser.parse_args()
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmp:
+        stats_dir = Path(tmp)
+        server = _start_server(args, port, stats_dir)
+        try:
+            asyncio.run(_wait_ready(base_url, server))
+            samples, elapsed = asyncio.run(_run(args, base_url))
+            # ワーカーが最新の統計を書き出すのを待つ
+            time.sleep(1.5)
+            worker_stats = [json.loads(p.read_text(encoding="utf-8")) for p in sorted(stats_dir.glob("*.json"))]
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    report = _summarize(samples, elapsed, worker_stats)
+    _print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+負荷試験用のサーバーエントリポイント
+
+main.app の Gemini / Supabase クライアントを fakes の代替に差し替え、
+市場データのキャッシュを合成データで埋めた状態で起動します。
+    LOADTEST_CONFIG='{"gemini": {"median": 4.0, "p99": 20.0}}' \
+        uvicorn bench.loadtest.app:app --workers 4
+
+各ワーカーはイベントループの遅延とメモリ使用量を LOADTEST_STATS_DIR/<pid>.json に
+定期的に書き出します（ドライバーが最後に集計します）。
+"""
+import asyncio
+import collections
+import json
+import os
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from starlette.types import Receive, Scope, Send
+
+import db.db
+import main
+import model.genai
+from bench.fixtures import ESTAT_ITEM_NAMES
+from services import market_data
+from services.lazy import replace_instance
+
+from .fakes import FakeGenaiClient, FakeSupabaseClient, LatencyModel, load_recorded_responses
+
+DEFAULT_CONFIG: dict[str, Any] = {
+    "gemini": {"median": 4.0, "p99": 20.0, "error_rate": 0.01},
+    "supabase": {"median": 0.02, "p99": 0.15, "error_rate": 0.0},
+    "responses_dir": None,
+    "seed": 0,
+    "log_level": "WARNING",
+}
+
+# イベントループ遅延の計測間隔（秒）と保持するサンプル数
+LAG_INTERVAL = 0.05
+LAG_WINDOW = 20_000
+STATS_INTERVAL = 1.0
+
+
+def _load_config() -> dict[str, Any]:
+    config = dict(DEFAULT_CONFIG)
+    config.update(json.loads(os.environ.get("LOADTEST_CONFIG", "{}")))
+    return config
+
+
+def _install_fakes(config: dict[str, Any]) -> None:
+    """本物のクライアントを参照している全モジュールの名前を代替に差し替えます。"""
+    seed = int(config["seed"]) + os.getpid()
+    responses_dir = config["responses_dir"]
+    responses = load_recorded_responses(Path(responses_dir)) if responses_dir else load_recorded_responses()
+
+    # クライアントは遅延生成のプロキシなので、中身を差し替えれば import したすべてのモジュールに反映される
+    genai_client = FakeGenaiClient(LatencyModel(**config["gemini"]), responses, seed=seed)
+    replace_instance(model.genai.client, genai_client)
+
+    supabase_client = FakeSupabaseClient(LatencyModel(**config["supabase"]), seed=seed)
+    replace_instance(db.db.supabase, supabase_client)
+
+    # e-Stat には接続せず、合成した市場データをキャッシュ済みにしておく
+    rng = random.Random(seed)
+    market_data._market_data_cache = [
+        {"item_name": name, "price": float(rng.randrange(98, 1980)), "unit": "1個"} for name in ESTAT_ITEM_NAMES
+    ]
+    market_data._cache_timestamp = time.time() + market_data.CACHE_TTL * 365
+
+
+def _rss_kb() -> int | None:
+    """現在の常駐メモリ（KB）。/proc が無い環境では None。"""
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _percentile(sorted_values: list[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+class WorkerMonitor:
+    """イベントループの遅延（sleep の超過時間）を計測し、統計をファイルに書き出します。"""
+    def __init__(self, stats_dir: Path | None) -> None:
+        self.stats_dir = stats_dir
+        self.lags: collections.deque[float] = collections.deque(maxlen=LAG_WINDOW)
+        self.max_lag = 0.0
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._measure_lag()), asyncio.create_task(self._write_stats())]
+
+    async def _measure_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            lag = max(loop.time() - scheduled, 0.0)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def snapshot(self) -> dict[str, Any]:
+        lags = sorted(self.lags)
+        return {
+            "pid": os.getpid(),
+            "loop_lag_samples": len(lags),
+            "loop_lag_p50_ms": (_percentile(lags, 0.50) or 0.0) * 1000,
+            "loop_lag_p99_ms": (_percentile(lags, 0.99) or 0.0) * 1000,
+            "loop_lag_max_ms": self.max_lag * 1000,
+            "rss_kb": _rss_kb(),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+    async def _write_stats(self) -> None:
+        if self.stats_dir is None:
+            return
+        path = self.stats_dir / f"{os.getpid()}.json"
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+            tmp.replace(path)
+
+
+class LoadTestApp:
+    """main.app を包み、最初の呼び出し時にワーカーの監視を開始するASGIアプリ。"""
+    def __init__(self) -> None:
+        stats_dir = os.environ.get("LOADTEST_STATS_DIR")
+        self.monitor = WorkerMonitor(Path(stats_dir) if stats_dir else None)
+        self._started = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._started:
+            self._started = True
+            self.monitor.start()
+        await main.app(scope, receive, send)
+
+
+_config = _load_config()
+logger.remove()
+logger.add(sys.stderr, level=_config["log_level"])
+_install_fakes(_config)
+
+app = LoadTestApp()
@@ -0,0 +1,183 @@
+"""
+負荷試験用の Gemini / Supabase 代替クライアント
+
+記録済みの Gemini 応答を返し、応答時間とエラーを設定した分布で再現します。
+本物の API キーやプロジェクトには一切接続しません。
+"""
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+RESPONSES_DIR = Path(__file__).with_name("responses")
+
+
+@dataclass
+class LatencyModel:
+    """
+    応答時間（秒）の対数正規分布とエラー率。
+    中央値と p99 を指定すると、その2点を通る分布になります。
+    """
+    median: float
+    p99: float
+    error_rate: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        sigma = math.log(max(self.p99, self.median) / self.median) / 2.326
+        return self.median * math.exp(sigma * rng.gauss(0.0, 1.0))
+
+    def should_fail(self, rng: random.Random) -> bool:
+        return rng.random() < self.error_rate
+
+
+def load_recorded_responses(directory: Path = RESPONSES_DIR) -> list[str]:
+    """記録済みの Gemini 応答（GeminiReceiptResponse の JSON）を読み込みます。"""
+    responses = [p.read_text(encoding="utf-8") for p in sorted(directory.glob("*.json"))]
+    if not responses:
+        raise FileNotFoundError(f"記録済みの応答がありません: {directory}")
+    return responses
+
+
+class FakeGenaiClient:
+    """google-genai の client.aio.models.generate_content を置き換えます。"""
+    def __init__(self, latency: LatencyModel, responses: list[str], seed: int = 0) -> None:
+        self._latency = latency
+        self._responses = responses
+        self._rng = random.Random(seed)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generate_content))
+
+    async def _generate_content(self, model: str, contents: list[Any], config: Any = None) -> Any:
+        await asyncio.sleep(self._latency.sample(self._rng))
+        if self._latency.should_fail(self._rng):
+            raise RuntimeError(f"fake {model}: 503 UNAVAILABLE")
+        text = self._rng.choice(self._responses)
+        prompt_chars = sum(len(c) for c in contents if isinstance(c, str))
+        usage = SimpleNamespace(prompt_token_count=prompt_chars // 2 + 258, candidates_token_count=len(text) // 2)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class _FakeQuery:
+    """postgrest のクエリビルダーの代替。メソッドチェーンを受け付け、execute() で応答を返します。"""
+    def __init__(self, client: "FakeSupabaseClient", table: str) -> None:
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._payload: Any = None
+        self._filters: dict[str, Any] = {}
+        self._after: tuple[str, Any] | None = None
+        self._order: str | None = None
+        self._limit: int | None = None
+
+    def select(self, *_args: Any, **_kwargs: Any) -> "_FakeQuery":
+        self._op = "select"
+        return self
+
+    def insert(self, payload: Any, **_kwargs: Any) -> "_FakeQuery":
+        self._op, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload: Any, **_kwargs: Any) -> "_FakeQuery":
+        self._op, self._payload = "insert", payload
+        return self
+
+    def update(self, payload: Any, **_kwargs: Any) -> "_FakeQuery":
+        self._op, self._payload = "update", payload
+        return self
+
+    def delete(self, **_kwargs: Any) -> "_FakeQuery":
+        self._op = "delete"
+        return self
+
+    def eq(self, column: str, value: Any) -> "_FakeQuery":
+        self._filters[column] = value
+        return self
+
+    def gt(self, column: str, value: Any) -> "_FakeQuery":
+        self._after = (column, value)
+        return self
+
+    def order(self, column: str, **_kwargs: Any) -> "_FakeQuery":
+        self._order = column
+        return self
+
+    def limit(self, n: int, **_kwargs: Any) -> "_FakeQuery":
+        self._limit = n
+        return self
+
+    @property
+    def not_(self) -> "_FakeQuery":
+        return self
+
+    @property
+    def request(self) -> "_FakeRequest":
+        return _FakeRequest(self)
+
+    def __getattr__(self, _name: str) -> Any:
+        # range / in_ / is_ / lt などの絞り込みは応答に影響させない
+        return lambda *args, **kwargs: self
+
+    def execute(self) -> Any:
+        return self._client._execute(self)
+
+
+class _FakeRequest:
+    """postgrest の RequestConfig の代替。execute_raw 用に、応答本文を解析前の JSON で返します。"""
+    def __init__(self, query: _FakeQuery) -> None:
+        self._query = query
+
+    def send(self, _headers: Any) -> Any:
+        content = json.dumps(self._query.execute().data).encode()
+        return SimpleNamespace(is_success=True, content=content)
+
+
+class FakeSupabaseClient:
+    """supabase.Client の table() / rpc() を置き換えるメモリ上のストア。"""
+    def __init__(self, latency: LatencyModel, seed: int = 0) -> None:
+        self._latency = latency
+        self._rng = random.Random(seed)
+        self._tables: dict[str, list[dict[str, Any]]] = {}
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(self, name)
+
+    def rpc(self, name: str, params: dict[str, Any] | None = None) -> _FakeQuery:
+        return _FakeQuery(self, f"rpc:{name}")
+
+    def _execute(self, query: _FakeQuery) -> Any:
+        # execute() はワーカースレッドで呼ばれるため、同期的に待つ
+        time.sleep(self._latency.sample(self._rng))
+        if self._latency.should_fail(self._rng):
+            raise ConnectionError(f"fake supabase: {query._table} unavailable")
+
+        rows = self._tables.setdefault(query._table, [])
+        if query._op == "insert":
+            payload = query._payload if isinstance(query._payload, list) else [query._payload]
+            now = datetime.now(timezone.utc).isoformat()
+            inserted = [{"id": str(uuid.uuid4()), "created_at": now, "updated_at": now, **p} for p in payload]
+            rows.extend(inserted)
+            del rows[:-10_000]
+            return SimpleNamespace(data=inserted, count=None)
+
+        matched = [r for r in rows if all(r.get(k) == v for k, v in query._filters.items())]
+        if query._op == "update":
+            for r in matched:
+                r.update(query._payload)
+        elif query._op == "delete":
+            self._tables[query._table] = [r for r in rows if r not in matched]
+        if query._order is not None:
+            matched.sort(key=lambda r: str(r.get(query._order)))
+        if query._after is not None:
+            column, value = query._after
+            matched = [r for r in matched if str(r.get(column)) > str(value)]
+        if query._limit is not None:
+            matched = matched[:query._limit]
+        return SimpleNamespace(data=[json.loads(json.dumps(r)) for r in matched[-100:]], count=len(matched))
@@ -0,0 +1,57 @@
+"""
+文字列正規化（normalize_text / simplify_key / fold_key）のベンチマーク
+
+    python -m bench normalize
+"""
+from schemas import fold_key, normalize_text, search_class_names, simplify_key
+
+from bench.fixtures import synthetic_class_maps
+from bench.timing import measure
+
+# 正規化結果の確認は tests/test_normalize.py で行う
+WORDS: list[str] = [
+    "ｷｬﾍﾞﾂ　１玉", "玉ねぎ（国産）3個", "食パン【6枚切】", "ＭＩＬＫ　１０００ｍｌ", "￥１，２８０",
+    "  豚バラ   スライス  ", "カップラーメン・しょうゆ", "サバ水煮／缶 190g", "バター", "Apple\\ 198",
+    "「特売」たまご10コ入", "ﾃｨｯｼｭ 5ｺ-ﾊﾟｯｸ",
+]
+
+
+def clear_caches() -> None:
+    normalize_text.cache_clear()
+    simplify_key.cache_clear()
+    fold_key.cache_clear()
+
+
+def run() -> dict[str, float]:
+    """各処理の1回あたり時間（マイクロ秒）を返します。"""
+    words = WORDS
+    class_maps = synthetic_class_maps()
+
+    def fold_all_cold() -> None:
+        clear_caches()
+        for w in words:
+            fold_key(w)
+
+    def normalize_all_cold() -> None:
+        clear_caches()
+        for w in words:
+            normalize_text(w)
+
+    def fold_all_warm() -> None:
+        for w in words:
+            fold_key(w)
+
+    def search_cold() -> None:
+        clear_caches()
+        search_class_names(class_maps, "たまご")
+
+    def search_warm() -> None:
+        search_class_names(class_maps, "たまご")
+
+    return {
+        "normalize_text.cold": measure(normalize_all_cold, 2000) / len(words),
+        "fold_key.cold": measure(fold_all_cold, 2000) / len(words),
+        "fold_key.warm": measure(fold_all_warm, 20000) / len(words),
+        "search_class_names.cold": measure(search_cold, 50),
+        "search_class_names.warm": measure(search_warm, 500),
+    }
@@ -0,0 +1,39 @@
+"""
+品目名の名寄せ（guess_canonical / resolve_canonical / search_class_names）のベンチマーク
+    python -m bench parser
+"""
+from schemas import guess_canonical, resolve_canonical, search_class_names
+
+from bench.fixtures import RECEIPT_NAMES, synthetic_class_maps
+from bench.normalize import clear_caches
+from bench.timing import measure
+
+
+def run() -> dict[str, float]:
+    """各処理の1回あたり時間（マイクロ秒）を返します。"""
+    class_maps = synthetic_class_maps()
+    queries = ["たまご", "豚肉", "コシヒカリ", "りんご", "存在しない品目"]
+
+    def guess_all() -> None:
+        for name in RECEIPT_NAMES:
+            guess_canonical(name)
+
+    def resolve_all_cold() -> None:
+        clear_caches()
+        for name in RECEIPT_NAMES:
+            resolve_canonical(name, class_maps)
+
+    def resolve_all_warm() -> None:
+        for name in RECEIPT_NAMES:
+            resolve_canonical(name, class_maps)
+
+    def search_all() -> None:
+        for q in queries:
+            search_class_names(class_maps, q)
+
+    return {
+        "guess_canonical": measure(guess_all, 500) / len(RECEIPT_NAMES),
+        "resolve_canonical.cold": measure(resolve_all_cold, 5) / len(RECEIPT_NAMES),
+        "resolve_canonical.warm": measure(resolve_all_warm, 50) / len(RECEIPT_NAMES),
+        "search_class_names.realistic": measure(search_all, 50) / len(queries),
+    }
@@ -0,0 +1,22 @@
+"""
+/ranking のレスポンス変換（ranking_from_rows）のベンチマーク
+
+集計はデータベース側の get_ranking が行うため、Python 側のコストは
+上位N名 + 自分の行の変換のみです（履歴件数に依存しないことを確認します）。
+    python -m bench ranking
+"""
+from services.ranking import ranking_from_rows
+
+from bench.fixtures import synthetic_ranking_rows
+from bench.timing import measure
+
+
+def run() -> dict[str, float]:
+    """各処理の1回あたり時間（マイクロ秒）を返します。"""
+    top10 = synthetic_ranking_rows(10)
+    top100 = synthetic_ranking_rows(100)
+
+    return {
+        "ranking_from_rows.top10": measure(lambda: ranking_from_rows(top10), 2000),
+        "ranking_from_rows.top100": measure(lambda: ranking_from_rows(top100), 200),
+    }
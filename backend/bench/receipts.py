@@ -0,0 +1,61 @@
+"""
+GET /receipts のレスポンス生成のベンチマーク（500件・各15商品の履歴。JSON で約2MB、gzip で約190KB）
+
+- parse.postgrest: 従来の経路での応答の解析。postgrest-py の execute() が応答本文を
+  再帰的な JSON 型として検証する（大きな result 列ではこれが最も重い）
+- parse.from_json: 現在の経路（ページ指定時）。execute_raw の本文を pydantic-core で解析する。
+  全件取得では本文を解析せずにそのまま返すため、解析の時間はかからない
+- serialize.models: 従来の経路。行から Receipt を1件ずつ組み立て、FastAPI の response_model と同じく
+  list[Receipt] として再検証してから JSON にする
+- serialize.rows: 現在の経路。取得した行を pydantic-core の to_json でそのまま JSON にする
+- gzip: JSON を gzip で圧縮する（Accept-Encoding: gzip の場合に追加でかかる時間）
+    python -m bench receipts
+"""
+from typing import Any
+
+from postgrest.types import JSONAdapter
+from pydantic import TypeAdapter
+from pydantic_core import from_json, to_json
+from schemas import Receipt
+from services.compression import gzip_bytes
+
+from bench.fixtures import synthetic_receipt_rows
+from bench.timing import measure
+
+_receipts_adapter = TypeAdapter(list[Receipt])
+
+
+def _receipt_from_record(record: dict[str, Any]) -> Receipt:
+    result_data = record.get("result")
+    if not isinstance(result_data, dict):
+        result_data = {}
+    return Receipt(
+        id=str(record.get("id", "")),
+        user_id=str(record.get("user_id", "")),
+        purchase_date=str(record.get("purchase_date")) if record.get("purchase_date") else None,
+        store_name=str(record.get("store_name")) if record.get("store_name") else None,
+        result=result_data,
+        created_at=str(record.get("created_at", "")),
+        updated_at=str(record.get("updated_at", ""))
+    )
+
+
+def _models_json(rows: list[dict[str, Any]]) -> bytes:
+    models = [_receipt_from_record(r) for r in rows]
+    return _receipts_adapter.dump_json(_receipts_adapter.validate_python(models))
+
+
+def run() -> dict[str, float]:
+    """各処理の1回あたり時間（マイクロ秒）を返します。"""
+    rows = synthetic_receipt_rows(500)
+    body = to_json(rows)
+    assert body == _models_json(rows)
+
+    return {
+        "parse.postgrest.500": measure(lambda: JSONAdapter.validate_json(body), 1),
+        "parse.from_json.500": measure(lambda: from_json(body), 5),
+        "serialize.models.500": measure(lambda: _models_json(rows), 5),
+        "serialize.rows.500": measure(lambda: to_json(rows), 5),
+        "gzip.500": measure(lambda: gzip_bytes(body), 5),
+    }
+
@@ -0,0 +1,31 @@
+"""
+起動時間のベンチマーク
+
+新しいプロセスで import main にかかる時間（uvicorn がリクエストを受け付け始めるまでの大部分）を計測します。
+クライアントの生成や市場データの取得は lifespan のウォームアップで行うため、ここには含まれません
+（実行中のプロセスの準備完了までの時間は /health の startup.seconds_to_ready）。
+    python -m bench startup
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+from bench.timing import measure
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _import_main() -> None:
+    subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND_DIR, check=True)
+
+
+def _start_interpreter() -> None:
+    subprocess.run([sys.executable, "-c", "pass"], cwd=BACKEND_DIR, check=True)
+
+
+def run() -> dict[str, float]:
+    """各処理の1回あたり時間（マイクロ秒）を返します。"""
+    return {
+        "interpreter": measure(_start_interpreter, 1, repeat=3),
+        "import_main": measure(_import_main, 1, repeat=3),
+    }
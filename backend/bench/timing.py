@@ -0,0 +1,13 @@
+import time
+from collections.abc import Callable
+
+
+def measure(fn: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """fn を number 回実行する計測を repeat 回行い、最良の1回あたり時間（マイクロ秒）を返します。"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best * 1e6
@@ -0,0 +1,73 @@
+"""
+単位の解析と換算（parse_unit / parse_size / annotate_market_data）のベンチマーク
+
+実行前にゴールデン出力との一致を確認し、解析結果が変わっていないことを保証します。
+    python -m bench units
+"""
+from services.units import Quantity, annotate_market_data, parse_size, parse_unit
+
+from bench.fixtures import ESTAT_ITEM_NAMES, RECEIPT_NAMES
+from bench.timing import measure
+
+# e-Stat の単位 -> 解析結果
+UNIT_CASES: list[tuple[str, Quantity | None]] = [
+    ("1kg", Quantity(1000.0, "mass")),
+    ("100g", Quantity(100.0, "mass")),
+    ("1パック(10個)", Quantity(10.0, "count")),
+    ("パック(10個)", Quantity(10.0, "count")),
+    ("1本(1000ml)", Quantity(1000.0, "volume")),
+    ("1袋(5kg)", Quantity(5000.0, "mass")),
+    ("12ロール", Quantity(12.0, "count")),
+    ("1L", Quantity(1000.0, "volume")),
+    ("－", None),
+]
+
+# レシートの品目名 -> 内容量・個数
+SIZE_CASES: list[tuple[str, Quantity | None]] = [
+    ("サバ水煮缶 190g", Quantity(190.0, "mass")),
+    ("タマゴ Lサイズ10コ", Quantity(10.0, "count")),
+    ("明治おいしい牛乳 1000ml", Quantity(1000.0, "volume")),
+    ("ｷｬﾍﾞﾂ 1玉", Quantity(1.0, "count")),
+    ("ビール 350ml 6缶", Quantity(2100.0, "volume")),
+    ("鶏むね 60g×3", Quantity(180.0, "mass")),
+    ("100g 200g", None),
+    ("キャベツ 1/2玉", None),
+    ("ﾊﾞﾅﾅ", None),
+]
+
+_UNITS = ["1kg", "100g", "1パック(10個)", "1本(1000ml)", "1個", "1袋(5kg)"]
+
+
+def check_golden() -> None:
+    for unit, expected in UNIT_CASES:
+        assert parse_unit(unit) == expected, (unit, parse_unit(unit))
+    for name, expected in SIZE_CASES:
+        assert parse_size(name) == expected, (name, parse_size(name))
+
+
+def run() -> dict[str, float]:
+    """各処理の1回あたり時間（マイクロ秒）を返します。"""
+    check_golden()
+    market_data = [
+        {"item_name": name, "price": float(98 + 10 * i), "unit": _UNITS[i % len(_UNITS)]}
+        for i, name in enumerate(ESTAT_ITEM_NAMES)
+    ]
+
+    def parse_units_cold() -> None:
+        parse_unit.cache_clear()
+        for unit in _UNITS:
+            parse_unit(unit)
+
+    def parse_sizes() -> None:
+        for name in RECEIPT_NAMES:
+            parse_size(name)
+
+    def annotate_new_snapshot() -> None:
+        # 新しい版の市場データ（別のリスト）として毎回作り直させる
+        annotate_market_data(list(market_data))
+
+    return {
+        "parse_unit.cold": measure(parse_units_cold, 2000) / len(_UNITS),
+        "parse_size": measure(parse_sizes, 2000) / len(RECEIPT_NAMES),
+        "annotate_market_data.snapshot": measure(annotate_new_snapshot, 200),
+    }
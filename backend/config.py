@@ -12,12 +12,76 @@ class Settings(BaseSettings):
     GEMINI_MODEL: str = "gemini-flash-latest"
     GEMINI_MODEL_FALLBACK: str = "gemini-1.5-pro"
 
+    # --- Gemini ヘッジ設定 ---
+    # 主モデルが「応答時間の GEMINI_HEDGE_PERCENTILE 分位」までに返らなければ予備モデルへも問い合わせる
+    GEMINI_HEDGE_ENABLED: bool = True
+    GEMINI_HEDGE_PERCENTILE: float = 0.95
+    GEMINI_HEDGE_DEFAULT_DELAY: float = 15.0  # 観測数が足りない間の締め切り（秒）
+    GEMINI_HEDGE_MIN_DELAY: float = 3.0
+    GEMINI_HEDGE_MAX_DELAY: float = 60.0
+    GEMINI_HEDGE_MIN_SAMPLES: int = 20
+
+    # --- テキスト解析（/analyzeReceiptText）設定 ---
+    # 市場データと照合できた商品の割合がこれ未満なら画像解析へフォールバック
+    TEXT_ANALYSIS_MIN_CONFIDENCE: float = 0.5
+    TEXT_ANALYSIS_MAX_CHARS: int = 20000  # 受け付けるテキストの最大文字数
+    TEXT_ANALYSIS_MAX_LINES: int = 500  # 受け付けるテキストの最大行数
+
     # --- Supabase 設定 ---
     SUPABASE_URL: str = ""
     SUPABASE_ANON_KEY: str = ""
     SUPABASE_SERVICE_ROLE_KEY: str = ""
     SUPABASE_JWT_SECRET: str = ""
 
+    # --- 認証（JWT 検証結果のキャッシュ）設定 ---
+    AUTH_CACHE_SIZE: int = 10000  # 検証済みトークンの保持数
+    AUTH_CACHE_MAX_TTL_SECONDS: float = 3600.0  # exp のないトークンを保持する最大秒数
+    AUTH_NEGATIVE_CACHE_SIZE: int = 1000  # 検証に失敗したトークンの保持数
+    AUTH_NEGATIVE_CACHE_SECONDS: float = 10.0  # 検証に失敗したトークンを 401 のまま返す秒数
+
+    # --- リクエスト期限・サーキットブレーカー設定 ---
+    REQUEST_TIMEOUT_SECONDS: float = 90.0  # 1リクエストあたりの処理期限（X-Request-Timeout で短縮可）
+    REQUEST_TIMEOUT_MIN_SECONDS: float = 1.0  # X-Request-Timeout で短縮できる下限
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # 連続失敗がこの回数に達したら遮断
+    CIRCUIT_RESET_TIMEOUT_SECONDS: float = 30.0  # 遮断後、再試行を許可するまでの秒数
+
+    # --- リクエスト単位プロファイラ設定 ---
+    PROFILE_ADMIN_TOKEN: str = ""  # X-Profile ヘッダー / ?profile= に指定するトークン（空なら無効）
+    PROFILE_SAMPLE_RATE: float = 0.0  # 対象パスのリクエストを自動で計測する確率
+    PROFILE_PATHS: list[str] = ["/analyzeReceipt", "/ranking"]
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_DIR: str = "profiles"
+    PROFILE_MAX_FILES: int = 20
+
+    # --- ランキング（プロセス内リーダーボード）設定 ---
+    LEADERBOARD_ENABLED: bool = True  # 無効時は毎回 get_ranking（データベース）を呼ぶ
+    LEADERBOARD_RESYNC_SECONDS: float = 300.0  # user_savings_totals から読み直す間隔
+    LEADERBOARD_PAGE_SIZE: int = 1000  # 読み込み1回あたりの件数（PostgREST の max-rows 以下）
+
+    # --- レシート一括取り込み設定 ---
+    RECEIPT_BULK_MAX_ITEMS: int = 500  # POST /receipts:bulk の1リクエストあたりの上限
+
+    # --- 節約記録の書き込み（write-behind）設定 ---
+    SAVINGS_BATCH_SIZE: int = 100  # 1回の挿入でまとめる savings_records の最大件数
+    SAVINGS_FLUSH_INTERVAL_SECONDS: float = 1.0  # 件数に達しなくても挿入する間隔
+    SAVINGS_SPILL_DIR: str = "spill"  # 挿入前のレコードを保存するディレクトリ（再起動後も残る場所にする）
+    SAVINGS_DRAIN_TIMEOUT_SECONDS: float = 10.0  # 停止時に残りの挿入を待つ最大秒数
+
+    # --- 市場データのワーカー間共有設定 ---
+    MARKET_SNAPSHOT_DIR: str = "market_snapshot"  # スナップショットの置き場所（空なら共有しない。/dev/shm 配下も可）
+    MARKET_SNAPSHOT_CHECK_SECONDS: float = 5.0  # 他のワーカーが書き出した新しい版を確認する間隔
+
+    # --- 実売価格の集計（店舗 × 商品）設定 ---
+    OBSERVED_PRICES_ENABLED: bool = True
+    OBSERVED_PRICES_FLUSH_SECONDS: float = 60.0  # 差分をデータベースの集計へ併合する間隔
+    OBSERVED_PRICES_MAX_KEYS: int = 10000  # ワーカーが差分を持つ（店舗, 商品）の最大数
+    OBSERVED_PRICES_COMPRESSION: int = 100  # 分位点スケッチの重心数の目安（大きいほど正確で大きい）
+    OBSERVED_PRICES_MIN_COUNT: int = 5  # これより観測の少ない集計は返さない
+    OBSERVED_PRICES_BATCH_SIZE: int = 500  # merge_store_item_prices 1回あたりの行数
+
+    # --- HTTP キャッシュ設定 ---
+    RANKING_PUBLIC_MAX_AGE: int = 60  # GET /ranking/top を共有キャッシュ（CDN など）に置ける秒数
+
     # Pydantic Settings の設定
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -1,4 +1,4 @@
 from .auth import CurrentUser
-from .db import supabase
+from .db import execute, execute_raw, iter_pages, supabase
 
-__all__ = ["CurrentUser", "supabase"]
+__all__ = ["CurrentUser", "execute", "execute_raw", "iter_pages", "supabase"]
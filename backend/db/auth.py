@@ -1,3 +1,7 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from typing import Annotated
 
 from config import settings
@@ -5,15 +9,90 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt  # type: ignore
 from loguru import logger
+from services.metrics import AUTH_CACHE_TOTAL
 
 security = HTTPBearer()
 
 
-def get_current_user(
+class _ExpiringLRU[V]:
+    """要素ごとに有効期限を持つ、件数上限付きの LRU キャッシュ（スレッドセーフ）"""
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[bytes, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: bytes, now: float) -> V | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: bytes, value: V, expires_at: float) -> None:
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# 検証済みトークン（トークンのハッシュ → ユーザー情報）。期限はトークンの exp
+_verified: _ExpiringLRU[dict[str, str]] = _ExpiringLRU(settings.AUTH_CACHE_SIZE)
+# 検証に失敗したトークン（→ 401 の detail）。大量の不正トークンで上の検証済みキャッシュを追い出されないよう分ける
+_rejected: _ExpiringLRU[str] = _ExpiringLRU(settings.AUTH_NEGATIVE_CACHE_SIZE)
+
+
+def clear_token_cache() -> None:
+    """検証結果のキャッシュを破棄します（テストや JWT シークレットの変更時用）。"""
+    _verified.clear()
+    _rejected.clear()
+
+
+def _decode_token(token: str, jwt_secret: str) -> tuple[dict[str, str], float]:
+    """トークンを検証し、ユーザー情報とキャッシュの有効期限（exp。なければ最大保持時間）を返します。"""
+    # Supabaseのトークンを検証
+    # Supabaseはデフォルトで HS256 を使用
+    payload = jwt.decode(
+        token,
+        jwt_secret,
+        algorithms=["HS256"],
+        audience="authenticated",
+    )
+    user_id: str = payload.get("sub", "")
+    if not user_id:
+        raise JWTError("missing sub claim")
+
+    user = {
+        "id": user_id,
+        "email": payload.get("email", ""),
+        "role": payload.get("role", ""),
+    }
+    expires_at = time.time() + settings.AUTH_CACHE_MAX_TTL_SECONDS
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        expires_at = min(expires_at, float(exp))
+    return user, expires_at
+
+
+async def get_current_user(
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)]
 ) -> dict[str, str]:
     """
     Supabase JWTトークンを検証し、ユーザー情報を返す。
+    検証結果はトークンのハッシュをキーにキャッシュし、2回目以降は署名を検証しません。
+    （検証済みは exp まで、失敗は AUTH_NEGATIVE_CACHE_SECONDS だけ保持）
     """
     token = credentials.credentials
     jwt_secret = settings.SUPABASE_JWT_SECRET
@@ -25,37 +104,32 @@ def get_current_user(
             detail="Server configuration error: JWT secret not set",
         )
 
+    key = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+    user = _verified.get(key, now)
+    if user is not None:
+        AUTH_CACHE_TOTAL.inc(result="hit")
+        return dict(user)
+    detail = _rejected.get(key, now)
+    if detail is not None:
+        AUTH_CACHE_TOTAL.inc(result="negative_hit")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+    AUTH_CACHE_TOTAL.inc(result="miss")
     try:
-        # Supabaseのトークンを検証
-        # Supabaseはデフォルトで HS256 を使用
-        payload = jwt.decode(
-            token,
-            jwt_secret,
-            algorithms=["HS256"],
-            audience="authenticated",
-        )
-        user_id: str = payload.get("sub", "")
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token: missing sub claim",
-            )
-
-        email: str = payload.get("email", "")
-        role: str = payload.get("role", "")
-
-        return {
-            "id": user_id,
-            "email": email,
-            "role": role,
-        }
+        user, expires_at = _decode_token(token, jwt_secret)
     except JWTError as e:
         logger.error(f"JWT verification failed: {e}")
+        detail = f"Invalid token: {str(e)}"
+        _rejected.put(key, detail, now + settings.AUTH_NEGATIVE_CACHE_SECONDS)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}",
+            detail=detail,
         )
 
+    _verified.put(key, user, expires_at)
+    return dict(user)
+
 
 # 依存性注入用のエイリアス
 CurrentUser = Annotated[dict[str, str], Depends(get_current_user)]
@@ -1,8 +1,87 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from typing import TYPE_CHECKING, Any, Protocol
+
 from config import settings
+from postgrest import APIError, APIResponse
+from services.lazy import lazy
+from services.resilience import get_breaker, timeout_for
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+def _create_supabase() -> "Client":
+    # supabase（auth / storage / realtime を含む）の読み込みも、クライアントを作るときまで遅らせる
+    from supabase import create_client
+    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+
+
+# 最初に使われたとき（または起動時のウォームアップ）に作る
+supabase: "Client" = lazy(_create_supabase)
+
+
+class _Executable(Protocol):
+    def execute(self) -> APIResponse: ...
+
+
+class _Sendable(Protocol):
+    # postgrest のクエリビルダーが持つ RequestConfig（session・path・params・headers・auth）
+    @property
+    def request(self) -> Any: ...
+
+
+async def execute(query: _Executable) -> APIResponse:
+    """
+    Supabaseのクエリをスレッドで実行します（イベントループをブロックしない）。
+    リクエストの残り時間をタイムアウトとし、連続失敗時はサーキットブレーカーで即座に失敗させます。
+    """
+    timeout = timeout_for(None)
+    # APIError は制約違反など呼び出し側の問題なので、遮断判定には数えない
+    with get_breaker("supabase").guard(ignore=(APIError,)):
+        async with asyncio.timeout(timeout):
+            return await asyncio.to_thread(query.execute)
+
+
+def _send_raw(query: _Sendable) -> bytes:
+    # RequestConfig.send() は postgrest-py の版によって引数が違うため、組み立て済みの
+    # URL・パラメータ・ヘッダーで、クライアントの httpx セッションから直接 GET する（select 専用）
+    config = query.request
+    response = config.session.get(str(config.path), params=config.params, headers=config.headers, auth=config.auth)
+    if not response.is_success:
+        try:
+            error = response.json()
+        except ValueError:
+            error = {"message": response.text}
+        raise APIError(error if isinstance(error, dict) else {"message": str(error)})
+    return response.content
+
+
+async def execute_raw(query: _Sendable) -> bytes:
+    """
+    execute と同じくクエリを実行し、応答の本文（JSON）を解析せずにそのまま返します。
+    postgrest-py による応答の解析（再帰的な JSON 型での検証）は大きな JSONB 列で非常に遅いため、
+    行をそのまま応答に流す場合や、pydantic_core.from_json で解析する場合に使います。
+    """
+    timeout = timeout_for(None)
+    with get_breaker("supabase").guard(ignore=(APIError,)):
+        async with asyncio.timeout(timeout):
+            return await asyncio.to_thread(_send_raw, query)
 
-from supabase import Client, create_client
 
-supabase: Client = create_client(
-    settings.SUPABASE_URL,
-    settings.SUPABASE_SERVICE_ROLE_KEY
-)
+async def iter_pages(build: Callable[[], Any], key: str, page_size: int) -> AsyncIterator[list[Any]]:
+    """
+    build() が返すクエリを key 列のキーセット（key > 前ページ末尾）で page_size 件ずつ取得します。
+    PostgREST の最大取得件数（max-rows）を超える全件読み込みに使います。
+    """
+    last: Any = None
+    while True:
+        query = build().order(key).limit(page_size)
+        if last is not None:
+            query = query.gt(key, last)
+        rows = (await execute(query)).data
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1][key]
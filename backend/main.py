@@ -1,25 +1,188 @@
 import asyncio
-from typing import Any
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from datetime import date
+from typing import Any, Literal
+from uuid import uuid4
 
 from config import settings
-from db import CurrentUser, supabase
-from fastapi import FastAPI, File, UploadFile
+from db import CurrentUser, execute, execute_raw, iter_pages, supabase
+from fastapi import FastAPI, File, Form, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from loguru import logger
-from model import analyze_receipt_with_market_data
+from model import analyze_receipt_with_market_data, get_latency_stats, warm_up_client
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import from_json
 from schemas import (
+    AnalyticsResponse,
     EStatClient,
+    ObservedPriceResponse,
     Profile,
     ProfileUpdate,
-    RankingEntry,
     RankingResponse,
     Receipt,
+    ReceiptBulkCreate,
+    ReceiptBulkItemResult,
+    ReceiptBulkResponse,
     ReceiptCreate,
+    ReceiptImport,
+    ReceiptSummary,
     ReceiptUpdate,
+    precompile_rules,
 )
-from services.market_data import fetch_all_market_data
+from services import leaderboard, metrics
+from services.analytics import AnalyticsGroupBy, analytics_from_rows
+from services.compression import accepts_gzip, gzip_stream, json_response
+from services.etag import INSTANCE_ID, check_etag, make_etag
+from services.export import EXPORT_MEDIA_TYPES, ExportFormat, export_stream
+from services.lazy import ensure_created, lazy
+from services.market_data import fetch_all_market_data, get_cached_class_maps, get_cached_market_data
+from services.observed_prices import (
+    ALL_STORES,
+    OBSERVED_PRICE_COLUMNS,
+    ObservedPrices,
+    merge_rows,
+    observed_price_from_row,
+)
+from services.pagination import after_cursor_filter, after_row_filter, split_page
+from services.price_history import PRICE_HISTORY_COLUMNS, attach_price_history, history_canonicals
+from services.profiling import ProfilingMiddleware
+from services.ranking import ranking_from_rows
+from services.resilience import (
+    DeadlineMiddleware,
+    cancel_on_disconnect,
+    deadline_after,
+    get_breaker_states,
+)
+from services.text_analysis import analyze_receipt_text
+from services.warmup import warmup
+from services.write_behind import WriteBehindBuffer
+
+
+def _period_totals_query(period: leaderboard.RankingPeriod, start: date | None) -> Any:
+    if start is None:
+        return supabase.table("user_savings_totals").select("user_id, net_saved, total_overpaid")
+    return supabase.table("user_savings_period_totals").select(
+        "user_id, net_saved, total_overpaid"
+    ).eq("period", period).eq("period_start", start.isoformat())
+
+
+async def _sync_leaderboard() -> None:
+    """profiles と、通算・今週・今月の集計を全件読み込み、ランキングを作り直します。"""
+    started = time.time()
+    page_size = settings.LEADERBOARD_PAGE_SIZE
+    nicknames = await leaderboard.load_nicknames(iter_pages(
+        lambda: supabase.table("profiles").select("id, nickname").not_.is_("nickname", "null"),
+        "id", page_size,
+    ))
+    for period, board in leaderboard.leaderboards.items():
+        start = leaderboard.current_period_start(period)
+        users = await leaderboard.load_users(
+            iter_pages(lambda: _period_totals_query(period, start), "user_id", page_size),
+            nicknames,
+        )
+        # 並べ替えはスレッドで行い、イベントループを止めない
+        await asyncio.to_thread(board.replace, users, started, start)
+        logger.info(f"Leaderboard synced ({period}): {len(users)} users")
+    logger.info(f"Leaderboards synced in {time.time() - started:.1f}s")
+
+
+async def _leaderboard_sync_loop() -> None:
+    while True:
+        try:
+            await _sync_leaderboard()
+        except Exception as e:
+            logger.warning(f"Failed to sync leaderboard: {e}")
+        await asyncio.sleep(settings.LEADERBOARD_RESYNC_SECONDS)
+
+
+async def _insert_savings_records(records: list[dict[str, Any]]) -> None:
+    # 再投入で二重にならないよう、アプリ側で付けた id が既にあれば無視する
+    with deadline_after(settings.REQUEST_TIMEOUT_SECONDS):
+        await execute(supabase.table("savings_records").upsert(records, ignore_duplicates=True))
+
+
+# /analyzeReceipt の savings_records は応答の経路では挿入せず、まとめて書き出す
+savings_writer = WriteBehindBuffer(
+    "savings_records",
+    _insert_savings_records,
+    batch_size=settings.SAVINGS_BATCH_SIZE,
+    flush_interval=settings.SAVINGS_FLUSH_INTERVAL_SECONDS,
+    spill_dir=settings.SAVINGS_SPILL_DIR,
+)
+
+# 解析結果の単価（店舗 × 商品）の、データベースへ併合する前の差分
+observed_prices = ObservedPrices(settings.OBSERVED_PRICES_MAX_KEYS, settings.OBSERVED_PRICES_COMPRESSION)
+
+
+async def _flush_observed_prices() -> None:
+    """実売価格の差分を merge_store_item_prices でデータベースの集計へ併合します。"""
+    pending = list(observed_prices.take().items())
+    size = settings.OBSERVED_PRICES_BATCH_SIZE
+    for start in range(0, len(pending), size):
+        try:
+            with deadline_after(settings.REQUEST_TIMEOUT_SECONDS):
+                await execute(supabase.rpc("merge_store_item_prices", {
+                    "p_rows": merge_rows(dict(pending[start:start + size])),
+                    "p_compression": settings.OBSERVED_PRICES_COMPRESSION,
+                }))
+        except BaseException:
+            # 併合していない分は次回に持ち越す
+            observed_prices.restore(dict(pending[start:]))
+            raise
+    observed_prices.mark_flushed()
+
+
+async def _observed_prices_flush_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.OBSERVED_PRICES_FLUSH_SECONDS)
+        try:
+            await _flush_observed_prices()
+        except Exception as e:
+            logger.warning(f"Failed to flush observed prices: {e}")
+
+
+async def _prefetch_market_data() -> int:
+    # 分類マップも市場データと一緒にキャッシュされる（他のワーカーが取得済みなら、その版を読み込むだけ）
+    return len(await fetch_all_market_data(estat_client))
+
+
+async def _warm_up() -> None:
+    """クライアントの生成・市場データの取得・ルールのコンパイルを並行して済ませます。"""
+    await warmup.run({
+        "supabase": lambda: asyncio.to_thread(ensure_created, supabase),
+        "gemini": lambda: asyncio.to_thread(warm_up_client),
+        "rules": lambda: asyncio.to_thread(precompile_rules),
+        "market_data": _prefetch_market_data,
+    })
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # ウォームアップは待たずにリクエストの受け付けを始める（進み具合は /health の startup）
+    warm_task = asyncio.create_task(_warm_up())
+    await savings_writer.start()
+    sync_task = asyncio.create_task(_leaderboard_sync_loop()) if settings.LEADERBOARD_ENABLED else None
+    prices_task = (
+        asyncio.create_task(_observed_prices_flush_loop()) if settings.OBSERVED_PRICES_ENABLED else None
+    )
+    yield
+    for task in (warm_task, sync_task, prices_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await savings_writer.drain(settings.SAVINGS_DRAIN_TIMEOUT_SECONDS)
+    if prices_task is not None:
+        try:
+            await _flush_observed_prices()
+        except Exception as e:
+            logger.warning(f"Failed to flush observed prices on shutdown: {e}")
 
-app = FastAPI(title="Receipt AI Analyzer", version="2.0-advanced")
+
+app = FastAPI(title="Receipt AI Analyzer", version="2.0-advanced", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,9 +190,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
-estat_client = EStatClient()
+estat_client = lazy(EStatClient)
 
 
 @app.get("/health")
@@ -37,12 +203,34 @@ def health() -> dict[str, Any]:
     return {
         "ok": True,
         "vision_model": settings.GEMINI_MODEL,
+        "fallback_model": settings.GEMINI_MODEL_FALLBACK,
+        "model_latency": get_latency_stats(),
+        "circuit_breakers": get_breaker_states(),
+        "leaderboard": {period: board.stats() for period, board in leaderboard.leaderboards.items()},
+        "savings_writer": savings_writer.stats(),
+        "observed_prices": observed_prices.stats(),
         "estat_app_id_set": bool(settings.ESTAT_APP_ID),
+        "startup": warmup.stats(),
     }
 
 
+@app.get("/health/ready")
+def health_ready() -> dict[str, bool]:
+    """起動時のウォームアップが終わっていれば 200、まだなら 503 を返します（readiness probe 用）。"""
+    if not warmup.ready:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"ready": True}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> str:
+    """Prometheus 形式のメトリクス（各段階の処理時間、トークン数、e-Statリクエスト数、キャッシュヒット数）"""
+    return metrics.render()
+
+
 @app.post("/analyzeReceipt")
 async def analyze_receipt(
+    request: Request,
     user: CurrentUser,
     file: UploadFile = File(...)
 ):
@@ -51,51 +239,134 @@ async def analyze_receipt(
     1. e-Stat APIから最新の市場価格を取得
     2. 画像と市場価格をGeminiに送信
     3. AIによる正規化・比較結果を返却
+    クライアントが切断した場合は、進行中の e-Stat / Gemini 呼び出しをキャンセルします。
     """
     file_bytes = await file.read()
+    return await cancel_on_disconnect(request, _analyze_and_record(user, file_bytes))
 
+
+async def _analyze_and_record(user: dict[str, str], file_bytes: bytes) -> dict[str, Any]:
     # e-Stat APIから全品目の市場価格を取得（キャッシュ付き）
     logger.info("Fetching market data from e-Stat API...")
     market_data = await fetch_all_market_data(estat_client)
     logger.info(f"Market data fetched: {len(market_data)} items")
 
     # Gemini による高度な画像解析を実行
+    logger.info("Starting AI analysis with market data...")
+    analysis_result = await analyze_receipt_with_market_data(file_bytes, market_data)
+    logger.info("AI analysis task completed.")
+
+    await _attach_price_history(user, analysis_result)
+
+    # 解析成功後、節約額をSupabaseに保存
+    _record_savings(user, analysis_result)
+    _record_observed_prices(analysis_result)
+    return analysis_result
+
+
+async def _attach_price_history(user: dict[str, str], analysis_result: dict[str, Any]) -> None:
+    """
+    解析結果の各商品に、自分の過去の購入価格（user_item_prices の1行）を付けます。
+    取得に失敗しても解析結果はそのまま返します（history は付けない）。
+    """
+    items = analysis_result.get("items")
+    canonicals = history_canonicals(items)
+    if not canonicals:
+        return
     try:
-        logger.info("Starting AI analysis with market data...")
-        async with asyncio.TaskGroup() as tg:
-            logger.info("Creating task for analyze_receipt_with_market_data...")
-            task = tg.create_task(analyze_receipt_with_market_data(file_bytes, market_data))
-            logger.info("Task created, awaiting result...")
+        result = await execute(supabase.table("user_item_prices").select(PRICE_HISTORY_COLUMNS).eq(
+            "user_id", user["id"]
+        ).in_("canonical", canonicals))
+    except Exception as e:
+        logger.warning(f"Failed to fetch price history: {e}")
+        return
+    attach_price_history(items, result.data)
 
-        analysis_result = task.result()
-        logger.info("AI analysis task completed.")
 
-        # 解析成功後、節約額をSupabaseに保存
-        try:
-            summary = analysis_result.get("summary", {})
-            supabase.table("savings_records").insert({
-                "user_id": user["id"],
-                "purchase_date": analysis_result.get("purchase_date", "1970-01-01"),
-                "store_name": analysis_result.get("store_name"),
-                "total_saved_amount": int(summary.get("total_saved_amount", 0)),
-                "total_overpaid_amount": int(summary.get("total_overpaid_amount", 0)),
-                "item_count": len(analysis_result.get("items", []))
-            }).execute()
-            logger.info(f"Savings record saved for user {user['id']}")
-        except Exception as save_error:
-            logger.warning(f"Failed to save savings record: {save_error}")
-
-        return analysis_result
-
-    except* Exception as eg:
-        for e in eg.exceptions:
-            print(f"Error during AI analysis: {str(e)}")
+def _record_savings(user: dict[str, str], analysis_result: dict[str, Any]) -> None:
+    """節約額を savings_records の書き出し待ちに積み、ランキングへ即座に反映します。"""
+    try:
+        summary = analysis_result.get("summary", {})
+        saved = int(summary.get("total_saved_amount", 0))
+        overpaid = int(summary.get("total_overpaid_amount", 0))
+        savings_writer.enqueue({
+            "id": str(uuid4()),
+            "user_id": user["id"],
+            "purchase_date": analysis_result.get("purchase_date", "1970-01-01"),
+            "store_name": analysis_result.get("store_name"),
+            "total_saved_amount": saved,
+            "total_overpaid_amount": overpaid,
+            "item_count": len(analysis_result.get("items", []))
+        })
+        leaderboard.record_savings(user["id"], analysis_result.get("purchase_date"), saved, overpaid)
+        logger.info(f"Savings record queued for user {user['id']}")
+    except Exception as save_error:
+        logger.warning(f"Failed to save savings record: {save_error}")
+
+
+def _record_observed_prices(analysis_result: dict[str, Any]) -> None:
+    """解析結果の単価を、店舗 × 商品の実売価格の集計に加えます（保存は定期的にまとめて行う）。"""
+    if settings.OBSERVED_PRICES_ENABLED:
+        observed_prices.observe_analysis(analysis_result)
+
+
+@app.post("/analyzeReceiptText")
+async def analyze_receipt_text_endpoint(
+    request: Request,
+    user: CurrentUser,
+    text: str = Form(..., max_length=settings.TEXT_ANALYSIS_MAX_CHARS),
+    file: UploadFile | None = File(None),
+):
+    """
+    端末側OCRで読み取ったレシートテキストを、AIを使わずに解析します。
+    市場データと照合できた商品の割合が TEXT_ANALYSIS_MIN_CONFIDENCE 未満で、
+    画像（file）も送られている場合は /analyzeReceipt と同じAI解析にフォールバックします。
+    解析はイベントループ上で行うため、テキストの長さと行数には上限があります。
+    """
+    if text.count("\n") >= settings.TEXT_ANALYSIS_MAX_LINES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"テキストは {settings.TEXT_ANALYSIS_MAX_LINES} 行までです",
+        )
+    market_data = get_cached_market_data() or await fetch_all_market_data(estat_client)
+    analysis_result = analyze_receipt_text(text, market_data, get_cached_class_maps())
+
+    confidence = float(analysis_result["debug"]["confidence"])
+    if confidence < settings.TEXT_ANALYSIS_MIN_CONFIDENCE:
+        if file is not None:
+            logger.info(f"Text analysis confidence {confidence:.2f} is low, falling back to vision analysis")
+            file_bytes = await file.read()
+            return await cancel_on_disconnect(request, _analyze_and_record(user, file_bytes))
+        analysis_result["debug"]["low_confidence"] = True
+
+    await _attach_price_history(user, analysis_result)
+    # 照合できなかったテキスト（クライアントが送った文字列）の差額は節約額・ランキングに入れない
+    if not analysis_result["debug"].get("low_confidence"):
+        _record_savings(user, analysis_result)
+    _record_observed_prices(analysis_result)
+    return analysis_result
+
+
+async def _data_version(user_id: str, scope: str) -> int:
+    """data_versions（receipts / profiles への書き込みごとに増える）の現在の版。"""
+    result = await execute(
+        supabase.table("data_versions").select("version")
+        .eq("user_id", user_id).eq("scope", scope).limit(1)
+    )
+    rows = result.data
+    if rows and isinstance(rows[0], dict):
+        return int(rows[0].get("version") or 0)
+    return 0
 
 
 @app.get("/profile", response_model=Profile)
-async def get_profile(user: CurrentUser) -> Profile:
-    """自分のプロフィールを取得します。"""
-    result = supabase.table("profiles").select("id, nickname").eq("id", user["id"]).execute()
+async def get_profile(request: Request, response: Response, user: CurrentUser) -> Profile | Response:
+    """自分のプロフィールを取得します。前回から変更がなければ 304 を返します。"""
+    etag = make_etag("profile", user["id"], await _data_version(user["id"], "profile"))
+    if (not_modified := check_etag(request, response, etag)) is not None:
+        return not_modified
+
+    result = await execute(supabase.table("profiles").select("id, nickname").eq("id", user["id"]))
     if result.data and len(result.data) > 0:
         record = result.data[0]
         if isinstance(record, dict):
@@ -103,99 +374,168 @@ async def get_profile(user: CurrentUser) -> Profile:
             nickname = str(nickname_val) if nickname_val is not None else None
             return Profile(id=str(record.get("id", "")), nickname=nickname)
     # プロフィールが存在しない場合は作成
-    supabase.table("profiles").insert({"id": user["id"]}).execute()
+    await execute(supabase.table("profiles").insert({"id": user["id"]}))
     return Profile(id=user["id"], nickname=None)
 
 
 @app.put("/profile", response_model=Profile)
 async def update_profile(user: CurrentUser, data: ProfileUpdate) -> Profile:
     """自分のプロフィールを更新します。"""
-    result = supabase.table("profiles").upsert({
+    result = await execute(supabase.table("profiles").upsert({
         "id": user["id"],
         "nickname": data.nickname
-    }).execute()
+    }))
     if result.data and len(result.data) > 0:
         record = result.data[0]
         if isinstance(record, dict):
             nickname_val = record.get("nickname")
             nickname = str(nickname_val) if nickname_val is not None else None
+            leaderboard.set_nickname(user["id"], nickname)
             return Profile(id=str(record.get("id", "")), nickname=nickname)
+    leaderboard.set_nickname(user["id"], data.nickname)
     return Profile(id=user["id"], nickname=data.nickname)
 
 
+async def _ranking_from_database(
+    user_id: str | None,
+    limit: int,
+    period: leaderboard.RankingPeriod,
+) -> RankingResponse:
+    """集計済みのテーブルから、上位N名と（user_id があれば）自分の順位だけを取得します。"""
+    start = leaderboard.current_period_start(period)
+    if start is None:
+        query = supabase.rpc("get_ranking", {"p_user_id": user_id, "p_limit": limit})
+    else:
+        query = supabase.rpc("get_period_ranking", {
+            "p_user_id": user_id,
+            "p_period": period,
+            "p_period_start": start.isoformat(),
+            "p_limit": limit,
+        })
+    result = await execute(query)
+    return ranking_from_rows(result.data)
+
+
 @app.get("/ranking", response_model=RankingResponse)
-async def get_ranking(user: CurrentUser, limit: int = 10) -> RankingResponse:
+async def get_ranking(
+    request: Request,
+    response: Response,
+    user: CurrentUser,
+    limit: int = 10,
+    period: leaderboard.RankingPeriod = "all",
+) -> RankingResponse | Response:
     """
     純節約額ランキングを取得します。
     純節約額 = 節約額 - 過払い額 でユーザーを順位付けし、上位N名と自分の順位を返します。
+    period: all=通算, week=今週（月曜始まり）, month=今月（購入日で集計）
+    """
+    # プロセス内のランキングが現在の期間で読み込み済みなら、データベースに問い合わせずに返す
+    board = leaderboard.leaderboards[period]
+    if board.is_current():
+        etag = make_etag("ranking", INSTANCE_ID, period, board.period_start, board.version, limit, user["id"])
+        if (not_modified := check_etag(request, response, etag)) is not None:
+            return not_modified
+        return board.ranking(user["id"], limit)
+
+    return await _ranking_from_database(user["id"], limit, period)
+
+
+@app.get("/ranking/top", response_model=RankingResponse)
+async def get_ranking_top(
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1, le=100),
+    period: leaderboard.RankingPeriod = "all",
+) -> RankingResponse | Response:
+    """
+    ランキングの上位N名のみを取得します（認証不要・自分の順位は含みません）。
+    全員に同じ内容のため、CDN などの共有キャッシュに RANKING_PUBLIC_MAX_AGE 秒置けます。
+    """
+    cache_control = f"public, max-age={settings.RANKING_PUBLIC_MAX_AGE}"
+    board = leaderboard.leaderboards[period]
+    if board.is_current():
+        etag = make_etag("ranking-top", INSTANCE_ID, period, board.period_start, board.version, limit)
+        if (not_modified := check_etag(request, response, etag, cache_control)) is not None:
+            return not_modified
+        return board.ranking(None, limit)
+
+    response.headers["Cache-Control"] = cache_control
+    return await _ranking_from_database(None, limit, period)
+
+
+# =================================================================
+# 支出分析
+# =================================================================
+
+
+@app.get("/analytics", response_model=AnalyticsResponse)
+async def get_analytics(
+    request: Request,
+    response: Response,
+    user: CurrentUser,
+    group_by: AnalyticsGroupBy = "month",
+    from_: date | None = Query(None, alias="from"),
+    to: date | None = None,
+    limit: int = Query(50, ge=1, le=500),
+) -> AnalyticsResponse | Response:
+    """
+    自分の支出・節約額・過払い額を、月別（month）・店舗別（store）・商品別（item）に集計します。
+    from / to は月単位の範囲です（その日付を含む月から・月まで）。
+    集計済みのテーブルから読むため、レシートの件数が多くても応答時間はほぼ一定です。
+    """
+    if from_ is not None and to is not None and from_ > to:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+
+    # 集計はレシートからのみ作られるため、レシートの版が同じなら結果も同じ
+    version = await _data_version(user["id"], "receipts")
+    etag = make_etag("analytics", user["id"], version, group_by, from_, to, limit)
+    if (not_modified := check_etag(request, response, etag)) is not None:
+        return not_modified
+
+    result = await execute(supabase.rpc("get_spending_analytics", {
+        "p_user_id": user["id"],
+        "p_group_by": group_by,
+        "p_from": from_.isoformat() if from_ else None,
+        "p_to": to.isoformat() if to else None,
+        "p_limit": limit,
+    }))
+    return analytics_from_rows(result.data, group_by)
+
+
+# =================================================================
+# 実売価格（全ユーザーの観測）
+# =================================================================
+
+
+@app.get("/prices/observed", response_model=ObservedPriceResponse)
+async def get_observed_prices(
+    user: CurrentUser,
+    canonical: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+) -> ObservedPriceResponse:
+    """
+    全ユーザーのレシートから集めた、商品（canonical）の実売価格（単価）の統計を返します。
+    全店舗の集計と、店舗ごとの集計（観測数の多い順に limit 件）で、分位点は近似値です。
+    観測が OBSERVED_PRICES_MIN_COUNT 未満の集計は含みません。
+    各ワーカーの直近 OBSERVED_PRICES_FLUSH_SECONDS 秒程度の観測は、まだ反映されていないことがあります。
     """
-    # ユーザーごとの節約額・過払い額を集計してランキング取得
-    # Supabaseでは直接GROUP BYができないため、全データ取得後にPythonで集計
-    result = supabase.table("savings_records").select(
-        "user_id, total_saved_amount, total_overpaid_amount"
-    ).execute()
-
-    # 全ユーザーのニックネームを取得
-    profiles_result = supabase.table("profiles").select("id, nickname").execute()
-    user_nicknames: dict[str, str | None] = {}
-    for profile in profiles_result.data:
-        if profile and isinstance(profile, dict):
-            uid = str(profile.get("id", ""))
-            nickname_val = profile.get("nickname")
-            user_nicknames[uid] = str(nickname_val) if nickname_val else None
-
-    # ユーザーごとに集計（純節約額と過払い額を別々に追跡）
-    user_net_saved: dict[str, int] = {}
-    user_overpaid: dict[str, int] = {}
-    for record in result.data:
-        if not record or not isinstance(record, dict):
+    result = await execute(supabase.table("store_item_prices").select(OBSERVED_PRICE_COLUMNS).eq(
+        "canonical", canonical
+    ).gte("observation_count", settings.OBSERVED_PRICES_MIN_COUNT).order(
+        "observation_count", desc=True
+    ).limit(limit + 1))
+
+    all_stores = None
+    stores = []
+    for row in result.data:
+        if not row or not isinstance(row, dict):
             continue
-        uid = str(record.get("user_id", ""))
-        saved_value = record.get("total_saved_amount", 0)
-        overpaid_value = record.get("total_overpaid_amount", 0)
-        saved = int(saved_value) if isinstance(saved_value, (int, float, str)) else 0
-        overpaid = int(overpaid_value) if isinstance(overpaid_value, (int, float, str)) else 0
-        # 純節約額 = 節約額 - 過払い額
-        net_saved = saved - overpaid
-        user_net_saved[uid] = user_net_saved.get(uid, 0) + net_saved
-        user_overpaid[uid] = user_overpaid.get(uid, 0) + overpaid
-
-    # 純節約額で降順ソート
-    sorted_users = sorted(user_net_saved.items(), key=lambda x: x[1], reverse=True)
-
-    # ランキング作成
-    rankings: list[RankingEntry] = []
-    my_rank: int | None = None
-    my_nickname: str | None = None
-    my_total_saved = 0
-    my_total_overpaid = 0
-
-    for i, (uid, net_total) in enumerate(sorted_users):
-        rank = i + 1
-        overpaid_total = user_overpaid.get(uid, 0)
-        nickname = user_nicknames.get(uid)
-        if uid == user["id"]:
-            my_rank = rank
-            my_nickname = nickname
-            my_total_saved = net_total
-            my_total_overpaid = overpaid_total
-
-        if rank <= limit:
-            rankings.append(RankingEntry(
-                rank=rank,
-                user_id=uid,
-                nickname=nickname,
-                total_saved=net_total,
-                total_overpaid=overpaid_total
-            ))
-
-    return RankingResponse(
-        rankings=rankings,
-        my_rank=my_rank,
-        my_nickname=my_nickname,
-        my_total_saved=my_total_saved,
-        my_total_overpaid=my_total_overpaid
-    )
+        price = observed_price_from_row(row, settings.OBSERVED_PRICES_COMPRESSION)
+        if row.get("store_name") == ALL_STORES:
+            all_stores = price
+        elif len(stores) < limit:
+            stores.append(price)
+    return ObservedPriceResponse(canonical=canonical, all_stores=all_stores, stores=stores)
 
 
 # =================================================================
@@ -203,96 +543,254 @@ async def get_ranking(user: CurrentUser, limit: int = 10) -> RankingResponse:
 # =================================================================
 
 
-@app.get("/receipts", response_model=list[Receipt])
-async def list_receipts(user: CurrentUser) -> list[Receipt]:
-    """自分のレシート履歴を取得します。"""
-    result = supabase.table("receipts").select("*").eq(
-        "user_id", user["id"]
-    ).order("created_at", desc=True).execute()
+# cursor のみ指定された場合のページサイズ
+RECEIPT_PAGE_SIZE = 20
+
+# エクスポート時に1回で読み込むレシート数
+EXPORT_PAGE_SIZE = 200
+
+# レシートの応答（Receipt）の列。この列だけを取得した行は、そのまま JSON にして返せる
+RECEIPT_FIELDS = tuple(Receipt.model_fields)
+RECEIPT_COLUMNS = ", ".join(RECEIPT_FIELDS)
+
+# 一覧の summary 表示で取得する列（result JSONB は読まず、型付きの集計列のみ）
+RECEIPT_SUMMARY_COLUMNS = ", ".join(ReceiptSummary.model_fields)
+
+
+# receipts の金額列（NUMERIC(12, 2)）に入る絶対値の上限
+MAX_RECEIPT_AMOUNT = 9_999_999_999.99
+
+
+def _amount(value: Any) -> float | None:
+    """金額として保存できる値に丸めます（数値でない値や、列に収まらない値は None）。"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            amount = round(float(value), 2)
+        except OverflowError:  # float に収まらない大きな整数
+            return None
+        # NaN・無限大もここで None になる
+        if abs(amount) <= MAX_RECEIPT_AMOUNT:
+            return amount
+    return None
+
+
+def _summary_columns(result: dict[str, Any]) -> dict[str, float | int | None]:
+    """解析結果JSONから、receipts の集計列（total_payment など）の値を計算します。"""
+    summary = result.get("summary")
+    if not isinstance(summary, dict):
+        summary = {}
+    items = result.get("items")
+    return {
+        "total_payment": _amount(summary.get("total_payment")),
+        "total_saved": _amount(summary.get("total_saved_amount")),
+        "total_overpaid": _amount(summary.get("total_overpaid_amount")),
+        "item_count": len(items) if isinstance(items, list) else None,
+    }
+
+
+def _receipt_row(record: dict[str, Any]) -> dict[str, Any]:
+    """insert / update が返す行（全列）から、Receipt の列だけを取り出します。"""
+    return {field: record.get(field) for field in RECEIPT_FIELDS}
+
+
+@app.get("/receipts", response_model=list[Receipt] | list[ReceiptSummary])
+async def list_receipts(
+    request: Request,
+    user: CurrentUser,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=100),
+    cursor: str | None = None,
+    fields: Literal["full", "summary"] = "full",
+) -> Response:
+    """
+    自分のレシート履歴を新しい順に取得します。
+    limit を指定すると (created_at, id) のキーセットでページ分割し、続きがあれば
+    X-Next-Cursor ヘッダーに次ページのカーソル（?cursor= に渡す値）を返します。
+    fields=summary では商品リストを含まない要約のみを返します（詳細は GET /receipts/{id}）。
+    limit も cursor も省略した場合は、従来どおり全件を返します。
+    履歴が前回から変わっていなければ、一覧を読まずに 304 を返します（ETag / If-None-Match）。
+    取得した行はモデルを経由せずに返し（全件取得では PostgREST の応答本文をそのまま流す）、
+    大きければ gzip で返します。
+    """
+    version = await _data_version(user["id"], "receipts")
+    etag = make_etag("receipts", user["id"], version, limit, cursor, fields)
+    if (not_modified := check_etag(request, response, etag)) is not None:
+        return not_modified
+
+    columns = RECEIPT_SUMMARY_COLUMNS if fields == "summary" else RECEIPT_COLUMNS
+    query = supabase.table("receipts").select(columns).eq("user_id", user["id"])
+    if cursor:
+        query = query.or_(after_cursor_filter(cursor))
+    query = query.order("created_at", desc=True).order("id", desc=True)
+
+    page_size = limit or (RECEIPT_PAGE_SIZE if cursor else None)
+    if page_size is None:
+        return await json_response(request, await execute_raw(query), response.headers)
+
+    raw = await execute_raw(query.limit(page_size + 1))
+    rows, next_cursor = split_page([r for r in from_json(raw) if r and isinstance(r, dict)], page_size)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return await json_response(request, rows, response.headers)
+
+
+@app.get("/receipts:export")
+async def export_receipts(
+    request: Request,
+    user: CurrentUser,
+    format: ExportFormat = "ndjson",
+) -> StreamingResponse:
+    """
+    自分のレシート履歴を、商品ごとに1行の NDJSON / CSV としてストリーミングで出力します。
+    Accept-Encoding に gzip があれば圧縮して返します。
+    """
+    async def pages() -> AsyncIterator[list[Any]]:
+        after: tuple[str, str] | None = None
+        while True:
+            query = supabase.table("receipts").select(
+                "id, purchase_date, store_name, result, created_at"
+            ).eq("user_id", user["id"])
+            if after is not None:
+                query = query.or_(after_row_filter(*after))
+            query = query.order("created_at", desc=True).order("id", desc=True).limit(EXPORT_PAGE_SIZE)
+            # 出力全体ではなく、ページごとに期限を設ける
+            with deadline_after(settings.REQUEST_TIMEOUT_SECONDS):
+                rows = (await execute(query)).data
+            if rows:
+                yield rows
+            if len(rows) < EXPORT_PAGE_SIZE:
+                return
+            after = (str(rows[-1]["created_at"]), str(rows[-1]["id"]))
+
+    body = export_stream(pages(), format)
+    headers = {
+        "Content-Disposition": f'attachment; filename="receipts.{format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if accepts_gzip(request):
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
 
-    receipts: list[Receipt] = []
-    for record in result.data:
-        if not record or not isinstance(record, dict):
-            continue
-        result_data = record.get("result")
-        if not isinstance(result_data, dict):
-            result_data = {}
-        receipts.append(Receipt(
-            id=str(record.get("id", "")),
-            user_id=str(record.get("user_id", "")),
-            purchase_date=str(record.get("purchase_date")) if record.get("purchase_date") else None,
-            store_name=str(record.get("store_name")) if record.get("store_name") else None,
-            result=result_data,
-            created_at=str(record.get("created_at", "")),
-            updated_at=str(record.get("updated_at", ""))
-        ))
-    return receipts
+
+@app.get("/receipts/{receipt_id}", response_model=Receipt)
+async def get_receipt(request: Request, user: CurrentUser, receipt_id: str) -> Response:
+    """レシート1件を解析結果付きで取得します。"""
+    rows = from_json(await execute_raw(supabase.table("receipts").select(RECEIPT_COLUMNS).eq(
+        "id", receipt_id
+    ).eq("user_id", user["id"]).limit(1)))
+    if rows and isinstance(rows[0], dict):
+        return await json_response(request, rows[0])
+    raise HTTPException(status_code=404, detail="Receipt not found")
 
 
 @app.post("/receipts", response_model=Receipt)
-async def create_receipt(user: CurrentUser, data: ReceiptCreate) -> Receipt:
+async def create_receipt(request: Request, user: CurrentUser, data: ReceiptCreate) -> Response:
     """レシートを保存します。"""
-    result = supabase.table("receipts").insert({
+    result = await execute(supabase.table("receipts").insert({
         "user_id": user["id"],
         "purchase_date": data.purchase_date,
         "store_name": data.store_name,
-        "result": data.result
-    }).execute()
+        "result": data.result,
+        **_summary_columns(data.result),
+    }))
 
     if result.data and len(result.data) > 0:
         record = result.data[0]
         if isinstance(record, dict):
-            result_data = record.get("result")
-            if not isinstance(result_data, dict):
-                result_data = {}
-            return Receipt(
-                id=str(record.get("id", "")),
-                user_id=str(record.get("user_id", "")),
-                purchase_date=str(record.get("purchase_date")) if record.get("purchase_date") else None,
-                store_name=str(record.get("store_name")) if record.get("store_name") else None,
-                result=result_data,
-                created_at=str(record.get("created_at", "")),
-                updated_at=str(record.get("updated_at", ""))
-            )
+            return await json_response(request, _receipt_row(record))
     raise Exception("Failed to create receipt")
 
 
+_receipt_import_adapter = TypeAdapter(ReceiptImport)
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in e['loc']) or 'receipt'}: {e['msg']}" for e in error.errors(include_url=False)
+    )
+
+
+@app.post("/receipts:bulk", response_model=ReceiptBulkResponse)
+async def bulk_create_receipts(user: CurrentUser, data: ReceiptBulkCreate) -> ReceiptBulkResponse:
+    """
+    端末に保存された履歴をまとめて取り込みます（最大 RECEIPT_BULK_MAX_ITEMS 件）。
+    client_id を冪等キーとし、取り込み済みのものは duplicate として再作成しません。
+    各要素は個別に検証し、不正なものは invalid として残りを取り込みます。
+    レシートは1回のデータベース呼び出しで挿入します。節約額（ランキング）には記録しません。
+    """
+    results: list[ReceiptBulkItemResult | None] = [None] * len(data.receipts)
+    pending: dict[str, tuple[int, ReceiptImport]] = {}
+    for index, raw in enumerate(data.receipts):
+        try:
+            item = _receipt_import_adapter.validate_python(raw)
+        except ValidationError as e:
+            raw_client_id = raw.get("client_id") if isinstance(raw, dict) else None
+            results[index] = ReceiptBulkItemResult(
+                index=index,
+                client_id=raw_client_id if isinstance(raw_client_id, str) else None,
+                status="invalid",
+                error=_validation_message(e),
+            )
+            continue
+        if item.client_id in pending:
+            results[index] = ReceiptBulkItemResult(index=index, client_id=item.client_id, status="duplicate")
+            continue
+        pending[item.client_id] = (index, item)
+
+    if pending:
+        payload = [item.model_dump(mode="json") | _summary_columns(item.result) for _, item in pending.values()]
+        imported = await execute(supabase.rpc("import_receipts", {
+            "p_user_id": user["id"],
+            "p_receipts": payload,
+        }))
+        outcome = {str(row["client_id"]): row for row in imported.data if isinstance(row, dict)}
+
+        for client_id, (index, _) in pending.items():
+            row = outcome.get(client_id)
+            created = bool(row and row.get("created"))
+            results[index] = ReceiptBulkItemResult(
+                index=index,
+                client_id=client_id,
+                status="created" if created else "duplicate",
+                id=str(row["id"]) if row else None,
+            )
+
+    items = [r for r in results if r is not None]
+    return ReceiptBulkResponse(
+        results=items,
+        created=sum(r.status == "created" for r in items),
+        duplicates=sum(r.status == "duplicate" for r in items),
+        invalid=sum(r.status == "invalid" for r in items),
+    )
+
+
 @app.put("/receipts/{receipt_id}", response_model=Receipt)
-async def update_receipt(user: CurrentUser, receipt_id: str, data: ReceiptUpdate) -> Receipt:
+async def update_receipt(request: Request, user: CurrentUser, receipt_id: str, data: ReceiptUpdate) -> Response:
     """レシートを更新します。"""
-    result = supabase.table("receipts").update({
-        "result": data.result
-    }).eq("id", receipt_id).eq("user_id", user["id"]).execute()
+    result = await execute(supabase.table("receipts").update({
+        "result": data.result,
+        **_summary_columns(data.result),
+    }).eq("id", receipt_id).eq("user_id", user["id"]))
 
     if result.data and len(result.data) > 0:
         record = result.data[0]
         if isinstance(record, dict):
-            result_data = record.get("result")
-            if not isinstance(result_data, dict):
-                result_data = {}
-            return Receipt(
-                id=str(record.get("id", "")),
-                user_id=str(record.get("user_id", "")),
-                purchase_date=str(record.get("purchase_date")) if record.get("purchase_date") else None,
-                store_name=str(record.get("store_name")) if record.get("store_name") else None,
-                result=result_data,
-                created_at=str(record.get("created_at", "")),
-                updated_at=str(record.get("updated_at", ""))
-            )
+            return await json_response(request, _receipt_row(record))
     raise Exception("Receipt not found or not authorized")
 
 
 @app.delete("/receipts/{receipt_id}")
 async def delete_receipt(user: CurrentUser, receipt_id: str) -> dict[str, bool]:
     """レシートを削除します。"""
-    supabase.table("receipts").delete().eq(
+    await execute(supabase.table("receipts").delete().eq(
         "id", receipt_id
-    ).eq("user_id", user["id"]).execute()
+    ).eq("user_id", user["id"]))
     return {"success": True}
 
 
 @app.delete("/receipts")
 async def clear_receipts(user: CurrentUser) -> dict[str, bool]:
     """自分のレシートを全削除します。"""
-    supabase.table("receipts").delete().eq("user_id", user["id"]).execute()
+    await execute(supabase.table("receipts").delete().eq("user_id", user["id"]))
     return {"success": True}
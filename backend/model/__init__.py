@@ -1,8 +1,10 @@
-from .genai import client
-from .generate import analyze_receipt_with_market_data, get_model_name
+from .genai import client, warm_up_client
+from .generate import analyze_receipt_with_market_data, get_latency_stats, get_model_name
 
 __all__ = [
     "client",
     "analyze_receipt_with_market_data",
+    "get_latency_stats",
     "get_model_name",
+    "warm_up_client",
 ]
@@ -1,5 +1,22 @@
-from google import genai
+from typing import TYPE_CHECKING
+
 from config import settings
+from services.lazy import ensure_created, lazy
+
+if TYPE_CHECKING:
+    from google import genai
+
+
+def _create_client() -> "genai.Client":
+    # google.genai の読み込みは重い（0.5秒程度）ため、クライアントを作るときに読み込む
+    from google import genai
+    return genai.Client(api_key=settings.GEMINI_API_KEY)
+
+
+client: "genai.Client" = lazy(_create_client)
 
 
-client = genai.Client(api_key=settings.GEMINI_API_KEY)
+def warm_up_client() -> None:
+    """google.genai の読み込みとクライアントの生成を済ませます（起動時のウォームアップ用）。"""
+    import google.genai.types  # noqa: F401
+    ensure_created(client)
@@ -1,19 +1,176 @@
+import asyncio
 import io
 import json
 import logging
-from typing import Any
+import time
+from typing import TYPE_CHECKING, Any
 
 from fastapi import HTTPException
-from google.genai import types
 from loguru import logger
 from PIL import Image
 
 from config import settings
 from schemas import GeminiReceiptResponse
 from model import client
+from services.metrics import ANALYZE_STAGE_SECONDS, GEMINI_CALL_SECONDS, GEMINI_TOKENS_TOTAL
+from services.resilience import DeadlineExceeded, get_breaker, timeout_for
+from services.units import annotate_market_data
 
+from .latency import LatencyHistogram
 from .prompt import SYSTEM_INSTRUCTION
 
+if TYPE_CHECKING:
+    from google.genai import types
+
+# モデル名 -> 応答時間ヒストグラム（成功した呼び出しと、キャンセルされた呼び出しの経過時間を記録）
+_latency_histograms: dict[str, LatencyHistogram] = {}
+
+
+def _histogram_for(model_name: str) -> LatencyHistogram:
+    hist = _latency_histograms.get(model_name)
+    if hist is None:
+        hist = LatencyHistogram()
+        _latency_histograms[model_name] = hist
+    return hist
+
+
+def get_latency_stats() -> dict[str, dict[str, float | int | None]]:
+    """モデルごとの応答時間の統計（p50/p95/p99）を返します。"""
+    return {name: hist.snapshot() for name, hist in _latency_histograms.items()}
+
+
+def _hedge_delay(model_name: str) -> float:
+    """
+    予備モデルへのリクエストを発火するまでの待ち時間（秒）を返します。
+    観測数が少ないうちは設定の既定値を使い、十分に溜まったらパーセンタイルから決めます。
+    """
+    hist = _histogram_for(model_name)
+    if hist.count < settings.GEMINI_HEDGE_MIN_SAMPLES:
+        return settings.GEMINI_HEDGE_DEFAULT_DELAY
+    p = hist.percentile(settings.GEMINI_HEDGE_PERCENTILE)
+    if p is None:
+        return settings.GEMINI_HEDGE_DEFAULT_DELAY
+    return min(max(p, settings.GEMINI_HEDGE_MIN_DELAY), settings.GEMINI_HEDGE_MAX_DELAY)
+
+
+async def _generate_with_model(model_name: str, contents: list[Any]) -> dict[str, Any]:
+    """指定モデルで解析し、GeminiReceiptResponse として妥当な応答のみを返します。"""
+    # 読み込みはウォームアップ（model.genai.warm_up）で済ませてある
+    from google.genai import types
+
+    # リクエストの残り時間を超えて待たない。遮断中のモデルは即座に失敗させる
+    timeout = timeout_for(None)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with get_breaker(f"gemini:{model_name}").guard():
+            async with asyncio.timeout(timeout):
+                response = await client.aio.models.generate_content(
+                    model=model_name,
+                    contents=contents,  # type: ignore
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        response_schema=GeminiReceiptResponse
+                    )
+                )
+        _record_token_usage(model_name, response)
+        if not response.text:
+            raise ValueError(f"{model_name} から有効な応答がありませんでした。")
+
+        # 構造化出力により、JSONは既に正しい形式で返される
+        text = response.text.strip()
+        logger.info(f"Raw Gemini response text ({model_name}): {text}")
+        with ANALYZE_STAGE_SECONDS.time(stage="json_parse"):
+            result = json.loads(text)
+            GeminiReceiptResponse.model_validate(result)
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        # ヘッジに負けてキャンセルされた遅い応答も、少なくともここまではかかった値として記録する
+        # （成功だけを記録するとパーセンタイルが低く偏り、ヘッジの締め切りが縮み続ける）
+        _histogram_for(model_name).observe(time.perf_counter() - started)
+        raise
+    finally:
+        GEMINI_CALL_SECONDS.observe(time.perf_counter() - started, model=model_name, outcome=outcome)
+
+    _histogram_for(model_name).observe(time.perf_counter() - started)
+    return result
+
+
+def _record_token_usage(model_name: str, response: "types.GenerateContentResponse") -> None:
+    usage = response.usage_metadata
+    if usage is None:
+        return
+    if usage.prompt_token_count:
+        GEMINI_TOKENS_TOTAL.inc(usage.prompt_token_count, model=model_name, direction="input")
+    if usage.candidates_token_count:
+        GEMINI_TOKENS_TOTAL.inc(usage.candidates_token_count, model=model_name, direction="output")
+
+
+async def _hedged_generate(contents: list[Any]) -> dict[str, Any]:
+    """
+    主モデルが締め切りまでに応答しない（または失敗した）場合に予備モデルへも問い合わせ、
+    先に返ってきた妥当な応答を採用します。採用されなかった側はキャンセルします。
+    """
+    primary = settings.GEMINI_MODEL
+    fallback = settings.GEMINI_MODEL_FALLBACK
+    use_hedge = settings.GEMINI_HEDGE_ENABLED and bool(fallback) and fallback != primary
+
+    tasks: dict[asyncio.Task[dict[str, Any]], str] = {}
+    errors: list[BaseException] = []
+
+    def launch(model_name: str) -> asyncio.Task[dict[str, Any]]:
+        task = asyncio.create_task(_generate_with_model(model_name, contents))
+        tasks[task] = model_name
+        return task
+
+    try:
+        primary_task = launch(primary)
+        if use_hedge:
+            delay = _hedge_delay(primary)
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if not done:
+                logger.info(f"{primary} が {delay:.2f}秒以内に応答しないため {fallback} へヘッジします")
+                launch(fallback)
+
+        pending: set[asyncio.Task[dict[str, Any]]] = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exc = task.exception()
+                if exc is None:
+                    logger.info(f"Gemini analysis completed by {tasks[task]}.")
+                    return task.result()
+                errors.append(exc)
+                logger.warning(f"Gemini Analysis Error ({tasks[task]}): {exc}")
+                # 主モデルが先に失敗した場合は、締め切りを待たずに予備モデルへ切り替える
+                if use_hedge and fallback not in tasks.values():
+                    pending.add(launch(fallback))
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    if errors and all(isinstance(e, (TimeoutError, DeadlineExceeded)) for e in errors):
+        raise DeadlineExceeded("AI分析が処理期限内に完了しませんでした")
+    detail = "; ".join(f"{type(e).__name__}: {e}" for e in errors)
+    raise HTTPException(status_code=502, detail=f"AI分析中にエラーが発生しました: {detail}")
+
+
+# 市場データ一覧 -> 組み立て済みのプロンプト（市場データが更新されたら作り直す）
+_prompt_source: list[dict[str, str | int | float]] | None = None
+_prompt = ""
+
+
+def _build_prompt(market_data: list[dict[str, str | int | float]]) -> str:
+    """単位を換算済みの市場データを埋め込んだプロンプトを返します（市場データの版ごとに1回だけ組み立てる）。"""
+    global _prompt_source, _prompt
+    if _prompt_source is not market_data:
+        market_data_json = json.dumps(annotate_market_data(market_data), ensure_ascii=False, indent=2)
+        _prompt = SYSTEM_INSTRUCTION.replace("{{MARKET_DATA_JSON}}", market_data_json)
+        _prompt_source = market_data
+    return _prompt
+
 
 async def analyze_receipt_with_market_data(
         file_bytes: bytes,
@@ -27,37 +184,23 @@ async def analyze_receipt_with_market_data(
     try:
         # プロンプトの組み立て
         logger.info("Preparing prompt for Gemini analysis...")
-        market_data_json = json.dumps(market_data, ensure_ascii=False, indent=2)
-        full_prompt = SYSTEM_INSTRUCTION.replace("{{MARKET_DATA_JSON}}", market_data_json)
+        with ANALYZE_STAGE_SECONDS.time(stage="prompt_build"):
+            full_prompt = _build_prompt(market_data)
         # 画像の読み込み
 
         logger.info("Loading image for Gemini analysis...")
-        img = Image.open(io.BytesIO(file_bytes))
+        with ANALYZE_STAGE_SECONDS.time(stage="image_decode"):
+            img = Image.open(io.BytesIO(file_bytes))
+            img.load()
         logger.info("Image loaded successfully.")
-
-        # 構造化出力を使用してGemini APIを呼び出し
-        response = await client.aio.models.generate_content(
-            model=settings.GEMINI_MODEL,
-            contents=[full_prompt, img],  # type: ignore
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=GeminiReceiptResponse
-            )
-        )
-        logger.info("Gemini analysis completed.")
-        if not response.text:
-            logger.error("Gemini APIから有効な応答がありませんでした。")
-            raise HTTPException(status_code=500, detail="Gemini APIから有効な応答がありませんでした。")
-
-        # 構造化出力により、JSONは既に正しい形式で返される
-        text = response.text.strip()
-        logger.info(f"Raw Gemini response text: {text}")
-        return json.loads(text)
-
     except Exception as e:
         logging.error(f"Gemini Analysis Error: {e}")
         raise HTTPException(status_code=500, detail=f"AI分析中にエラーが発生しました: {str(e)}")
 
+    # 構造化出力を使用してGemini APIを呼び出し（遅延時は予備モデルへヘッジ）
+    with ANALYZE_STAGE_SECONDS.time(stage="gemini_call"):
+        return await _hedged_generate([full_prompt, img])
+
 
 # 互換性のための関数
 def get_model_name() -> list[str]:
@@ -0,0 +1,61 @@
+"""
+Geminiモデルごとの応答時間ヒストグラム
+
+ヘッジ（予備モデルへの追加リクエスト）を発火する締め切りを決めるために、
+モデルごとの応答時間分布を対数スケールのバケットで記録します。
+"""
+import bisect
+
+# 0.25秒〜約128秒までを 2^(1/4) 刻みで区切ったバケット境界（秒）
+LATENCY_BUCKETS: tuple[float, ...] = tuple(0.25 * 2 ** (i / 4) for i in range(37))
+
+# これを超えたら全カウントを半減させ、古い観測値の影響を薄める
+MAX_SAMPLES = 1000
+
+
+class LatencyHistogram:
+    """
+    応答時間の分布を保持し、パーセンタイルを推定します。
+
+    観測数が MAX_SAMPLES を超えると全バケットを半減させるため、
+    直近の傾向に追従しつつメモリ使用量は一定に保たれます。
+    """
+    def __init__(self) -> None:
+        # 末尾は最大境界を超えた観測値（オーバーフロー）用
+        self._counts: list[float] = [0.0] * (len(LATENCY_BUCKETS) + 1)
+        self._total: float = 0.0
+
+    @property
+    def count(self) -> int:
+        return int(self._total)
+
+    def observe(self, seconds: float) -> None:
+        idx = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        self._counts[idx] += 1
+        self._total += 1
+        if self._total > MAX_SAMPLES:
+            self._counts = [c / 2 for c in self._counts]
+            self._total /= 2
+
+    def percentile(self, q: float) -> float | None:
+        """
+        q (0〜1) パーセンタイルが含まれるバケットの上限値を返します。観測がなければ None。
+        最大の境界を超えたバケットに含まれる場合は、最大の境界を返します（/health の JSON に inf を出さない）。
+        """
+        if self._total <= 0:
+            return None
+        target = self._total * min(max(q, 0.0), 1.0)
+        cumulative = 0.0
+        for idx, c in enumerate(self._counts):
+            cumulative += c
+            if cumulative >= target and c > 0:
+                return LATENCY_BUCKETS[min(idx, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+    def snapshot(self) -> dict[str, float | int | None]:
+        return {
+            "count": self.count,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
@@ -5,7 +5,8 @@ SYSTEM_INSTRUCTION = """
 
 # Context: 市場平均価格データ (e-Stat基準)
 判定の基準となる価格データは以下の通りです。
-このデータと単位が異なる場合（例: データはkg単位だが、レシートは個数単位）は、あなたの一般的知識を用いて重量を推定し、単位を合わせて比較してください。
+price は unit あたりの価格、base_price は base_unit（100g・100ml・1個）あたりに換算済みの価格、
+piece_grams はその品目1個（1本・1玉など）あたりの標準重量(g)です。
 
 ```json
 {{MARKET_DATA_JSON}}
@@ -23,17 +24,13 @@ SYSTEM_INSTRUCTION = """
 商品名を、市場データの品目名（漢字などの正式名称）に変換してください。
 例: "玉ねぎ" -> "たまねぎ", "ポテト" -> "馬鈴薯", "豚バラ" -> "豚肉"
 
-3. 重量推定と単位正規化 (Normalization) ★最重要
-市場データが「kg/100g」等の重量単位で、レシートが「個/パック」の場合、一般的な重量を推測して換算してください。
-推定基準の例:
-- 玉ねぎ1個 -> 約200g (0.2kg)
-- 人参1本 -> 約150g (0.15kg)
-- 卵1パック(10個) -> 約600g (0.6kg)
-- 牛乳1本 -> 1000ml (約1.03kg)
+3. 単位の換算 (Normalization)
+レシートの数量・内容量（例: 190g, 1000ml, 10個）を読み取り、base_price をその量に掛けて比較してください。
+市場データが重さの単位で、レシートが個数の場合は piece_grams で重さに換算してください。
+base_price や piece_grams が無い品目に限り、一般的な重量を推定してください。
 
 4. 価格比較と差額計算 (Calculation)
-以下の計算を行い、具体的な金額差を出してください。
-- 市場適正価格 (stat_price): 市場単価 × 推定重量 で算出。「その重さなら本来いくらか」を出す。
+- 市場適正価格 (stat_price): base_price × 購入量（基準単位の数）。「その量なら本来いくらか」を出す。
 - 価格差 (diff): 市場適正価格 - 実際の支払額。プラスなら「お得」、マイナスなら「割高」
 - 倍率 (rate): 実際の支払額 / 市場適正価格
 
@@ -34,6 +34,43 @@ ESTAT_NAME_HINTS: dict[str, list[str]] = {
     "鶏卵": ["鶏卵", "卵"],
 }
 
+# 1個（1本・1玉・1枚など）あたりの標準的な重さ（g）
+# 市場価格が重さの単位で、レシートが個数の場合（またはその逆）の換算に使う（services/units.py）
+# キーは canonical または e-Stat の品目名（"りんご" は "りんご(ふじ)" のような銘柄付きの品目名にも使う）
+PIECE_WEIGHTS: dict[str, float] = {
+    "鶏卵": 60,
+    "食パン": 60,  # 6枚切り1枚
+    "キャベツ": 1200,
+    "はくさい": 2000,
+    "レタス": 300,
+    "ブロッコリー": 300,
+    "だいこん": 1000,
+    "にんじん": 150,
+    "たまねぎ": 200,
+    "じゃがいも": 150,
+    "さつまいも": 250,
+    "かぼちゃ": 1200,
+    "きゅうり": 100,
+    "なす": 80,
+    "トマト": 150,
+    "ピーマン": 35,
+    "ねぎ": 100,
+    "りんご": 300,
+    "みかん": 100,
+    "グレープフルーツ": 350,
+    "オレンジ": 200,
+    "なし": 350,
+    "かき": 200,
+    "かき(貝)": 15,  # むき身1粒
+    "もも": 250,
+    "メロン": 1200,
+    "すいか": 5000,
+    "バナナ": 150,
+    "キウイフルーツ": 100,
+    "さば缶詰": 190,
+    "まぐろ缶詰": 70,
+}
+
 UNKNOWN_RESCUE_NORMALIZE_MAP: dict[str, str] = {
     "タマゴ": "鶏卵",
     "たまご": "鶏卵",
@@ -6,6 +6,7 @@ from .parser import (
     is_excluded_name,
     normalize_text,
     parse_receipt_text,
+    precompile_rules,
     resolve_area_code,
     resolve_canonical,
     resolve_time_code,
@@ -15,18 +16,30 @@ from .parser import (
     yyyymm_from_date,
 )
 from .schemas import (
+    AnalyticsBucket,
+    AnalyticsResponse,
     AnalyzeResponse,
     CanonicalResolution,
+    EstatResult,
     GeminiEstatResult,
     GeminiItemResult,
     GeminiReceiptResponse,
     GeminiSummary,
+    ItemResult,
+    ObservedPrice,
+    ObservedPriceResponse,
+    PriceHistory,
     Profile,
     ProfileUpdate,
     RankingEntry,
     RankingResponse,
     Receipt,
+    ReceiptBulkCreate,
+    ReceiptBulkItemResult,
+    ReceiptBulkResponse,
     ReceiptCreate,
+    ReceiptImport,
+    ReceiptSummary,
     ReceiptUpdate,
 )
 
@@ -37,6 +50,7 @@ __all__ = [
     "fold_key",
     "guess_canonical",
     "parse_receipt_text",
+    "precompile_rules",
     "yyyymm_from_date",
     "resolve_time_code",
     "resolve_area_code",
@@ -45,14 +59,26 @@ __all__ = [
     "suggest_meta_candidates",
     "is_excluded_name",
     "search_class_names",
+    "AnalyticsBucket",
+    "AnalyticsResponse",
     "AnalyzeResponse",
     "CanonicalResolution",
+    "EstatResult",
+    "ItemResult",
+    "ObservedPrice",
+    "ObservedPriceResponse",
+    "PriceHistory",
     "Profile",
     "ProfileUpdate",
     "RankingEntry",
     "RankingResponse",
     "Receipt",
+    "ReceiptBulkCreate",
+    "ReceiptBulkItemResult",
+    "ReceiptBulkResponse",
     "ReceiptCreate",
+    "ReceiptImport",
+    "ReceiptSummary",
     "ReceiptUpdate",
     "GeminiEstatResult",
     "GeminiReceiptResponse",
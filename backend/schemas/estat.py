@@ -4,6 +4,8 @@ import httpx
 from config import settings
 from fastapi import HTTPException
 from rules import CLASS_SEARCH_ORDER
+from services.metrics import ESTAT_CACHE_TOTAL, ESTAT_REQUESTS_TOTAL
+from services.resilience import get_breaker, remaining_time, timeout_for
 
 from .parser import simplify_key
 
@@ -11,6 +13,9 @@ from .parser import simplify_key
 type JsonValue = str | int | float | bool | None | dict[str, "JsonValue"] | list["JsonValue"]
 type JsonDict = dict[str, JsonValue]
 
+# e-Stat API の読み取りタイムアウト上限（秒）。実際にはリクエストの残り時間と小さい方を使う
+ESTAT_READ_TIMEOUT = 90.0
+
 ESTAT_TABLE_SCORE_WEIGHTS = [
     ("全国統一", 5),
     ("月別", 3),
@@ -48,13 +53,24 @@ class EStatClient:
 
         url = f"{settings.ESTAT_BASE_URL}/{path}"
         full_params: dict[str, str | int] = {"appId": settings.ESTAT_APP_ID, **params}
+        breaker = get_breaker("estat")
 
-        async with httpx.AsyncClient(timeout=httpx.Timeout(timeout=90.0, connect=5.0)) as client:
+        async with httpx.AsyncClient() as client:
             last_err: Exception | None = None
             for i in range(3):
+                # リクエスト全体の残り時間を超えて待たない
+                timeout = timeout_for(ESTAT_READ_TIMEOUT)
                 try:
-                    r = await client.get(url, params=full_params)
+                    with breaker.guard():
+                        r = await client.get(
+                            url,
+                            params=full_params,
+                            timeout=httpx.Timeout(timeout=timeout, connect=min(5.0, timeout or 5.0)),
+                        )
+                        if r.status_code >= 500:
+                            r.raise_for_status()
                     r.raise_for_status()
+                    ESTAT_REQUESTS_TOTAL.inc(endpoint=path, outcome="ok")
                     try:
                         result: JsonDict = r.json()
                         return result
@@ -65,9 +81,15 @@ class EStatClient:
                         )from e
 
                 except httpx.RequestError as e:
+                    ESTAT_REQUESTS_TOTAL.inc(endpoint=path, outcome="network_error")
                     last_err = e
-                    await asyncio.sleep(1.0 * (i + 1))
+                    backoff = 1.0 * (i + 1)
+                    left = remaining_time()
+                    if left is not None and left <= backoff:
+                        break
+                    await asyncio.sleep(backoff)
                 except httpx.HTTPStatusError as e:
+                    ESTAT_REQUESTS_TOTAL.inc(endpoint=path, outcome="http_error")
                     raise HTTPException(status_code=502, detail=f"e-Stat API HTTP error: {e}") from e
 
             raise HTTPException(
@@ -77,7 +99,9 @@ class EStatClient:
 
     async def get_meta(self, statsDataId: str) -> JsonDict:
         if statsDataId in self._meta_cache:
+            ESTAT_CACHE_TOTAL.inc(cache="meta", result="hit")
             return self._meta_cache[statsDataId]
+        ESTAT_CACHE_TOTAL.inc(cache="meta", result="miss")
         meta = await self._get("getMetaInfo", {"statsDataId": statsDataId})
         self._meta_cache[statsDataId] = meta
         return meta
@@ -128,7 +152,9 @@ class EStatClient:
 
     async def get_class_maps(self, statsDataId: str) -> dict[str, dict[str, str]]:
         if statsDataId in self._class_map_cache:
+            ESTAT_CACHE_TOTAL.inc(cache="class_map", result="hit")
             return self._class_map_cache[statsDataId]
+        ESTAT_CACHE_TOTAL.inc(cache="class_map", result="miss")
         meta = await self.get_meta(statsDataId)
         try:
             maps = self.extract_class_maps(meta)
@@ -137,6 +163,12 @@ class EStatClient:
         except ValueError as e:
             raise HTTPException(status_code=502, detail=str(e))from e
 
+    def cached_class_maps(self) -> dict[str, dict[str, str]]:
+        """API を呼ばずに、選定済み統計表の分類マップを返します（未取得なら空）。"""
+        if not self._stats_data_id_cache:
+            return {}
+        return self._class_map_cache.get(self._stats_data_id_cache, {})
+
     def _table_has_any_item(self, class_maps: dict[str, dict[str, str]], keywords: list[str]) -> bool:
         # e-Statの分類ID（背番号）の意味：
         # - cat01: 品目名 (例: 卵、牛乳)
@@ -154,7 +186,9 @@ class EStatClient:
 
     async def pick_stats_data_id(self) -> str:
         if self._stats_data_id_cache:
+            ESTAT_CACHE_TOTAL.inc(cache="stats_data_id", result="hit")
             return self._stats_data_id_cache
+        ESTAT_CACHE_TOTAL.inc(cache="stats_data_id", result="miss")
 
         data = await self._get("getStatsList", {"searchWord": "小売物価統計調査 動向編 全国", "limit": 80})
         try:
@@ -0,0 +1,60 @@
+"""
+文字列正規化エンジン
+
+品目名の照合では同じ文字列を何度も正規化するため、
+変換テーブルはモジュール読み込み時に一度だけ構築し、結果はメモ化します。
+"""
+import unicodedata
+from functools import lru_cache
+
+# 正規化結果のキャッシュ上限（e-Statの分類名＋レシート品目名が十分収まる件数）
+NORMALIZE_CACHE_SIZE = 65536
+
+# NFKC 後に残る表記揺れの置換
+_CHAR_MAP: dict[str, str] = {
+    "０": "0", "１": "1", "２": "2", "３": "3", "４": "4",
+    "５": "5", "６": "6", "７": "7", "８": "8", "９": "9",
+    "／": "/", "－": "-", "ー": "-", "：": ":", "　": " ",
+    "￥": "¥",
+    "\\": "¥",
+}
+
+# simplify_key で取り除く括弧・区切り記号
+_STRIP_CHARS = "()（）【】[]「」『』・,，.。/／-－"
+
+_NORMALIZE_TABLE = str.maketrans(_CHAR_MAP)
+
+# 置換と記号除去を1回の translate で行うテーブル
+# （置換後に除去対象となる文字は、最初から除去する）
+_SIMPLIFY_TABLE = str.maketrans(
+    {src: (None if dst in _STRIP_CHARS else dst) for src, dst in _CHAR_MAP.items()}
+    | {c: None for c in _STRIP_CHARS}
+)
+
+
+def normalize_uncached(s: str) -> str:
+    """
+    normalize_text と同じ正規化を、結果をキャッシュせずに行います。
+    レシート全文やその各行のように、クライアントから届く長く使い回されない入力に使います。
+    """
+    s = unicodedata.normalize("NFKC", s).translate(_NORMALIZE_TABLE)
+    # 連続する空白を1つにまとめ、前後の空白を除去
+    return " ".join(s.split())
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_text(s: str) -> str:
+    """文字の揺れ（全角・半角など）を吸収し、標準的な形に整えます（品目名やキーなど短い文字列用）。"""
+    return normalize_uncached(s)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def simplify_key(s: str) -> str:
+    """検索や比較のために、記号や空白を徹底的に取り除いた文字列を返します。"""
+    return "".join(unicodedata.normalize("NFKC", s).translate(_SIMPLIFY_TABLE).split())
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def fold_key(s: str) -> str:
+    """大文字小文字を区別せず比較するための正規化を行います。"""
+    return simplify_key(s).casefold()
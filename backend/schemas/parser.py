@@ -1,5 +1,4 @@
 import re
-import unicodedata
 from datetime import datetime
 from functools import lru_cache
 
@@ -12,36 +11,19 @@ from rules import (
     UNKNOWN_RESCUE_NORMALIZE_MAP,
 )
 
+from .normalize import fold_key, normalize_text, normalize_uncached, simplify_key
 from .schemas import CanonicalResolution
 
-
-def normalize_text(s: str) -> str:
-    """文字の揺れ（全角・半角など）を吸収し、標準的な形に整えます。"""
-    s = unicodedata.normalize("NFKC", s)
-    trans = str.maketrans({
-        "０": "0", "１": "1", "２": "2", "３": "3", "４": "4",
-        "５": "5", "６": "6", "７": "7", "８": "8", "９": "9",
-        "／": "/", "－": "-", "ー": "-", "：": ":", "　": " ",
-        "￥": "¥",
-        "\\": "¥",
-    })
-    s = s.translate(trans)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
-def simplify_key(s: str) -> str:
-    """検索や比較のために、記号や空白を徹底的に取り除いた文字列を返します。"""
-    s = normalize_text(s)
-    s = re.sub(r"[ \t\r\n]", "", s)
-    s = re.sub(r"[()（）【】\[\]「」『』]", "", s)
-    s = re.sub(r"[・,，\.。/／\-－]", "", s)
-    return s
-
-
-def fold_key(s: str) -> str:
-    """大文字小文字を区別せず比較するための正規化を行います。"""
-    return simplify_key(s).casefold()
+# 行解析で使う正規表現（呼び出しごとのコンパイルを避ける）
+_DATE_RE = re.compile(r"(20\d{2})[/-](\d{1,2})[/-](\d{1,2})")
+_DATE_LINE_RE = re.compile(r"\b20\d{2}[/-]\d{1,2}[/-]\d{1,2}\b")
+# 金額: "1,280" のような3桁区切り、または2〜6桁の数字
+_PRICE_LINE_RE = re.compile(r"^(.+?)\s*[¥]?\s*(\d{1,3}(?:,\d{3})+|\d{2,6})(?:\s*円)?\s*[-‐ー*]?\s*$")
+_NAME_CHAR_RE = re.compile(r"[A-Za-zぁ-んァ-ン一-龥]")
+_TRAILING_YEN_RE = re.compile(r"[¥\\]+$")
+_BRACKET_NOISE_RE = re.compile(r"[|】\]\[]+")
+_QUANTITY_SUFFIX_RE = re.compile(r"\d+(\s*[gGmMlL])?")
+_DIGIT_RE = re.compile(r"\d")
 
 
 @lru_cache(maxsize=1)
@@ -57,6 +39,11 @@ def _compiled_item_rules() -> list[tuple[str, list[str], list[re.Pattern[str]]]]
     return compiled
 
 
+def precompile_rules() -> int:
+    """商品ルールの正規表現を先にコンパイルし、ルール数を返します（起動時のウォームアップ用）。"""
+    return len(_compiled_item_rules())
+
+
 def guess_canonical(raw: str) -> str | None:
     s_norm = normalize_text(raw)
     s_fold = fold_key(s_norm)
@@ -84,8 +71,8 @@ def guess_canonical(raw: str) -> str | None:
 
 def _clean_item_name(name: str) -> str:
     name = name.strip()
-    name = re.sub(r"[¥\\]+$", "", name).strip()
-    name = re.sub(r"[|】\]\[]+", "", name).strip()
+    name = _TRAILING_YEN_RE.sub("", name).strip()
+    name = _BRACKET_NOISE_RE.sub("", name).strip()
     return name
 
 
@@ -95,8 +82,8 @@ def is_excluded_name(name: str) -> bool:
 
 
 def parse_receipt_text(text: str) -> tuple[str, list[tuple[str, float | None]]]:
-    text_for_date = normalize_text(text)
-    m = re.search(r"(20\d{2})[/-](\d{1,2})[/-](\d{1,2})", text_for_date)
+    text_for_date = normalize_uncached(text)
+    m = _DATE_RE.search(text_for_date)
     if m:
         y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
         purchase_date = f"{y:04d}-{mo:02d}-{d:02d}"
@@ -105,14 +92,14 @@ def parse_receipt_text(text: str) -> tuple[str, list[tuple[str, float | None]]]:
 
     items: list[tuple[str, float | None]] = []
     for raw_line in text.splitlines():
-        line = normalize_text(raw_line)
+        line = normalize_uncached(raw_line)
         if not line:
             continue
 
-        if re.search(r"\b20\d{2}[/-]\d{1,2}[/-]\d{1,2}\b", line):
+        if _DATE_LINE_RE.search(line):
             continue
 
-        m2 = re.search(r"^(.+?)\s*[¥]?\s*(\d{2,6}(?:,\d{{3}})*)(?:\s*円)?\s*[-‐ー*]?\s*$", line)
+        m2 = _PRICE_LINE_RE.search(line)
         if not m2:
             continue
 
@@ -122,7 +109,7 @@ def parse_receipt_text(text: str) -> tuple[str, list[tuple[str, float | None]]]:
         if not name or len(name) <= 1 or is_excluded_name(name):
             continue
 
-        if not re.search(r"[A-Za-zぁ-んァ-ン一-龥]", name):
+        if not _NAME_CHAR_RE.search(name):
             continue
 
         try:
@@ -163,7 +150,7 @@ def _candidate_terms_for_unknown(raw_name: str) -> list[str]:
         if ok:
             out.extend(candidates)
 
-    stripped = re.sub(r"\d+(\s*[gGmMlL])?", "", raw_norm).strip()
+    stripped = _QUANTITY_SUFFIX_RE.sub("", raw_norm).strip()
     if stripped and stripped != raw_norm:
         out.append(stripped)
 
@@ -205,7 +192,7 @@ def _pick_best_hit(hits: list[dict[str, str]]) -> dict[str, str] | None:
         name = h.get("name") or ""
         class_id = h.get("class_id") or ""
         simple_len = len(simplify_key(name)) or 10**9
-        has_digits = 1 if re.search(r"\d", name) else 0
+        has_digits = 1 if _DIGIT_RE.search(name) else 0
         class_pri = CLASS_SEARCH_ORDER.index(class_id) if class_id in CLASS_SEARCH_ORDER else 999
         return (simple_len, has_digits, class_pri, len(name), name)
 
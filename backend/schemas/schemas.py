@@ -1,5 +1,7 @@
+from datetime import date, datetime
 from typing import Any, Literal
 
+from config import settings
 from pydantic import BaseModel, Field
 
 
@@ -16,6 +18,20 @@ class EstatResult(BaseModel):
     note: str | None = Field(None, description="補足情報やエラー理由")
 
 
+class PriceHistory(BaseModel):
+    """同じ商品（canonical）をこれまでに買った価格"""
+    purchase_count: int = Field(description="これまでの購入回数")
+    min_price: float = Field(description="最安値（単価）")
+    min_store_name: str | None = Field(None, description="最安値で買った店舗")
+    min_purchase_date: str | None = Field(None, description="最安値で買った日")
+    last_price: float = Field(description="前回の単価")
+    last_store_name: str | None = Field(None, description="前回買った店舗")
+    last_purchase_date: str | None = Field(None, description="前回買った日")
+    average_price: float = Field(description="単価の指数移動平均（最近の購入ほど重い）")
+    diff_from_min: float | None = Field(None, description="今回の単価 - 最安値（正なら最安値より高い）")
+    diff_from_last: float | None = Field(None, description="今回の単価 - 前回の単価（正なら前回より高い）")
+
+
 class ItemResult(BaseModel):
     """解析された各商品のスキーマ"""
     raw_name: str = Field(description="レシートに記載されていた元の名前")
@@ -23,6 +39,7 @@ class ItemResult(BaseModel):
     paid_unit_price: float | None = Field(None, description="レシートから抽出した支払単価")
     quantity: float = Field(1.0, description="購入数量")
     estat: EstatResult = Field(description="e-Statとの比較結果の詳細")
+    history: PriceHistory | None = Field(None, description="自分の過去の購入価格（初めて買う商品は null）")
 
 
 class AnalyzeResponse(BaseModel):
@@ -120,6 +137,20 @@ class Receipt(BaseModel):
     updated_at: str = Field(description="更新日時")
 
 
+class ReceiptSummary(BaseModel):
+    """レシート履歴の一覧表示用（解析結果の商品リストを含まない）"""
+    id: str = Field(description="レシートID")
+    user_id: str = Field(description="ユーザーID")
+    purchase_date: str | None = Field(None, description="購入日")
+    store_name: str | None = Field(None, description="店舗名")
+    total_payment: float | None = Field(None, description="支払総額")
+    total_saved: float | None = Field(None, description="節約総額")
+    total_overpaid: float | None = Field(None, description="割高支払い総額")
+    item_count: int | None = Field(None, description="商品数")
+    created_at: str = Field(description="作成日時")
+    updated_at: str = Field(description="更新日時")
+
+
 class ReceiptCreate(BaseModel):
     """レシート作成用"""
     purchase_date: str | None = Field(None, description="購入日")
@@ -130,3 +161,79 @@ class ReceiptCreate(BaseModel):
 class ReceiptUpdate(BaseModel):
     """レシート更新用"""
     result: dict[str, Any] = Field(description="解析結果JSON")
+
+
+class ReceiptImport(BaseModel):
+    """一括取り込み（POST /receipts:bulk）の1件"""
+    client_id: str = Field(min_length=1, max_length=128, description="冪等キー（端末側の履歴ID）")
+    purchase_date: date | None = Field(None, description="購入日")
+    store_name: str | None = Field(None, max_length=255, description="店舗名")
+    result: dict[str, Any] = Field(description="解析結果JSON")
+    created_at: datetime | None = Field(None, description="端末で解析した日時（省略時は取り込み日時）")
+
+
+class ReceiptBulkCreate(BaseModel):
+    """
+    一括取り込みのリクエスト。receipts の各要素は個別に検証されます。
+    取り込んだレシートの節約額は savings_records（ランキング）には記録しません（解析時に記録済みのため）。
+    """
+    receipts: list[Any] = Field(
+        max_length=settings.RECEIPT_BULK_MAX_ITEMS,
+        description="取り込むレシート（ReceiptImport 形式）",
+    )
+
+
+class ReceiptBulkItemResult(BaseModel):
+    """一括取り込みの1件ごとの結果"""
+    index: int = Field(description="リクエスト内の位置")
+    client_id: str | None = Field(None, description="冪等キー")
+    status: Literal["created", "duplicate", "invalid"] = Field(
+        description="created=作成, duplicate=取り込み済み（または同じリクエスト内で重複）, invalid=検証エラー"
+    )
+    id: str | None = Field(None, description="レシートID")
+    error: str | None = Field(None, description="検証エラーの内容")
+
+
+class ReceiptBulkResponse(BaseModel):
+    """一括取り込みのレスポンス"""
+    results: list[ReceiptBulkItemResult] = Field(description="1件ごとの結果（リクエストと同じ順）")
+    created: int = Field(0, description="作成した件数")
+    duplicates: int = Field(0, description="取り込み済みだった件数")
+    invalid: int = Field(0, description="検証エラーの件数")
+
+
+class AnalyticsBucket(BaseModel):
+    """支出分析の1区分（月・店舗・商品のいずれか）の合計"""
+    key: str | None = Field(None, description="区分（月は YYYY-MM、店舗名、商品名。不明は null）")
+    spend: float = Field(0, description="支出額")
+    saved: float = Field(0, description="節約額（DEAL の商品）")
+    overpaid: float = Field(0, description="過払い額（OVERPAY の商品）")
+    net_saved: float = Field(0, description="純節約額（節約額 - 過払い額）")
+    item_count: int = Field(0, description="商品数")
+
+
+class AnalyticsResponse(BaseModel):
+    """支出分析（GET /analytics）のレスポンス"""
+    group_by: Literal["month", "store", "item"] = Field(description="集計の区分")
+    total: AnalyticsBucket = Field(description="期間全体の合計")
+    buckets: list[AnalyticsBucket] = Field(description="区分ごとの合計（月は昇順、店舗・商品は支出の降順）")
+
+
+class ObservedPrice(BaseModel):
+    """全ユーザーのレシートから集めた実売価格（単価）の統計"""
+    store_name: str | None = Field(None, description="店舗名（全店舗の集計は null）")
+    count: int = Field(description="観測数")
+    mean: float | None = Field(None, description="平均")
+    min: float | None = Field(None, description="最安値")
+    max: float | None = Field(None, description="最高値")
+    p10: float | None = Field(None, description="10パーセンタイル（近似）")
+    p50: float | None = Field(None, description="中央値（近似）")
+    p90: float | None = Field(None, description="90パーセンタイル（近似）")
+    updated_at: str | None = Field(None, description="最後に集計へ反映した日時")
+
+
+class ObservedPriceResponse(BaseModel):
+    """実売価格（GET /prices/observed）のレスポンス"""
+    canonical: str = Field(description="商品名（canonical）")
+    all_stores: ObservedPrice | None = Field(None, description="全店舗の集計（観測が少なければ null）")
+    stores: list[ObservedPrice] = Field(description="店舗ごとの集計（観測数の多い順）")
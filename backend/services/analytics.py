@@ -0,0 +1,50 @@
+"""
+支出分析（GET /analytics）
+
+明細の展開と月 × 店舗 × 商品ごとの集計はデータベース側（receipt_items /
+user_spending_rollups テーブルとトリガー）で行い、get_spending_analytics 関数が
+集計済みの行を区分ごとにまとめた結果だけを返します。ここではそれをレスポンスに変換します。
+"""
+from typing import Any, Literal
+
+from schemas import AnalyticsBucket, AnalyticsResponse
+
+type AnalyticsGroupBy = Literal["month", "store", "item"]
+
+
+def _money(value: Any) -> float:
+    try:
+        return round(float(value or 0), 2)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _bucket_from_row(row: dict[str, Any]) -> AnalyticsBucket:
+    saved = _money(row.get("saved"))
+    overpaid = _money(row.get("overpaid"))
+    key = row.get("key")
+    return AnalyticsBucket(
+        # 店舗名・商品名の不明はデータベース上 '' で集計している
+        key=str(key) if key else None,
+        spend=_money(row.get("spend")),
+        saved=saved,
+        overpaid=overpaid,
+        net_saved=round(saved - overpaid, 2),
+        item_count=int(row.get("item_count") or 0),
+    )
+
+
+def analytics_from_rows(rows: list[Any], group_by: AnalyticsGroupBy) -> AnalyticsResponse:
+    """get_spending_analytics の結果（区分ごとの行 + is_total=true の合計行）を変換します。"""
+    buckets: list[AnalyticsBucket] = []
+    total = AnalyticsBucket()
+
+    for row in rows:
+        if not row or not isinstance(row, dict):
+            continue
+        if row.get("is_total"):
+            total = _bucket_from_row(row)
+        else:
+            buckets.append(_bucket_from_row(row))
+
+    return AnalyticsResponse(group_by=group_by, total=total, buckets=buckets)
@@ -0,0 +1,79 @@
+"""
+レスポンスの JSON 化と gzip 圧縮
+
+Accept-Encoding を確認し、ストリーミング応答はチャンクごとに、
+json_response の応答は本文が GZIP_MIN_BYTES 以上のときに圧縮します。
+"""
+import asyncio
+import zlib
+from collections.abc import AsyncIterator, Mapping
+from typing import Any
+
+from fastapi import Request, Response
+from pydantic_core import to_json
+from services.etag import gzip_etag
+
+GZIP_LEVEL = 6
+
+# これより小さい本文は圧縮しない（ほとんど縮まず、CPU を使うだけのため）
+GZIP_MIN_BYTES = 1024
+
+# これ以上の本文はスレッドで圧縮する（数百KBの圧縮でイベントループを止めないように）
+GZIP_THREAD_MIN_BYTES = 256 * 1024
+
+# json_response が呼び出し側のヘッダーから引き継がないもの（本文に合わせて作り直す）
+_BODY_HEADERS = ("content-length", "content-type", "content-encoding")
+
+
+def accepts_gzip(request: Request) -> bool:
+    """Accept-Encoding に gzip（q=0 以外）が含まれるか。"""
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = GZIP_LEVEL) -> AsyncIterator[bytes]:
+    """
+    チャンクを gzip 形式で圧縮しながら返します。
+    チャンクごとに Z_SYNC_FLUSH するため、クライアントは全体を待たずに展開を始められます。
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def gzip_bytes(data: bytes, level: int = GZIP_LEVEL) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+async def json_response(
+    request: Request,
+    content: Any,
+    headers: Mapping[str, str] | None = None,
+    status_code: int = 200,
+) -> Response:
+    """
+    content（データベースの行など、JSON にそのまま出せる値）を pydantic-core で直接 JSON にした応答を返します。
+    bytes を渡した場合は、JSON 化済みの本文としてそのまま使います。
+    response_model による再検証・変換を通らないため、content は応答のスキーマどおりの形で渡してください。
+    headers にはエンドポイントで受け取った Response の headers（ETag・X-Next-Cursor など）を渡します。
+    gzip で圧縮した場合、ETag は圧縮した表現用（gzip_etag）に置き換えます。
+    """
+    body = content if isinstance(content, bytes) else to_json(content)
+    out = {k.lower(): v for k, v in (headers or {}).items() if k.lower() not in _BODY_HEADERS}
+    out["vary"] = "Accept-Encoding"
+    if len(body) >= GZIP_MIN_BYTES and accepts_gzip(request):
+        if len(body) >= GZIP_THREAD_MIN_BYTES:
+            body = await asyncio.to_thread(gzip_bytes, body)
+        else:
+            body = gzip_bytes(body)
+        out["content-encoding"] = "gzip"
+        if "etag" in out:
+            out["etag"] = gzip_etag(out["etag"])
+    return Response(body, status_code=status_code, headers=out, media_type="application/json")
@@ -0,0 +1,68 @@
+"""
+ETag による条件付き GET
+
+データのバージョン（data_versions の version やプロセス内の順位表の版）から強い ETag を作り、
+If-None-Match が一致すれば本文を組み立てずに 304 を返します。
+再訪時のコストはバージョンの確認だけになり、本文は転送されません。
+"""
+import hashlib
+import secrets
+
+from fastapi import Request, Response, status
+
+# 自分のデータ。ブラウザにのみ保存し、使う前に毎回 If-None-Match で確認させる
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# プロセス内の状態から作る ETag に含めるワーカーの識別子
+# （版の数え方はワーカーごとに違うため、別のワーカーの ETag と偶然一致しないようにする）
+INSTANCE_ID = secrets.token_hex(8)
+
+
+def make_etag(*parts: object) -> str:
+    """parts（スコープ、ユーザーID、バージョン、クエリなど）から強い ETag を作ります。"""
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def gzip_etag(etag: str) -> str:
+    """gzip で圧縮して返す表現の ETag（強い ETag は表現ごとに変える必要がある）。"""
+    return f'{etag[:-1]}-gzip"'
+
+
+def matching_etag(request: Request, etag: str) -> str | None:
+    """
+    If-None-Match に etag（または gzip で返した表現の ETag）が含まれていれば、一致した方を返します。
+    GET なので RFC 9110 の弱い比較で判定します。
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    variants = (etag, gzip_etag(etag))
+    for candidate in header.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        if candidate == "*":
+            return etag
+        if candidate in variants:
+            return candidate
+    return None
+
+
+def check_etag(
+    request: Request,
+    response: Response,
+    etag: str,
+    cache_control: str = PRIVATE_CACHE_CONTROL,
+) -> Response | None:
+    """
+    If-None-Match が一致すれば 304 の応答を返します。
+    一致しなければ None を返し、これから返す本文の応答に ETag と Cache-Control を付けます。
+    """
+    matched = matching_etag(request, etag)
+    if matched is not None:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": matched, "Cache-Control": cache_control, "Vary": "Accept-Encoding"},
+        )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return None
@@ -0,0 +1,95 @@
+"""
+レシート履歴のエクスポート（NDJSON / CSV）
+
+レシートをページ単位で受け取り、商品ごとに1行へ平坦化して少しずつ出力します。
+保持するのは1ページ分だけなので、履歴の件数に関係なくメモリ使用量は一定です。
+"""
+import csv
+import io
+import json
+from collections.abc import AsyncIterator, Iterator
+from typing import Any, Literal
+
+type ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# 1行（1商品）の列。商品のないレシートは商品列を空にした1行を出力する
+EXPORT_COLUMNS: list[str] = [
+    "receipt_id",
+    "purchase_date",
+    "store_name",
+    "created_at",
+    "raw_name",
+    "canonical",
+    "paid_unit_price",
+    "quantity",
+    "stat_price",
+    "stat_unit",
+    "diff",
+    "rate",
+    "judgement",
+]
+
+
+def flatten_receipt(record: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """receipts の1行を、商品ごとの行に展開します。"""
+    base = {
+        "receipt_id": record.get("id"),
+        "purchase_date": record.get("purchase_date"),
+        "store_name": record.get("store_name"),
+        "created_at": record.get("created_at"),
+    }
+    result = record.get("result")
+    items = result.get("items") if isinstance(result, dict) else None
+    if not isinstance(items, list) or not items:
+        yield base | dict.fromkeys(EXPORT_COLUMNS[4:])
+        return
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        estat = item.get("estat")
+        if not isinstance(estat, dict):
+            estat = {}
+        yield base | {
+            "raw_name": item.get("raw_name"),
+            "canonical": item.get("canonical"),
+            "paid_unit_price": item.get("paid_unit_price"),
+            "quantity": item.get("quantity"),
+            "stat_price": estat.get("stat_price"),
+            "stat_unit": estat.get("stat_unit"),
+            "diff": estat.get("diff"),
+            "rate": estat.get("rate"),
+            "judgement": estat.get("judgement"),
+        }
+
+
+def _encode_ndjson(rows: Iterator[dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode()
+
+
+def _encode_csv(rows: Iterator[dict[str, Any]]) -> bytes:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writerows(rows)
+    return buf.getvalue().encode()
+
+
+async def export_stream(pages: AsyncIterator[list[Any]], fmt: ExportFormat) -> AsyncIterator[bytes]:
+    """receipts の行のページを受け取り、エクスポート形式のチャンクを返します。"""
+    if fmt == "csv":
+        # Excel で文字化けしないよう BOM を付け、先頭にヘッダー行を出力する
+        header = io.StringIO()
+        csv.writer(header).writerow(EXPORT_COLUMNS)
+        yield b"\xef\xbb\xbf" + header.getvalue().encode()
+
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    async for records in pages:
+        rows = (row for record in records if isinstance(record, dict) for row in flatten_receipt(record))
+        chunk = encode(rows)
+        if chunk:
+            yield chunk
@@ -0,0 +1,66 @@
+"""
+クライアントの遅延生成
+
+モジュールの読み込み時にはクライアントを作らず、最初に使われたとき（または起動時のウォームアップ）に作ります。
+認証情報がなくてもモジュールを読み込め、プロセスの起動も速くなります。
+
+    supabase: Client = lazy(_create_supabase)   # 呼び出し側はそのまま supabase.table(...) と書ける
+"""
+import threading
+from collections.abc import Callable
+from typing import Any, cast
+
+
+class LazyProxy[T]:
+    """最初の属性アクセスで factory() を呼んでインスタンスを作り、以降はそれに委ねるプロキシ。"""
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory: Callable[[], T]) -> None:
+        self._factory = factory
+        self._instance: T | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> T:
+        instance = self._instance
+        if instance is None:
+            # ウォームアップのスレッドと最初のリクエストが同時に作らないように
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def set(self, instance: T) -> None:
+        self._instance = instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        state = repr(self._instance) if self._instance is not None else "not created"
+        return f"<LazyProxy {state}>"
+
+
+def lazy[T](factory: Callable[[], T]) -> T:
+    """factory() の結果の代わりに使えるプロキシを返します（型は T として扱えます）。"""
+    return cast(T, LazyProxy(factory))
+
+
+def ensure_created(obj: object) -> None:
+    """遅延生成のプロキシなら、ここでインスタンスを作ります（それ以外は何もしません）。"""
+    if isinstance(obj, LazyProxy):
+        obj.get()
+
+
+def replace_instance[T](obj: T, instance: T) -> None:
+    """
+    遅延生成のプロキシの中身を instance に差し替えます（負荷試験などで代替のクライアントを入れる用）。
+    プロキシを import したすべてのモジュールに反映されます。
+    """
+    if not isinstance(obj, LazyProxy):
+        raise TypeError(f"{obj!r} is not a lazily created client")
+    obj.set(instance)
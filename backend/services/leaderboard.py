@@ -0,0 +1,192 @@
+"""
+プロセス内のランキング（リーダーボード）
+
+ユーザーごとの純節約額を (−純節約額, user_id) の順序付きリストで保持し、
+上位N名と任意ユーザーの順位を O(log n) で返します（データベースへの問い合わせなし）。
+通算（all）・今週（week）・今月（month）の3つの順位表を持ちます。
+
+- 起動時と LEADERBOARD_RESYNC_SECONDS ごとに user_savings_totals /
+  user_savings_period_totals（現在の期間）から全件を読み直す
+- /analyzeReceipt が savings_records を書き出し待ちに積んだ時点で、そのワーカーで即座に加算する
+他のワーカーでの加算や削除は次回の再同期で反映されます（それまでのずれは許容）。
+期間が切り替わってから再同期するまでの間、その期間の順位表は使われません。
+"""
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Literal
+from zoneinfo import ZoneInfo
+
+from schemas import RankingEntry, RankingResponse
+from sortedcontainers import SortedList  # type: ignore
+
+type RankingPeriod = Literal["all", "week", "month"]
+
+RANKING_PERIODS: tuple[RankingPeriod, ...] = ("all", "week", "month")
+
+# 期間の区切り（purchase_date は日本の日付）
+PERIOD_TIMEZONE = ZoneInfo("Asia/Tokyo")
+
+
+def period_start(period: RankingPeriod, day: date) -> date | None:
+    """day が属する期間の開始日（週は月曜始まり）。通算は None。"""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return None
+
+
+def current_period_start(period: RankingPeriod) -> date | None:
+    return period_start(period, datetime.now(PERIOD_TIMEZONE).date())
+
+
+@dataclass(slots=True)
+class UserTotals:
+    net_saved: int
+    total_overpaid: int
+    nickname: str | None = None
+
+
+class Leaderboard:
+    """
+    純節約額の順位表。
+    並び順は get_ranking（データベース側）と同じく、純節約額の降順・同額は user_id の昇順です。
+    """
+    def __init__(self, period: RankingPeriod = "all") -> None:
+        self.period = period
+        # 並び順と合計は常に組で差し替える（再同期中の参照で食い違わないように）
+        self._state: tuple[SortedList, dict[str, UserTotals]] = (SortedList(), {})
+        self.period_start: date | None = None
+        self.synced_at: float | None = None
+        # 内容が変わるたびに増える版（ETag 用。このプロセス内でのみ意味を持つ）
+        self.version = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.synced_at is not None
+
+    def is_current(self) -> bool:
+        """読み込み済みで、保持している期間が現在の期間と一致するか。"""
+        return self.loaded and self.period_start == current_period_start(self.period)
+
+    def __len__(self) -> int:
+        return len(self._state[1])
+
+    def replace(self, users: dict[str, UserTotals], synced_at: float, start: date | None = None) -> None:
+        """
+        全ユーザーの合計（start から始まる期間の分）で置き換えます。
+        並べ替えを含むため、スレッドから呼んでも構いません。
+        """
+        order = SortedList((-t.net_saved, uid) for uid, t in users.items())
+        self._state = (order, users)
+        self.period_start = start
+        self.synced_at = synced_at
+        self.version += 1
+
+    def record(self, user_id: str, saved: int, overpaid: int) -> None:
+        """savings_records 1件分（節約額・過払い額）を加算します。"""
+        order, users = self._state
+        totals = users.get(user_id)
+        if totals is None:
+            totals = users[user_id] = UserTotals(net_saved=0, total_overpaid=0)
+        else:
+            order.remove((-totals.net_saved, user_id))
+        totals.net_saved += saved - overpaid
+        totals.total_overpaid += overpaid
+        order.add((-totals.net_saved, user_id))
+        self.version += 1
+
+    def set_nickname(self, user_id: str, nickname: str | None) -> None:
+        totals = self._state[1].get(user_id)
+        if totals is not None and totals.nickname != nickname:
+            totals.nickname = nickname
+            self.version += 1
+
+    def rank(self, user_id: str) -> int | None:
+        """順位（1始まり）。記録のないユーザーは None。"""
+        order, users = self._state
+        totals = users.get(user_id)
+        if totals is None:
+            return None
+        return order.bisect_left((-totals.net_saved, user_id)) + 1
+
+    def top(self, limit: int) -> list[tuple[str, UserTotals]]:
+        order, users = self._state
+        return [(uid, users[uid]) for _, uid in order.islice(0, max(limit, 0))]
+
+    def ranking(self, user_id: str | None, limit: int) -> RankingResponse:
+        """/ranking のレスポンス（上位 limit 名と、user_id があれば自分の順位・合計）を返します。"""
+        rankings = [
+            RankingEntry(
+                rank=i,
+                user_id=uid,
+                nickname=t.nickname,
+                total_saved=t.net_saved,
+                total_overpaid=t.total_overpaid,
+            )
+            for i, (uid, t) in enumerate(self.top(limit), start=1)
+        ]
+        me = self._state[1].get(user_id) if user_id is not None else None
+        if user_id is None or me is None:
+            return RankingResponse(rankings=rankings)
+        return RankingResponse(
+            rankings=rankings,
+            my_rank=self.rank(user_id),
+            my_nickname=me.nickname,
+            my_total_saved=me.net_saved,
+            my_total_overpaid=me.total_overpaid,
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "period_start": self.period_start.isoformat() if self.period_start else None,
+            "users": len(self),
+            "synced_at": self.synced_at,
+            "version": self.version,
+        }
+
+
+async def load_nicknames(profile_pages: AsyncIterator[list[Any]]) -> dict[str, str]:
+    """profiles の行（ページ単位）から、ニックネームを設定済みのユーザーの一覧を作ります。"""
+    nicknames: dict[str, str] = {}
+    async for rows in profile_pages:
+        for row in rows:
+            if row and isinstance(row, dict) and row.get("nickname"):
+                nicknames[str(row["id"])] = str(row["nickname"])
+    return nicknames
+
+
+async def load_users(totals_pages: AsyncIterator[list[Any]], nicknames: dict[str, str]) -> dict[str, UserTotals]:
+    """user_savings_totals / user_savings_period_totals の行（ページ単位）から、ユーザーごとの合計を作ります。"""
+    users: dict[str, UserTotals] = {}
+    async for rows in totals_pages:
+        for row in rows:
+            if row and isinstance(row, dict):
+                uid = str(row["user_id"])
+                users[uid] = UserTotals(
+                    net_saved=int(row.get("net_saved") or 0),
+                    total_overpaid=int(row.get("total_overpaid") or 0),
+                    nickname=nicknames.get(uid),
+                )
+    return users
+
+
+def record_savings(user_id: str, purchase_date: str | None, saved: int, overpaid: int) -> None:
+    """savings_records 1件分を、通算と purchase_date が現在の期間に含まれる順位表へ加算します。"""
+    try:
+        day = date.fromisoformat(purchase_date) if purchase_date else None
+    except ValueError:
+        day = None
+    for board in leaderboards.values():
+        if board.period == "all" or (day is not None and board.period_start == period_start(board.period, day)):
+            board.record(user_id, saved, overpaid)
+
+
+def set_nickname(user_id: str, nickname: str | None) -> None:
+    for board in leaderboards.values():
+        board.set_nickname(user_id, nickname)
+
+
+leaderboards: dict[RankingPeriod, Leaderboard] = {period: Leaderboard(period) for period in RANKING_PERIODS}
@@ -1,18 +1,32 @@
 """
 e-Stat APIから市場価格データを取得するモジュール
+
+MARKET_SNAPSHOT_DIR を設定すると、取得は全ワーカーで1つだけが行い、結果（市場価格と分類マップ）を
+スナップショットとして書き出して他のワーカーと共有します（services.market_snapshot）。
 """
 import asyncio
 import time
 from datetime import datetime
 
+from config import settings
 from loguru import logger
 from schemas import EStatClient
+from services.market_snapshot import MarketSnapshot, SnapshotStore
+from services.metrics import MARKET_CACHE_TOTAL, MARKET_FETCH_SECONDS
+from services.resilience import CircuitOpenError, DeadlineExceeded
 
 # グローバルキャッシュ
 _market_data_cache: list[dict[str, str | float]] = []
+_class_maps_cache: dict[str, dict[str, str]] = {}
 _cache_timestamp: float = 0
 CACHE_TTL = 86400  # 24時間
 
+# ワーカー間で共有するスナップショット（MARKET_SNAPSHOT_DIR が空なら共有しない）
+_snapshot_store = (
+    SnapshotStore(settings.MARKET_SNAPSHOT_DIR, settings.MARKET_SNAPSHOT_CHECK_SECONDS)
+    if settings.MARKET_SNAPSHOT_DIR else None
+)
+
 # 同時接続数制限
 MAX_CONCURRENT_REQUESTS = 10
 
@@ -59,6 +73,9 @@ async def _fetch_single_item(
             else:
                 logger.debug(f"価格取得失敗: {item_name} - {error}")
                 return None
+        except (CircuitOpenError, DeadlineExceeded):
+            # 期限切れ・遮断中は残りの品目も取得できないため、全体を打ち切る
+            raise
         except Exception as e:
             logger.warning(f"品目取得エラー: {item_name} - {e}")
             return None
@@ -86,13 +103,72 @@ async def fetch_all_market_data(
 
     戻り値: [{"item_name": "鶏卵", "price": 280.0, "unit": "パック(10個)"}, ...]
     """
-    global _market_data_cache, _cache_timestamp
+    started = time.perf_counter()
 
     # キャッシュが有効ならそれを返す
-    if _market_data_cache and (time.time() - _cache_timestamp) < CACHE_TTL:
+    _adopt_published_snapshot()
+    if _cache_is_fresh():
         logger.debug(f"市場データをキャッシュから取得 ({len(_market_data_cache)}品目)")
+        MARKET_CACHE_TOTAL.inc(result="hit")
+        MARKET_FETCH_SECONDS.observe(time.perf_counter() - started, cache="hit")
         return _market_data_cache
 
+    MARKET_CACHE_TOTAL.inc(result="miss")
+    with MARKET_FETCH_SECONDS.time(cache="miss"):
+        if _snapshot_store is None:
+            return await _refresh_market_data(estat_client)
+        # 取得は全ワーカーで1つだけが行う。待っている間に他のワーカーが書き出した版があればそれを使う
+        async with _snapshot_store.refresh_lock():
+            if _adopt_published_snapshot(force=True) and _cache_is_fresh():
+                return _market_data_cache
+            return await _refresh_market_data(estat_client)
+
+
+def _cache_is_fresh() -> bool:
+    return bool(_market_data_cache) and (time.time() - _cache_timestamp) < CACHE_TTL
+
+
+def _adopt_published_snapshot(force: bool = False) -> bool:
+    """他のワーカーが書き出した、より新しい版があれば、このワーカーのキャッシュを差し替えます。"""
+    global _market_data_cache, _class_maps_cache, _cache_timestamp
+
+    if _snapshot_store is None:
+        return False
+    try:
+        snapshot = _snapshot_store.load_if_changed(force)
+    except (OSError, ValueError) as e:
+        logger.warning(f"市場データのスナップショットを読み込めません: {e}")
+        return False
+    if snapshot is None or snapshot.created_at <= _cache_timestamp:
+        return False
+
+    # 参照の差し替えだけで切り替える（処理中のリクエストは古い版を使い終える）
+    _market_data_cache, _class_maps_cache, _cache_timestamp = (
+        snapshot.items, snapshot.class_maps, snapshot.created_at
+    )
+    logger.info(f"市場データのスナップショットを読み込みました (版 {snapshot.version}, {len(snapshot.items)}品目)")
+    return True
+
+
+def _publish_snapshot(stats_data_id: str) -> None:
+    if _snapshot_store is None:
+        return
+    try:
+        _snapshot_store.publish(MarketSnapshot(
+            version=time.time_ns(),
+            created_at=_cache_timestamp,
+            items=_market_data_cache,
+            stats_data_id=stats_data_id,
+            class_maps=_class_maps_cache,
+        ))
+    except OSError as e:
+        logger.warning(f"市場データのスナップショットを書き出せません: {e}")
+
+
+async def _refresh_market_data(estat_client: EStatClient | None) -> list[dict[str, str | float]]:
+    """e-Stat APIから全品目の価格を取得し、キャッシュを更新します。"""
+    global _market_data_cache, _class_maps_cache, _cache_timestamp
+
     if estat_client is None:
         estat_client = EStatClient()
 
@@ -126,31 +202,32 @@ async def fetch_all_market_data(
         cd_time = _get_current_time_code()
         logger.info(f"時間コード: {cd_time}")
 
-        # 並列で価格を取得
+        # 並列で価格を取得（1件でも打ち切りが発生したら残りのタスクはキャンセルされる）
         semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-        tasks = [
-            _fetch_single_item(
-                estat_client=estat_client,
-                stats_data_id=stats_data_id,
-                item_name=name,
-                item_code=code,
-                cd_time=cd_time,
-                class_key=item_class_key,
-                semaphore=semaphore,
-            )
-            for name, code in food_items.items()
-        ]
-
-        results = await asyncio.gather(*tasks)
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(_fetch_single_item(
+                    estat_client=estat_client,
+                    stats_data_id=stats_data_id,
+                    item_name=name,
+                    item_code=code,
+                    cd_time=cd_time,
+                    class_key=item_class_key,
+                    semaphore=semaphore,
+                ))
+                for name, code in food_items.items()
+            ]
 
         # Noneを除外
-        market_data = [r for r in results if r is not None]
+        market_data = [r for t in tasks if (r := t.result()) is not None]
 
         logger.info(f"市場データ取得完了: {len(market_data)}/{len(food_items)}品目")
 
-        # キャッシュを更新
+        # キャッシュを更新し、他のワーカーへ共有する
         _market_data_cache = market_data
+        _class_maps_cache = class_maps
         _cache_timestamp = time.time()
+        _publish_snapshot(stats_data_id)
 
         return market_data
 
@@ -167,14 +244,24 @@ def get_cached_market_data() -> list[dict[str, str | float]]:
     """
     キャッシュされた市場データを取得（API呼び出しなし）
     """
+    _adopt_published_snapshot()
     return _market_data_cache
 
 
+def get_cached_class_maps() -> dict[str, dict[str, str]]:
+    """
+    市場データと同じ統計表の分類マップを取得（API呼び出しなし。未取得なら空）
+    """
+    _adopt_published_snapshot()
+    return _class_maps_cache
+
+
 def clear_market_data_cache() -> None:
     """
     市場データキャッシュをクリア
     """
-    global _market_data_cache, _cache_timestamp
+    global _market_data_cache, _class_maps_cache, _cache_timestamp
     _market_data_cache = []
+    _class_maps_cache = {}
     _cache_timestamp = 0
     logger.info("市場データキャッシュをクリアしました")
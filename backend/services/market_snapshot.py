@@ -0,0 +1,218 @@
+"""
+市場データのワーカー間共有（バージョン付きスナップショット）
+
+e-Stat から取得した市場価格と分類マップを、1つのワーカーだけが取得してファイルに書き出し、
+他のワーカーはそれを mmap で読み込みます。ワーカー数を増やしても e-Stat への問い合わせは1回分です。
+
+- スナップショットは書き出した後は変更しない（market-<version>.bin）。新しい版は別のファイルに書き、
+  どの版が最新かを指すファイル（current）を rename で差し替える。読み手は常に完全な版だけを見る
+- 取得（refresh_lock）は flock で1ワーカーに限る。待っている間に他のワーカーが書き出した版があれば、
+  それを読み込んで取得を省く
+- 古い版のファイルは KEEP_VERSIONS 個を残して消す（読み込み中のワーカーの mmap はそのまま有効）
+
+ディレクトリはワーカー間で共有できる場所にします（/dev/shm を指定すればメモリ上に置かれます）。
+再起動後も TTL 内の版はそのまま使われます。
+
+ファイルの形式（リトルエンディアン）:
+    ヘッダー       _HEADER（マジック、形式、版、作成時刻、件数、文字列領域の長さ、CRC32）
+    品目           _ITEM × 品目数（品目名・単位への参照、価格）
+    分類           _CLASS × 分類の項目数（分類ID・名称・コードへの参照）
+    文字列領域     UTF-8 の文字列を重複なく連結したもの（参照は (開始位置, バイト数)）
+"""
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+type MarketItem = dict[str, str | float]
+type ClassMaps = dict[str, dict[str, str]]
+
+MAGIC = b"MKTS"
+FORMAT_VERSION = 1
+
+# マジック, 形式, (予備), 版, 作成時刻, 品目数, 分類の項目数, 文字列領域の長さ,
+# 統計表IDの (開始位置, バイト数), 本体（ヘッダー以降）の CRC32
+_HEADER = struct.Struct("<4sHHQdIIIIII")
+_ITEM = struct.Struct("<IIIId")
+_CLASS = struct.Struct("<IIIIII")
+
+POINTER_NAME = "current"
+LOCK_NAME = "refresh.lock"
+KEEP_VERSIONS = 2
+
+# refresh_lock でロックを待つ間隔（秒）
+LOCK_POLL_SECONDS = 0.2
+
+
+@dataclass(frozen=True, slots=True)
+class MarketSnapshot:
+    version: int
+    created_at: float
+    items: list[MarketItem]
+    stats_data_id: str | None
+    class_maps: ClassMaps
+
+
+class _Strings:
+    """文字列領域の組み立て（同じ文字列は1回だけ格納する）"""
+    def __init__(self) -> None:
+        self._refs: dict[str, tuple[int, int]] = {}
+        self._buf = bytearray()
+
+    def ref(self, value: str) -> tuple[int, int]:
+        found = self._refs.get(value)
+        if found is None:
+            data = value.encode()
+            found = self._refs[value] = (len(self._buf), len(data))
+            self._buf += data
+        return found
+
+    def data(self) -> bytes:
+        return bytes(self._buf)
+
+
+def encode_snapshot(snapshot: MarketSnapshot) -> bytes:
+    strings = _Strings()
+    items = b"".join(
+        _ITEM.pack(
+            *strings.ref(str(item.get("item_name", ""))),
+            *strings.ref(str(item.get("unit", ""))),
+            float(item.get("price", 0.0)),
+        )
+        for item in snapshot.items
+    )
+    entries = [
+        (*strings.ref(obj_id), *strings.ref(name), *strings.ref(code))
+        for obj_id, mapping in snapshot.class_maps.items()
+        for name, code in mapping.items()
+    ]
+    classes = b"".join(_CLASS.pack(*entry) for entry in entries)
+    stats_id = strings.ref(snapshot.stats_data_id) if snapshot.stats_data_id else (0, 0)
+    body = items + classes + strings.data()
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, snapshot.version, snapshot.created_at,
+        len(snapshot.items), len(entries), len(strings.data()), *stats_id, zlib.crc32(body),
+    )
+    return header + body
+
+
+def decode_snapshot(buf: memoryview | bytes) -> MarketSnapshot:
+    """encode_snapshot の形式を読みます。壊れている・形式が違う場合は ValueError。"""
+    view = memoryview(buf)
+    if len(view) < _HEADER.size:
+        raise ValueError("market snapshot is truncated")
+    (magic, fmt, _, version, created_at, n_items, n_classes, strings_len,
+     stats_off, stats_len, crc) = _HEADER.unpack_from(view)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError("not a market snapshot of this format")
+    items_end = _HEADER.size + n_items * _ITEM.size
+    classes_end = items_end + n_classes * _CLASS.size
+    if len(view) != classes_end + strings_len:
+        raise ValueError("market snapshot is truncated")
+    if zlib.crc32(view[_HEADER.size:]) != crc:
+        raise ValueError("market snapshot checksum mismatch")
+
+    strings = view[classes_end:]
+
+    def text(offset: int, length: int) -> str:
+        return str(strings[offset:offset + length], "utf-8")
+
+    items: list[MarketItem] = [
+        {"item_name": text(name_off, name_len), "price": price, "unit": text(unit_off, unit_len)}
+        for name_off, name_len, unit_off, unit_len, price in _ITEM.iter_unpack(view[_HEADER.size:items_end])
+    ]
+    class_maps: ClassMaps = {}
+    for entry in _CLASS.iter_unpack(view[items_end:classes_end]):
+        class_maps.setdefault(text(*entry[0:2]), {})[text(*entry[2:4])] = text(*entry[4:6])
+    return MarketSnapshot(
+        version=version,
+        created_at=created_at,
+        items=items,
+        stats_data_id=text(stats_off, stats_len) if stats_len else None,
+        class_maps=class_maps,
+    )
+
+
+class SnapshotStore:
+    """ディレクトリ上のスナップショットの書き出し・読み込みと、取得役のロック。"""
+    def __init__(self, directory: str | Path, check_interval: float) -> None:
+        self.directory = Path(directory)
+        self.check_interval = check_interval
+        self._pointer_key: tuple[int, int] | None = None
+        self._checked_at = 0.0
+
+    def _pointer_stat(self) -> tuple[int, int] | None:
+        try:
+            st = os.stat(self.directory / POINTER_NAME)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def load_if_changed(self, force: bool = False) -> MarketSnapshot | None:
+        """
+        前回の読み込みから最新の版が変わっていれば、読み込んで返します（変わっていなければ None）。
+        確認は check_interval 秒に1回まで（force で即座に確認）です。
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return None
+        self._checked_at = now
+
+        key = self._pointer_stat()
+        if key is None or key == self._pointer_key:
+            return None
+        name = (self.directory / POINTER_NAME).read_text(encoding="utf-8").strip()
+        with open(self.directory / name, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                snapshot = decode_snapshot(view)
+            finally:
+                view.release()
+        self._pointer_key = key
+        return snapshot
+
+    def publish(self, snapshot: MarketSnapshot) -> None:
+        """新しい版を書き出し、最新として指します。refresh_lock の中で呼びます。"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"market-{snapshot.version}.bin"
+        self._write_atomic(self.directory / name, encode_snapshot(snapshot))
+        self._write_atomic(self.directory / POINTER_NAME, name.encode())
+        # 自分が書いた版を読み直さないように
+        self._pointer_key = self._pointer_stat()
+
+        versions = sorted(self.directory.glob("market-*.bin"), key=lambda p: p.stat().st_mtime_ns)
+        for old in versions[:-KEEP_VERSIONS]:
+            old.unlink(missing_ok=True)
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(path)
+
+    @asynccontextmanager
+    async def refresh_lock(self) -> AsyncIterator[None]:
+        """取得役のロック（全ワーカーで1つ）。取れるまでイベントループを止めずに待ちます。"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.directory / LOCK_NAME, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(LOCK_POLL_SECONDS)
+            yield
+        finally:
+            # close でロックも外れる
+            os.close(fd)
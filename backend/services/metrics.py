@@ -0,0 +1,196 @@
+"""
+Prometheus テキスト形式で出力できる軽量なメトリクス
+
+/metrics エンドポイントから render() の結果を返します。
+外部ライブラリに依存せず、カウンターとヒストグラムのみを提供します。
+"""
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+type LabelValues = tuple[str, ...]
+
+# 秒単位の既定バケット（e-Stat / Supabase の数ms〜Gemini の数十秒まで）
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0,
+)
+
+_registry: list["_Metric"] = []
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """バケットごとの観測数・合計・件数を保持するヒストグラム"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベル値 -> (各バケットの観測数, 合計, 件数)
+        self._values: dict[LabelValues, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """with ブロックの経過時間（秒）を記録します。例外で抜けた場合も記録します。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> Iterator[str]:
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+def render() -> str:
+    """登録済みの全メトリクスを Prometheus テキスト形式で返します。"""
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+# =================================================================
+# メトリクス定義
+# =================================================================
+
+ANALYZE_STAGE_SECONDS = Histogram(
+    "receipt_analyze_stage_seconds",
+    "/analyzeReceipt の各段階の処理時間（秒）",
+    ("stage",),
+)
+MARKET_FETCH_SECONDS = Histogram(
+    "market_data_fetch_seconds",
+    "市場データ取得の処理時間（秒）",
+    ("cache",),
+)
+MARKET_CACHE_TOTAL = Counter(
+    "market_data_cache_total",
+    "市場データキャッシュの参照回数",
+    ("result",),
+)
+GEMINI_CALL_SECONDS = Histogram(
+    "gemini_call_seconds",
+    "Gemini API 呼び出しの処理時間（秒）",
+    ("model", "outcome"),
+)
+GEMINI_TOKENS_TOTAL = Counter(
+    "gemini_tokens_total",
+    "Gemini API の入出力トークン数",
+    ("model", "direction"),
+)
+ESTAT_REQUESTS_TOTAL = Counter(
+    "estat_requests_total",
+    "e-Stat API へのリクエスト数",
+    ("endpoint", "outcome"),
+)
+ESTAT_CACHE_TOTAL = Counter(
+    "estat_cache_total",
+    "EStatClient 内部キャッシュの参照回数",
+    ("cache", "result"),
+)
+AUTH_CACHE_TOTAL = Counter(
+    "auth_cache_total",
+    "JWT 検証結果キャッシュの参照回数（hit / negative_hit / miss）",
+    ("result",),
+)
+WRITE_BEHIND_FLUSH_SECONDS = Histogram(
+    "write_behind_flush_seconds",
+    "write-behind バッファの一括挿入1回の処理時間（秒）",
+    ("buffer", "outcome"),
+)
+WRITE_BEHIND_RECORDS_TOTAL = Counter(
+    "write_behind_records_total",
+    "write-behind バッファのレコード数（enqueued / flushed / dropped / recovered）",
+    ("buffer", "result"),
+)
+STARTUP_SECONDS = Histogram(
+    "app_startup_seconds",
+    "起動時のウォームアップの各段階の時間（秒）。stage=ready はプロセスの開始から準備完了まで",
+    ("stage",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
@@ -0,0 +1,153 @@
+"""
+全ユーザーの解析結果から集める、店舗 × 商品の実売価格
+
+解析結果の各商品の (店舗名, canonical, 支払単価) を、店舗 × 商品ごとと、商品ごと（全店舗。
+store_name = ''）の PriceDigest に加えます。月次の e-Stat より新しい価格の目安になり、
+追加の外部 API 呼び出しもありません。
+
+- ワーカーは前回の保存以降の差分だけをメモリに持ち、OBSERVED_PRICES_FLUSH_SECONDS ごとに
+  merge_store_item_prices でデータベースの集計（store_item_prices）へ併合する。
+  併合はデータベース側で行うため、複数ワーカーの差分を取りこぼさない
+- 差分を持つキーは max_keys まで。超えた新しいキーの観測は次の保存まで捨てる（メモリの上限）
+- 保存に失敗した差分は次回に持ち越す
+"""
+import time
+from typing import Any
+
+from schemas import ObservedPrice, normalize_text
+from services.price_digest import DEFAULT_COMPRESSION, PriceDigest
+
+type PriceKey = tuple[str, str]
+
+# 全店舗の集計を表す店舗名
+ALL_STORES = ""
+
+# これを超える単価は読み取りの誤りとみなして数えない
+MAX_PRICE = 1_000_000
+
+OBSERVED_PRICE_COLUMNS = "store_name, canonical, observation_count, price_sum, min_price, max_price, centroids, updated_at"
+
+
+def _price(value: Any) -> float | None:
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if 0 < price <= MAX_PRICE else None
+
+
+class ObservedPrices:
+    """保存前の観測（キーごとの PriceDigest）を持つ集計器。"""
+    def __init__(self, max_keys: int, compression: int = DEFAULT_COMPRESSION) -> None:
+        self.max_keys = max_keys
+        self.compression = compression
+        self._pending: dict[PriceKey, PriceDigest] = {}
+        self.observed = 0
+        self.dropped = 0
+        self.flushed_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _add(self, key: PriceKey, price: float) -> bool:
+        digest = self._pending.get(key)
+        if digest is None:
+            if len(self._pending) >= self.max_keys:
+                self.dropped += 1
+                return False
+            digest = self._pending[key] = PriceDigest(self.compression)
+        digest.add(price)
+        return True
+
+    def observe(self, store_name: str | None, canonical: str | None, price: Any) -> bool:
+        """1件の観測を加えます。canonical や単価が使えない場合は何もせず False を返します。"""
+        value = _price(price)
+        if not canonical or value is None:
+            return False
+        recorded = self._add((ALL_STORES, canonical), value)
+        store = normalize_text(store_name) if store_name else ""
+        if store:
+            self._add((store, canonical), value)
+        self.observed += recorded
+        return recorded
+
+    def observe_analysis(self, analysis_result: dict[str, Any]) -> int:
+        """解析結果の商品をすべて加え、加えた件数を返します。信頼度の低いテキスト解析は使いません。"""
+        debug = analysis_result.get("debug")
+        if isinstance(debug, dict) and debug.get("low_confidence"):
+            return 0
+        items = analysis_result.get("items")
+        if not isinstance(items, list):
+            return 0
+        store_name = analysis_result.get("store_name")
+        return sum(
+            self.observe(store_name, item.get("canonical"), item.get("paid_unit_price"))
+            for item in items
+            if isinstance(item, dict)
+        )
+
+    def take(self) -> dict[PriceKey, PriceDigest]:
+        """保存する差分を取り出します（取り出した分はこの集計器から消えます）。"""
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, pending: dict[PriceKey, PriceDigest]) -> None:
+        """保存できなかった差分を戻します（その間に増えた観測と併合します）。"""
+        for key, digest in pending.items():
+            current = self._pending.get(key)
+            if current is not None:
+                current.merge(digest)
+            elif len(self._pending) < self.max_keys:
+                self._pending[key] = digest
+            else:
+                self.dropped += digest.count
+
+    def mark_flushed(self) -> None:
+        self.flushed_at = time.time()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending_keys": len(self._pending),
+            "observed": self.observed,
+            "dropped": self.dropped,
+            "flushed_at": self.flushed_at,
+        }
+
+
+def merge_rows(pending: dict[PriceKey, PriceDigest]) -> list[dict[str, Any]]:
+    """差分を merge_store_item_prices の p_rows の形にします。"""
+    return [
+        {"store_name": store_name, "canonical": canonical, **digest.to_dict()}
+        for (store_name, canonical), digest in pending.items()
+        if digest.count
+    ]
+
+
+def observed_price_from_row(row: dict[str, Any], compression: int = DEFAULT_COMPRESSION) -> ObservedPrice:
+    """store_item_prices の1行を、平均と分位点（p10 / p50 / p90）に変換します。"""
+    count = int(row.get("observation_count") or 0)
+    total = float(row.get("price_sum") or 0)
+    centroids = row.get("centroids")
+    digest = PriceDigest.from_centroids(
+        centroids if isinstance(centroids, list) else [],
+        count=count,
+        total=total,
+        min_value=float(row.get("min_price") or 0),
+        max_value=float(row.get("max_price") or 0),
+        compression=compression,
+    )
+
+    def _round(value: float | None) -> float | None:
+        return round(value, 2) if value is not None else None
+
+    return ObservedPrice(
+        store_name=row.get("store_name") or None,
+        count=count,
+        mean=_round(digest.mean),
+        min=_round(digest.min) if count else None,
+        max=_round(digest.max) if count else None,
+        p10=_round(digest.quantile(0.1)),
+        p50=_round(digest.quantile(0.5)),
+        p90=_round(digest.quantile(0.9)),
+        updated_at=str(row["updated_at"]) if row.get("updated_at") else None,
+    )
@@ -0,0 +1,63 @@
+"""
+キーセット・ページネーション用のカーソル
+
+(created_at, id) の降順で並べた一覧の「前ページ最後の行」を、URL に使える不透明な文字列にします。
+OFFSET と違い、何ページ目でも読む行数はページサイズ分だけです。
+"""
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException, status
+
+# PostgREST の or フィルタの値として埋め込むため、区切り文字を含む値はダブルクォートで囲む
+_QUOTE_TRANSLATION = str.maketrans({'"': r'\"', "\\": r"\\"})
+
+
+def encode_cursor(created_at: str, row_id: str) -> str:
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """カーソルを (created_at, id) に戻します。不正な値は 400 を返します。"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(row_id, str):
+            raise ValueError(cursor)
+        # フィルタに埋め込む前に、日時と UUID として読めることを確かめる
+        datetime.fromisoformat(created_at)
+        uuid.UUID(row_id)
+        return created_at, row_id
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+
+
+def _quote(value: str) -> str:
+    return f'"{value.translate(_QUOTE_TRANSLATION)}"'
+
+
+def after_cursor_filter(cursor: str) -> str:
+    """(created_at, id) 降順で、カーソルより後ろの行を選ぶ PostgREST の or フィルタ。"""
+    return after_row_filter(*decode_cursor(cursor))
+
+
+def after_row_filter(created_at: str, row_id: str) -> str:
+    """(created_at, id) 降順で、指定した行より後ろの行を選ぶ PostgREST の or フィルタ。"""
+    return (
+        f"created_at.lt.{_quote(created_at)},"
+        f"and(created_at.eq.{_quote(created_at)},id.lt.{_quote(row_id)})"
+    )
+
+
+def split_page(rows: list[Any], limit: int) -> tuple[list[Any], str | None]:
+    """limit + 1 件取得した行を、返す行と次ページのカーソル（続きがなければ None）に分けます。"""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(str(last["created_at"]), str(last["id"]))
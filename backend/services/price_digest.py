@@ -0,0 +1,151 @@
+"""
+価格の分位点スケッチ（t-digest 風）
+
+観測値を (平均, 重み) の重心の列に要約し、中央値や p10 / p90 などの分位点を近似します。
+重心の数は compression 程度で頭打ちになり、観測数に関係なくメモリは一定です。
+分布の両端ほど重心を細かく（重みを小さく）保つため、端の分位点も比較的正確です。
+
+重心の併合は、累積分位 q を k(q) = compression / π × (asin(2q − 1) + π/2) で写した値の
+整数部が同じ重心どうしをまとめる方式です。データベース側の compress_price_centroids
+（merge_store_item_prices）も同じ規則で併合します。
+"""
+import math
+from collections.abc import Iterable
+from typing import Any
+
+DEFAULT_COMPRESSION = 100
+
+
+def _k_bucket(q: float, compression: int) -> int:
+    q = min(max(q, 0.0), 1.0)
+    return math.floor(compression / math.pi * (math.asin(2 * q - 1) + math.pi / 2))
+
+
+class PriceDigest:
+    """
+    観測数・合計・最小・最大と、分位点用の重心を持つスケッチ。
+    add() した値はいったん溜め、compression 件ごとに重心へ併合します。
+    """
+    __slots__ = ("compression", "count", "total", "min", "max", "_centroids", "_buffer")
+
+    def __init__(self, compression: int = DEFAULT_COMPRESSION) -> None:
+        self.compression = compression
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._centroids: list[tuple[float, float]] = []
+        self._buffer: list[tuple[float, float]] = []
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def add(self, value: float, weight: int = 1) -> None:
+        self.count += weight
+        self.total += value * weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self._buffer.append((value, float(weight)))
+        if len(self._buffer) >= self.compression:
+            self._compress()
+
+    def merge(self, other: "PriceDigest") -> None:
+        """other の観測をこのスケッチに加えます（other は変更しません）。"""
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._buffer.extend(other.centroids())
+        self._compress()
+
+    def centroids(self) -> list[tuple[float, float]]:
+        """(平均, 重み) の重心を平均の昇順で返します。"""
+        self._compress()
+        return list(self._centroids)
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        weight_total = sum(w for _, w in points)
+
+        merged: list[tuple[float, float]] = []
+        bucket = -1
+        mean_sum = 0.0
+        weight_sum = 0.0
+        before = 0.0
+        for mean, weight in points:
+            k = _k_bucket((before + weight / 2) / weight_total, self.compression)
+            before += weight
+            if k != bucket and weight_sum:
+                merged.append((mean_sum / weight_sum, weight_sum))
+                mean_sum = weight_sum = 0.0
+            bucket = k
+            mean_sum += mean * weight
+            weight_sum += weight
+        if weight_sum:
+            merged.append((mean_sum / weight_sum, weight_sum))
+        self._centroids = merged
+
+    def quantile(self, q: float) -> float | None:
+        """
+        分位点（q は 0〜1）を返します。観測がなければ None。
+        重心の中心どうし（両端は最小値・最大値）の間を線形に補間します。
+        """
+        centroids = self.centroids()
+        if not centroids:
+            return None
+        target = min(max(q, 0.0), 1.0) * self.count
+
+        # (累積の位置, 値) の折れ線。重心の位置はその重みの中央
+        prev_pos, prev_value = 0.0, self.min
+        before = 0.0
+        for mean, weight in centroids:
+            pos = before + weight / 2
+            if target <= pos:
+                if pos == prev_pos:
+                    return mean
+                return prev_value + (mean - prev_value) * (target - prev_pos) / (pos - prev_pos)
+            prev_pos, prev_value = pos, mean
+            before += weight
+        if self.count == prev_pos:
+            return self.max
+        return prev_value + (self.max - prev_value) * (target - prev_pos) / (self.count - prev_pos)
+
+    def to_dict(self) -> dict[str, Any]:
+        """保存用の形（count / sum / min / max / centroids）。"""
+        return {
+            "count": self.count,
+            "sum": round(self.total, 2),
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "centroids": [[round(m, 4), w] for m, w in self.centroids()],
+        }
+
+    @classmethod
+    def from_centroids(
+        cls,
+        centroids: Iterable[Any],
+        *,
+        count: int,
+        total: float,
+        min_value: float,
+        max_value: float,
+        compression: int = DEFAULT_COMPRESSION,
+    ) -> "PriceDigest":
+        """保存した重心（[平均, 重み] の列）と集計値から復元します。"""
+        digest = cls(compression)
+        digest._buffer = [(float(c[0]), float(c[1])) for c in centroids if isinstance(c, list | tuple) and len(c) == 2]
+        digest.count = count
+        digest.total = total
+        digest.min = min_value
+        digest.max = max_value
+        digest._compress()
+        return digest
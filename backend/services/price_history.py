@@ -0,0 +1,71 @@
+"""
+ユーザーごとの商品の価格履歴（最安値・前回の価格・移動平均）
+
+履歴はデータベース側（user_item_prices テーブルとトリガー）で、レシートの作成・更新・削除のたびに
+変わった商品の分だけ作り直しています。ここでは解析結果の各商品に、その商品の履歴
+（主キーで引いた1行）と今回の単価との差を付けます。
+"""
+from typing import Any
+
+from schemas import PriceHistory
+
+PRICE_HISTORY_COLUMNS = (
+    "canonical, purchase_count, min_price, min_store_name, min_purchase_date, "
+    "last_price, last_store_name, last_purchase_date, ewma_price"
+)
+
+
+def _price(value: Any) -> float | None:
+    try:
+        return round(float(value), 2) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def history_canonicals(items: Any) -> list[str]:
+    """解析結果の商品から、履歴を引く canonical（重複なし）を取り出します。"""
+    if not isinstance(items, list):
+        return []
+    canonicals = {item.get("canonical") for item in items if isinstance(item, dict)}
+    return sorted(c for c in canonicals if isinstance(c, str) and c)
+
+
+def _history_from_row(row: dict[str, Any], paid: float | None) -> PriceHistory | None:
+    min_price = _price(row.get("min_price"))
+    last_price = _price(row.get("last_price"))
+    average_price = _price(row.get("ewma_price"))
+    if min_price is None or last_price is None or average_price is None:
+        return None
+    return PriceHistory(
+        purchase_count=int(row.get("purchase_count") or 0),
+        min_price=min_price,
+        min_store_name=row.get("min_store_name"),
+        min_purchase_date=row.get("min_purchase_date"),
+        last_price=last_price,
+        last_store_name=row.get("last_store_name"),
+        last_purchase_date=row.get("last_purchase_date"),
+        average_price=average_price,
+        diff_from_min=round(paid - min_price, 2) if paid is not None else None,
+        diff_from_last=round(paid - last_price, 2) if paid is not None else None,
+    )
+
+
+def attach_price_history(items: Any, rows: list[Any]) -> int:
+    """
+    解析結果の各商品に history（PriceHistory の dict。履歴がなければ None）を付け、
+    履歴が見つかった商品の数を返します。rows は user_item_prices の行です。
+    """
+    if not isinstance(items, list):
+        return 0
+    by_canonical = {
+        row["canonical"]: row for row in rows if isinstance(row, dict) and row.get("canonical")
+    }
+    found = 0
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        row = by_canonical.get(item.get("canonical") or "")
+        history = _history_from_row(row, _price(item.get("paid_unit_price"))) if row else None
+        item["history"] = history.model_dump() if history else None
+        found += history is not None
+    return found
@@ -0,0 +1,228 @@
+"""
+リクエスト単位のオンデマンド・サンプリングプロファイラ
+
+管理者用トークン付きのヘッダー（X-Profile）/クエリ（?profile=）を指定したリクエスト、
+または PROFILE_SAMPLE_RATE の確率で選ばれたリクエストだけを計測します。
+
+計測中は別スレッドが一定間隔でスタックを採取します。
+- イベントループ上で実行中のタスク: 実際のスレッドのスタック
+- await で待機中のタスク: コルーチンの await チェーン
+そのリクエストから派生したタスク（contextvar を引き継いだもの）も対象になります。
+結果は speedscope 形式（https://www.speedscope.app/）で PROFILE_DIR に保存し、
+古いものから削除して PROFILE_MAX_FILES 件までに保ちます。
+
+計測対象でないリクエストのコストは、ヘッダー・クエリの確認と乱数1回のみです。
+"""
+import asyncio
+import hmac
+import json
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from typing import Any
+from urllib.parse import parse_qs
+
+from config import settings
+from loguru import logger
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_PARAM = "profile"
+
+type FrameKey = tuple[str, str, int]
+
+# 計測中のリクエストのプロファイル（派生タスクにも引き継がれる）
+_active_profile: ContextVar["RequestProfile | None"] = ContextVar("active_profile", default=None)
+
+
+def _await_chain(coro: Any) -> list[FrameType]:
+    """コルーチンの await チェーンをたどり、外側から内側の順にフレームを返します。"""
+    frames: list[FrameType] = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+
+def _thread_stack(leaf: FrameType, root: FrameType | None) -> list[FrameType]:
+    """スレッドの現在のスタックを外側から内側の順に返します（root が見つかればそこから）。"""
+    frames: list[FrameType] = []
+    frame: FrameType | None = leaf
+    while frame is not None:
+        frames.append(frame)
+        if frame is root:
+            break
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+class RequestProfile:
+    """1リクエスト分のサンプルを保持し、speedscope 形式に書き出します。"""
+    def __init__(self, name: str, loop: asyncio.AbstractEventLoop, loop_thread_id: int, interval: float) -> None:
+        self.name = name
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.started_at = time.perf_counter()
+        self.ended_at = self.started_at
+        self._frame_index: dict[FrameKey, int] = {}
+        self._frames: list[dict[str, str | int]] = []
+        self.samples: list[list[int]] = []
+        self.weights: list[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler:{name}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.ended_at = time.perf_counter()
+
+    def _intern(self, key: FrameKey) -> int:
+        idx = self._frame_index.get(key)
+        if idx is None:
+            idx = len(self._frames)
+            self._frame_index[key] = idx
+            name, file, line = key
+            self._frames.append({"name": name, "file": file, "line": line})
+        return idx
+
+    def _record(self, label: str, frames: list[FrameType], weight: float) -> None:
+        stack = [self._intern((label, "", 0))]
+        stack.extend(self._intern((f.f_code.co_qualname, f.f_code.co_filename, f.f_lineno)) for f in frames)
+        self.samples.append(stack)
+        self.weights.append(weight)
+
+    def _sample_once(self, weight: float) -> None:
+        try:
+            tasks = [t for t in asyncio.all_tasks(self.loop) if t.get_context().get(_active_profile) is self]
+        except RuntimeError:
+            return
+        running = asyncio.current_task(self.loop)
+        leaf = sys._current_frames().get(self.loop_thread_id)
+        for task in tasks:
+            coro = task.get_coro()
+            chain = _await_chain(coro)
+            if not chain:
+                continue
+            if task is running and leaf is not None:
+                self._record(f"{task.get_name()} [running]", _thread_stack(leaf, chain[0]), weight)
+            else:
+                self._record(f"{task.get_name()} [awaiting]", chain, weight)
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self._sample_once(now - last)
+            last = now
+
+    def to_speedscope(self) -> dict[str, Any]:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "receipt-toku profiler",
+            "shared": {"frames": self._frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.ended_at - self.started_at,
+                "samples": self.samples,
+                "weights": self.weights,
+            }],
+        }
+
+
+def _write_profile(profile: RequestProfile, path: Path) -> None:
+    """プロファイルを書き出し、保存件数の上限を超えた古いファイルを削除します。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(profile.to_speedscope(), ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+    files = sorted(path.parent.glob("*.speedscope.json"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-settings.PROFILE_MAX_FILES]:
+        old.unlink(missing_ok=True)
+
+
+def _matches_token(value: str, token: bytes) -> bool:
+    try:
+        raw = value.encode("latin-1")
+    except UnicodeEncodeError:
+        return False
+    return hmac.compare_digest(raw, token)
+
+
+def _is_requested(scope: Scope) -> bool:
+    # compare_digest は ASCII 以外を含む str を比べられないため、バイト列どうしで比べる
+    if not settings.PROFILE_ADMIN_TOKEN:
+        return False
+    token = settings.PROFILE_ADMIN_TOKEN.encode()
+    for key, value in scope.get("headers", []):
+        if key == PROFILE_HEADER:
+            return hmac.compare_digest(value, token)
+    query = scope.get("query_string", b"")
+    if PROFILE_QUERY_PARAM.encode() in query:
+        # パーセントエスケープを1バイト1文字で戻し、ヘッダーと同じくトークンの UTF-8 表現と比べる
+        values = parse_qs(query.decode("latin-1"), encoding="latin-1").get(PROFILE_QUERY_PARAM, [])
+        return any(_matches_token(v, token) for v in values)
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    対象リクエストを計測するASGIミドルウェア。
+    計測したリクエストのレスポンスには X-Profile-Id（保存ファイル名）を付与します。
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in settings.PROFILE_PATHS:
+            await self.app(scope, receive, send)
+            return
+        sampled = settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+        if not (sampled or _is_requested(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        file_name = f"{stamp}{scope['path'].replace('/', '_')}.speedscope.json"
+        profile = RequestProfile(
+            name=f"{scope['method']} {scope['path']}",
+            loop=asyncio.get_running_loop(),
+            loop_thread_id=threading.get_ident(),
+            interval=settings.PROFILE_INTERVAL_MS / 1000,
+        )
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-profile-id", file_name.encode())]
+            await send(message)
+
+        token = _active_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _active_profile.reset(token)
+            await asyncio.to_thread(profile.stop)
+            try:
+                await asyncio.to_thread(_write_profile, profile, Path(settings.PROFILE_DIR) / file_name)
+                logger.info(f"Profile saved: {file_name} ({len(profile.samples)} samples)")
+            except OSError as e:
+                logger.warning(f"Failed to save profile {file_name}: {e}")
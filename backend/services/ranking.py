@@ -0,0 +1,41 @@
+"""
+ランキング取得
+
+集計はデータベース側（user_savings_totals テーブルと get_ranking 関数）で行い、
+ここでは上位N名と自分の行だけを受け取ってレスポンスに変換します。
+"""
+from typing import Any
+
+from schemas import RankingEntry, RankingResponse
+
+
+def ranking_from_rows(rows: list[Any]) -> RankingResponse:
+    """
+    get_ranking の結果（上位N名の行 + is_me=true の自分の行）を RankingResponse に変換します。
+    自分の記録がない場合、自分の行は含まれません。
+    """
+    rankings: list[RankingEntry] = []
+    me: dict[str, Any] = {}
+
+    for row in rows:
+        if not row or not isinstance(row, dict):
+            continue
+        nickname_val = row.get("nickname")
+        nickname = str(nickname_val) if nickname_val else None
+        if row.get("is_me"):
+            me = {
+                "my_rank": int(row["rank"]),
+                "my_nickname": nickname,
+                "my_total_saved": int(row.get("total_saved") or 0),
+                "my_total_overpaid": int(row.get("total_overpaid") or 0),
+            }
+        else:
+            rankings.append(RankingEntry(
+                rank=int(row["rank"]),
+                user_id=str(row["user_id"]),
+                nickname=nickname,
+                total_saved=int(row.get("total_saved") or 0),
+                total_overpaid=int(row.get("total_overpaid") or 0),
+            ))
+
+    return RankingResponse(rankings=rankings, **me)
@@ -0,0 +1,256 @@
+"""
+リクエスト期限の伝播・クライアント切断時のキャンセル・サーキットブレーカー
+
+- 受信したリクエストごとに処理期限（デッドライン）を contextvar に設定し、
+  e-Stat / Gemini / Supabase への呼び出しは残り時間をタイムアウトとして使います。
+- 上流ごとのサーキットブレーカーは連続失敗で「開」になり、一定時間は即座に失敗させます。
+"""
+import asyncio
+import time
+from collections.abc import Awaitable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Literal
+
+from config import settings
+from fastapi import HTTPException, Request
+from loguru import logger
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# 現在のリクエストの期限（time.monotonic() 基準）。期限なしなら None
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+DEADLINE_HEADER = b"x-request-timeout"
+
+
+class DeadlineExceeded(HTTPException):
+    """リクエストの処理期限を超過した"""
+    def __init__(self, detail: str = "リクエストの処理期限を超過しました") -> None:
+        super().__init__(status_code=504, detail=detail)
+
+
+class CircuitOpenError(HTTPException):
+    """上流サービスのサーキットブレーカーが開いている"""
+    def __init__(self, name: str) -> None:
+        super().__init__(status_code=503, detail=f"{name} は一時的に利用できません（サーキットブレーカー作動中）")
+
+
+class ClientDisconnected(HTTPException):
+    """クライアントが応答を待たずに切断した"""
+    def __init__(self) -> None:
+        super().__init__(status_code=499, detail="Client Closed Request")
+
+
+# =================================================================
+# デッドライン
+# =================================================================
+
+
+def remaining_time() -> float | None:
+    """現在のリクエストの残り時間（秒）を返します。期限が設定されていなければ None。"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    """期限を過ぎていれば DeadlineExceeded を送出します。"""
+    left = remaining_time()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def timeout_for(cap: float | None) -> float | None:
+    """上流呼び出しに使うタイムアウト（cap と残り時間の小さい方）を返します。"""
+    check_deadline()
+    left = remaining_time()
+    if left is None:
+        return cap
+    if cap is None:
+        return left
+    return min(cap, left)
+
+
+@contextmanager
+def deadline_after(seconds: float) -> Iterator[None]:
+    """
+    ブロック内の処理に、現在時刻から seconds 秒後の新しい期限を設定します。
+    ストリーミング応答のように、リクエスト全体ではなく1回ごとの呼び出しに期限を設けたい場合に使います。
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _parse_timeout_header(scope: Scope) -> float | None:
+    for key, value in scope.get("headers", []):
+        if key == DEADLINE_HEADER:
+            try:
+                return float(value.decode("latin-1"))
+            except ValueError:
+                return None
+    return None
+
+
+class DeadlineMiddleware:
+    """
+    リクエストごとにデッドラインを設定するASGIミドルウェア。
+    クライアントは X-Request-Timeout ヘッダー（秒）で期限を短くできます。
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = settings.REQUEST_TIMEOUT_SECONDS
+        requested = _parse_timeout_header(scope)
+        if requested is not None and requested > 0:
+            budget = min(budget, max(requested, settings.REQUEST_TIMEOUT_MIN_SECONDS))
+
+        token = _deadline.set(time.monotonic() + budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+# =================================================================
+# クライアント切断時のキャンセル
+# =================================================================
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect[T](request: Request, work: Awaitable[T]) -> T:
+    """
+    work を実行し、完了前にクライアントが切断したらキャンセルします。
+    リクエストボディを読み終えた後に呼び出してください。
+    """
+    work_task = asyncio.ensure_future(work)
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if work_task.done():
+            return work_task.result()
+        logger.info(f"Client disconnected, cancelling {request.url.path}")
+        raise ClientDisconnected()
+    finally:
+        watcher.cancel()
+        work_task.cancel()
+
+
+# =================================================================
+# サーキットブレーカー
+# =================================================================
+
+
+type BreakerState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """
+    連続 failure_threshold 回失敗すると「開」になり、reset_timeout 秒間は即座に失敗させます。
+    その後「半開」で1件だけ試行を通し、成功すれば「閉」に戻ります。
+    """
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state: BreakerState = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> BreakerState:
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return self._state
+
+    def _before_call(self) -> bool:
+        """呼び出し可否を判定し、半開状態の試行であれば True を返します。"""
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        raise CircuitOpenError(self.name)
+
+    def record_success(self) -> None:
+        if self._state != "closed":
+            logger.info(f"Circuit breaker '{self.name}' closed")
+        self._state = "closed"
+        self._failures = 0
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state != "closed" or self._failures >= self.failure_threshold:
+            if self._state == "closed":
+                logger.warning(f"Circuit breaker '{self.name}' opened after {self._failures} failures")
+            self._state = "open"
+            self._opened_at = time.monotonic()
+
+    @contextmanager
+    def guard(self, ignore: tuple[type[BaseException], ...] = ()) -> Iterator[None]:
+        """
+        ブロック内の例外を失敗として記録します。
+        ignore に含まれる例外（呼び出し側の誤りなど）とキャンセルは失敗として数えません。
+        リクエストの期限（クライアントが短くできる）による TimeoutError も上流の失敗とは数えず、
+        DeadlineExceeded として送出します。
+        """
+        is_probe = self._before_call()
+        try:
+            yield
+        except ignore:
+            raise
+        except (CircuitOpenError, ClientDisconnected, DeadlineExceeded):
+            raise
+        except TimeoutError as e:
+            left = remaining_time()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded() from e
+            self.record_failure()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        else:
+            self.record_success()
+        finally:
+            if is_probe:
+                self._probe_in_flight = False
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """上流サービス名ごとのサーキットブレーカーを返します（なければ作成）。"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_RESET_TIMEOUT_SECONDS,
+        )
+        _breakers[name] = breaker
+    return breaker
+
+
+def get_breaker_states() -> dict[str, dict[str, Any]]:
+    return {name: b.snapshot() for name, b in _breakers.items()}
@@ -0,0 +1,193 @@
+"""
+端末側OCRで得たレシートテキストを、LLMを使わずに解析するモジュール
+
+テキストを行単位で解析し、ルールとe-Statの品目分類で名寄せしてから
+キャッシュ済みの市場価格と比較します。品目名に内容量・個数（"190g", "3コ"）があれば、
+市場価格をその量に換算してから比較します（services/units.py）。換算できない商品は比較せず、
+節約額・過払い額にも含めません。外部APIは呼び出しません。
+"""
+import time
+from typing import Any
+
+from rules import ESTAT_NAME_HINTS
+from schemas import (
+    AnalyzeResponse,
+    EstatResult,
+    ItemResult,
+    fold_key,
+    parse_receipt_text,
+    resolve_canonical,
+)
+from services.units import Quantity, convert, parse_size, parse_unit, piece_weight
+
+# 判定のしきい値（プロンプトの判定基準と同じ）
+OVERPAY_RATE = 1.05
+DEAL_RATE = 0.95
+
+type MarketItem = dict[str, str | float]
+
+# 市場データ一覧 -> 品目名の検索インデックス（市場データが更新されたら作り直す）
+_index_source: list[MarketItem] | None = None
+_index: dict[str, MarketItem] = {}
+
+
+def _market_index(market_data: list[MarketItem]) -> dict[str, MarketItem]:
+    global _index_source, _index
+    if _index_source is not market_data:
+        _index = {k: m for m in market_data if (k := fold_key(str(m.get("item_name", ""))))}
+        _index_source = market_data
+    return _index
+
+
+def find_market_item(canonical: str, market_data: list[MarketItem]) -> MarketItem | None:
+    """名寄せ後の品目名に対応する市場価格を探します。"""
+    index = _market_index(market_data)
+    key = fold_key(canonical)
+    if not key:
+        return None
+    if key in index:
+        return index[key]
+
+    hints = [fold_key(h) for h in ESTAT_NAME_HINTS.get(canonical, [canonical]) if h]
+    best: MarketItem | None = None
+    best_len = 10**9
+    for name_key, item in index.items():
+        if any(h in name_key for h in hints) or name_key in key:
+            # 最も短い（＝より一般的な）品目名を優先する
+            if len(name_key) < best_len:
+                best, best_len = item, len(name_key)
+    return best
+
+
+def _market_price_for(
+    stat_price: float, unit: str | None, size: Quantity | None, piece_grams: float | None,
+) -> tuple[float | None, str | None, str]:
+    """
+    レシートに書かれた量（size）を買ったときの市場価格と、その単位・補足を返します。
+    量の記載がなければ、市場データが個数の単位ならその単位のまま、重さの単位なら1個として換算します。
+    換算できない場合は価格を None とし、比較しません（差額を節約額に入れない）。
+    """
+    source = parse_unit(unit) if unit else None
+    if source is None:
+        return None, unit, "市場データの単位を解析できないため比較していません"
+
+    assumed = size is None
+    if size is None:
+        if source.dimension == "count":
+            return stat_price, unit, f"数量の記載なし（{unit}あたりの市場価格と比較）"
+        size = Quantity(1.0, "count")
+
+    converted = convert(stat_price, source, size, piece_grams)
+    if converted is None:
+        reason = "数量の記載がなく" if assumed else f"{size.label()}を"
+        return None, unit, f"{reason}{unit}あたりの価格から換算できないため比較していません"
+    note = f"{unit}あたり{stat_price:g}円を{size.label()}に換算"
+    assumptions = []
+    if assumed:
+        assumptions.append("数量の記載がないため1個")
+    if source.dimension != size.dimension:
+        assumptions.append(f"1個あたり約{piece_grams:g}g")
+    if assumptions:
+        note += f"（{'、'.join(assumptions)}として）"
+    return round(converted, 2), size.label(), note
+
+
+def _judge(
+    paid: float | None,
+    market: MarketItem | None,
+    size: Quantity | None = None,
+    piece_grams: float | None = None,
+) -> EstatResult:
+    if market is None:
+        return EstatResult(found=False, judgement="FAIR", note="市場データに該当する品目がありません")
+
+    stat_price = float(market.get("price", 0) or 0)
+    unit = str(market.get("unit", "")) or None
+    if paid is None or stat_price <= 0:
+        return EstatResult(found=True, stat_price=stat_price or None, stat_unit=unit, judgement="FAIR",
+                           note="支払額を読み取れませんでした")
+
+    expected, expected_unit, note = _market_price_for(stat_price, unit, size, piece_grams)
+    if expected is None:
+        return EstatResult(found=True, stat_price=stat_price, stat_unit=unit, judgement="FAIR", note=note)
+
+    rate = paid / expected
+    if rate >= OVERPAY_RATE:
+        judgement = "OVERPAY"
+    elif rate <= DEAL_RATE:
+        judgement = "DEAL"
+    else:
+        judgement = "FAIR"
+    return EstatResult(
+        found=True,
+        stat_price=expected,
+        stat_unit=expected_unit,
+        diff=round(expected - paid, 2),
+        rate=round(rate, 4),
+        judgement=judgement,
+        note=note,
+    )
+
+
+def analyze_receipt_text(
+    text: str,
+    market_data: list[MarketItem],
+    class_maps: dict[str, dict[str, str]],
+) -> dict[str, Any]:
+    """
+    レシートテキストを解析し、/analyzeReceipt と同じ形のレスポンスを返します。
+    debug.confidence は市場価格と照合できた商品の割合です。
+    """
+    started = time.perf_counter()
+    purchase_date, lines = parse_receipt_text(text)
+
+    items: list[ItemResult] = []
+    unmatched: list[str] = []
+    total_payment = 0.0
+    total_saved = 0.0
+    total_overpaid = 0.0
+
+    for raw_name, price in lines:
+        resolution = resolve_canonical(raw_name, class_maps)
+        canonical = resolution.canonical
+        market = find_market_item(canonical, market_data) if canonical else None
+        piece_grams = None
+        if market is not None:
+            piece_grams = piece_weight(canonical) or piece_weight(str(market.get("item_name", "")))
+        estat = _judge(price, market, parse_size(raw_name), piece_grams)
+        if not estat.found:
+            unmatched.append(raw_name)
+
+        if price is not None:
+            total_payment += price
+        if estat.diff is not None:
+            if estat.judgement == "DEAL":
+                total_saved += abs(estat.diff)
+            elif estat.judgement == "OVERPAY":
+                total_overpaid += abs(estat.diff)
+
+        items.append(ItemResult(
+            raw_name=raw_name,
+            canonical=canonical,
+            paid_unit_price=price,
+            quantity=1.0,
+            estat=estat,
+        ))
+
+    confidence = (len(items) - len(unmatched)) / len(items) if items else 0.0
+    response = AnalyzeResponse(
+        purchase_date=purchase_date,
+        items=items,
+        summary={
+            "total_payment": total_payment,
+            "total_overpaid_amount": total_overpaid,
+            "total_saved_amount": total_saved,
+        },
+        debug={
+            "source": "text",
+            "confidence": round(confidence, 3),
+            "unmatched": unmatched,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        },
+    )
+    return response.model_dump()
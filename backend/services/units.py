@@ -0,0 +1,194 @@
+"""
+市場価格の単位の解析と換算
+
+e-Stat の単位（"1kg", "100g", "1パック(10個)", "1本(1000ml)" など）を、基準単位（g / ml / 個）での量と
+次元（重さ・容量・個数）に分解し、市場価格を基準単位あたりの価格に揃えます。
+Gemini に単位の換算や重さの推定をさせる代わりに、換算済みの価格と1個あたりの標準重量
+（rules.PIECE_WEIGHTS）を渡し、テキスト解析でも同じ換算を使います。
+
+- 単位の文字列は数十種類しかないため、文字列ごとに1回だけ解析する（lru_cache）
+- プロンプト用の市場データ（annotate_market_data）は市場データの版ごとに1回、全品目を1回の走査で作る
+- 解析できない単位・次元が合わない組み合わせは換算も比較もしない（判定は FAIR、差額なし）
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Literal
+
+from rules import PIECE_WEIGHTS
+from schemas import normalize_text
+
+type Dimension = Literal["mass", "volume", "count"]
+type MarketItem = dict[str, str | float]
+
+# 単位の表記（小文字） -> (次元, 基準単位 g / ml での量)
+_MEASURES: dict[str, tuple[Dimension, float]] = {
+    "kg": ("mass", 1000.0),
+    "g": ("mass", 1.0),
+    "mg": ("mass", 0.001),
+    "l": ("volume", 1000.0),
+    "ml": ("volume", 1.0),
+    "cc": ("volume", 1.0),
+}
+
+# 個数として数える助数詞（normalize_text 後の表記で照合する）
+_COUNTERS = [
+    "個", "コ", "ケ", "本", "枚", "袋", "パック", "玉", "缶", "箱", "束", "尾", "匹", "株", "房",
+    "ロール", "組", "切れ", "切", "丁", "杯", "食",
+]
+
+# 基準単位あたりの価格を表示する量（100g・100ml・1個）
+BASE_UNITS: dict[Dimension, tuple[float, str]] = {
+    "mass": (100.0, "100g"),
+    "volume": (100.0, "100ml"),
+    "count": (1.0, "1個"),
+}
+
+_SYMBOLS: dict[Dimension, str] = {"mass": "g", "volume": "ml", "count": "個"}
+
+_UNIT_ALTERNATION = "|".join(
+    re.escape(u) for u in sorted([*_MEASURES, *(normalize_text(c) for c in _COUNTERS)], key=len, reverse=True)
+)
+# e-Stat の単位（数字は省略されることがある。"パック(10個)" など）
+_UNIT_RE = re.compile(rf"(\d+(?:\.\d+)?)?\s*({_UNIT_ALTERNATION})", re.IGNORECASE)
+# レシートの品目名に含まれる内容量・個数（数字が必須。"190g", "3コ", "10コ入"）
+_SIZE_RE = re.compile(rf"(?<![\d./])(\d+(?:\.\d+)?)\s*({_UNIT_ALTERNATION})", re.IGNORECASE)
+_PAREN_RE = re.compile(r"^([^(]*)\(([^)]*)\)")
+# 内容量の直後の掛け数（"60g×3", "500ml*2"）
+_TIMES_RE = re.compile(r"\s*[×xX*]\s*(\d+)(?![\d.])")
+
+
+@dataclass(frozen=True, slots=True)
+class Quantity:
+    amount: float  # 基準単位（g / ml / 個）での量
+    dimension: Dimension
+
+    def label(self) -> str:
+        return f"{self.amount:g}{_SYMBOLS[self.dimension]}"
+
+
+def _quantity(number: str | None, unit: str) -> Quantity:
+    amount = float(number) if number else 1.0
+    measure = _MEASURES.get(unit.lower())
+    if measure is None:
+        return Quantity(amount, "count")
+    dimension, scale = measure
+    return Quantity(amount * scale, dimension)
+
+
+def _first_quantity(text: str) -> Quantity | None:
+    m = _UNIT_RE.search(text)
+    return _quantity(m.group(1), m.group(2)) if m else None
+
+
+@lru_cache(maxsize=1024)
+def parse_unit(unit: str) -> Quantity | None:
+    """
+    e-Stat の単位を量と次元に分解します（解析できなければ None）。
+    括弧内に中身の量があればそれを使い、外側の個数を掛けます（"1パック(10個)" -> 10個、
+    "1本(1000ml)" -> 1000ml、"1袋(5kg)" -> 5000g）。
+    """
+    text = normalize_text(unit)
+    m = _PAREN_RE.match(text)
+    if m:
+        outer = _first_quantity(m.group(1))
+        inner = _first_quantity(m.group(2))
+        if inner is not None and (outer is None or outer.dimension == "count"):
+            return Quantity(inner.amount * (outer.amount if outer else 1.0), inner.dimension)
+        if outer is not None:
+            return outer
+    return _first_quantity(text)
+
+
+def parse_size(name: str) -> Quantity | None:
+    """
+    レシートの品目名に書かれた購入量を返します（"サバ水煮缶 190g" -> 190g。無ければ None）。
+    内容量と個数・掛け数は掛け合わせます（"ビール 350ml 6缶" -> 2100ml、"60g×3" -> 180g）。
+    内容量や個数が2つ以上あって決められない場合も None です。
+    """
+    text = normalize_text(name)
+    matches = list(_SIZE_RE.finditer(text))
+    if not matches:
+        return None
+    quantities = [_quantity(m.group(1), m.group(2)) for m in matches]
+    measures = [q for q in quantities if q.dimension != "count"]
+    counts = [q for q in quantities if q.dimension == "count"]
+    if len(measures) > 1 or len(counts) > 1:
+        return None
+
+    starts = {m.start() for m in matches}
+    multiplier = 1.0
+    for m in matches:
+        times = _TIMES_RE.match(text, m.end())
+        # "60g×3袋" の "3袋" は個数として数えているので、掛け数にはしない
+        if times and times.start(1) not in starts:
+            multiplier *= float(times.group(1))
+
+    if measures:
+        base = measures[0]
+        amount = base.amount * (counts[0].amount if counts else 1.0)
+    else:
+        base = counts[0]
+        amount = base.amount
+    return Quantity(amount * multiplier, base.dimension)
+
+
+@lru_cache(maxsize=4096)
+def piece_weight(name: str) -> float | None:
+    """canonical または e-Stat の品目名から、1個あたりの標準重量（g）を返します。"""
+    text = normalize_text(name)
+    weight = PIECE_WEIGHTS.get(text)
+    if weight is None and "(" in text:
+        # 銘柄・規格付きの品目名（"りんご(ふじ)"）
+        weight = PIECE_WEIGHTS.get(text.split("(", 1)[0])
+    return float(weight) if weight is not None else None
+
+
+def convert(amount: float, source: Quantity, target: Quantity, piece_grams: float | None) -> float | None:
+    """
+    source の量あたり amount 円の価格を、target の量あたりの価格に換算します。
+    重さと個数の間は piece_grams（1個あたりの重さ）で換算し、換算できなければ None を返します。
+    """
+    if source.amount <= 0:
+        return None
+    if source.dimension == target.dimension:
+        return amount / source.amount * target.amount
+    if piece_grams and {source.dimension, target.dimension} == {"mass", "count"}:
+        per_gram = amount / (source.amount if source.dimension == "mass" else source.amount * piece_grams)
+        return per_gram * (target.amount if target.dimension == "mass" else target.amount * piece_grams)
+    return None
+
+
+def base_price(item: MarketItem) -> tuple[float, str] | None:
+    """市場価格を基準単位あたりの価格に換算します（(価格, "100g") など。単位を解析できなければ None）。"""
+    quantity = parse_unit(str(item.get("unit", "")))
+    price = float(item.get("price", 0) or 0)
+    if quantity is None or price <= 0:
+        return None
+    base_amount, label = BASE_UNITS[quantity.dimension]
+    converted = convert(price, quantity, Quantity(base_amount, quantity.dimension), None)
+    return (round(converted, 2), label) if converted is not None else None
+
+
+# 市場データ一覧 -> プロンプト用の換算済み一覧（市場データが更新されたら作り直す）
+_annotated_source: list[MarketItem] | None = None
+_annotated: list[MarketItem] = []
+
+
+def annotate_market_data(market_data: list[MarketItem]) -> list[MarketItem]:
+    """
+    各品目に基準単位あたりの価格（base_price / base_unit）と、分かれば1個あたりの標準重量
+    （piece_grams）を加えた一覧を返します。同じ市場データに対しては前回の結果を返します。
+    """
+    global _annotated_source, _annotated
+    if _annotated_source is not market_data:
+        annotated: list[MarketItem] = []
+        for item in market_data:
+            row = dict(item)
+            if (base := base_price(item)) is not None:
+                row["base_price"], row["base_unit"] = base
+            if (grams := piece_weight(str(item.get("item_name", "")))) is not None:
+                row["piece_grams"] = grams
+            annotated.append(row)
+        _annotated, _annotated_source = annotated, market_data
+    return _annotated
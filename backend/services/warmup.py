@@ -0,0 +1,91 @@
+"""
+起動時のウォームアップと準備状態（readiness）
+
+lifespan の開始時にバックグラウンドで、クライアントの生成・市場データ（と分類マップ）の取得・
+商品ルールの正規表現のコンパイルなどを並行して行います。起動（リクエストの受け付け開始）は待たせず、
+終わるまでに来たリクエストは必要なものをその場で用意します。
+
+各段階の所要時間と、プロセスの開始から準備完了までの時間を /health と /metrics
+（app_startup_seconds）に出します。失敗した段階があっても、全段階を試した時点で準備完了とします。
+"""
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from services.metrics import STARTUP_SECONDS
+
+type WarmUpStep = Callable[[], Awaitable[Any]]
+
+
+def _process_started_at() -> float:
+    """このプロセスの開始時刻（UNIX 時刻）。/proc が無い環境ではこのモジュールを読み込んだ時刻。"""
+    try:
+        # /proc/self/stat の22番目の値が、起動からプロセス開始までのクロック数
+        ticks = int(Path("/proc/self/stat").read_text().rsplit(")", 1)[1].split()[19])
+        uptime = float(Path("/proc/uptime").read_text().split()[0])
+        return time.time() - (uptime - ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_STARTED_AT = _process_started_at()
+
+
+@dataclass(slots=True)
+class StepResult:
+    seconds: float
+    ok: bool
+    result: Any = None
+    error: str | None = None
+
+
+class WarmUp:
+    """ウォームアップの各段階の結果と、準備完了の時刻を持ちます。"""
+    def __init__(self) -> None:
+        self.steps: dict[str, StepResult] = {}
+        self.ready_at: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    async def _run_step(self, name: str, step: WarmUpStep) -> None:
+        started = time.perf_counter()
+        try:
+            result = await step()
+            self.steps[name] = StepResult(time.perf_counter() - started, True, result)
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+            self.steps[name] = StepResult(time.perf_counter() - started, False, error=str(e))
+        STARTUP_SECONDS.observe(self.steps[name].seconds, stage=name)
+
+    async def run(self, steps: dict[str, WarmUpStep]) -> None:
+        """各段階を並行して実行し、すべて終わったら準備完了にします。"""
+        await asyncio.gather(*(self._run_step(name, step) for name, step in steps.items()))
+        self.ready_at = time.time()
+        STARTUP_SECONDS.observe(self.ready_at - PROCESS_STARTED_AT, stage="ready")
+        logger.info(f"Ready in {self.ready_at - PROCESS_STARTED_AT:.2f}s since process start")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "seconds_to_ready": round(self.ready_at - PROCESS_STARTED_AT, 3) if self.ready_at else None,
+            "uptime_seconds": round(time.time() - PROCESS_STARTED_AT, 3),
+            "steps": {
+                name: {
+                    "ok": r.ok,
+                    "seconds": round(r.seconds, 3),
+                    **({"result": r.result} if r.result is not None else {}),
+                    **({"error": r.error} if r.error else {}),
+                }
+                for name, r in self.steps.items()
+            },
+        }
+
+
+warmup = WarmUp()
@@ -0,0 +1,322 @@
+"""
+書き込みの遅延・一括化（write-behind）
+
+レコードをメモリ上のバッファに積んで即座に戻り、件数（batch_size）か時間（flush_interval）の
+どちらかに達したら、まとめて1回のデータベース呼び出しで挿入します。
+応答の経路からデータベースの往復がなくなり、挿入は1往復あたり最大 batch_size 件になります。
+
+- 積んだレコードはワーカーごとのスプールファイル（JSON Lines）にも追記し、挿入できたら取り除く。
+  プロセスが落ちても、次に起動したいずれかのワーカーが残ったファイルを引き取って挿入し直す
+- 失敗した一括挿入は指数バックオフで再試行する。挿入は id の重複を無視して行う前提のため、
+  挿入の成功後・スプールの更新前に落ちて同じレコードを挿入し直しても二重にはならない
+- レコードの中身の問題（4xx や SQLSTATE 22xxx / 23xxx の APIError）で一括挿入が失敗した場合は
+  1件ずつ挿入し直し、失敗したものだけ捨てる。接続・タイムアウトなどそれ以外の失敗は捨てずに再試行する
+- 停止時（drain）は、残りを挿入し終えるまで最大 timeout 秒待つ。挿入できなかった分はファイルに残る
+
+スプールファイルは flock で排他し、ロックを取れたファイル（持ち主のプロセスが終了済み）だけを引き取ります。
+"""
+import asyncio
+import fcntl
+import json
+import os
+import secrets
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from postgrest import APIError
+from services.metrics import WRITE_BEHIND_FLUSH_SECONDS, WRITE_BEHIND_RECORDS_TOTAL
+
+type InsertBatch = Callable[[list[dict[str, Any]]], Awaitable[None]]
+
+# 一括挿入の再試行間隔（失敗が続くたびに倍、上限あり）
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+# 4xx でもレコードの問題ではない（認証・タイムアウト・流量制限）ため、捨てずに再試行するステータス
+_RETRYABLE_STATUSES = frozenset({401, 403, 408, 429})
+
+# これより長く更新されていない一時ファイル（.*.tmp）は、作成途中で落ちたワーカーのものとして消す
+STALE_TMP_SECONDS = 60.0
+
+
+class WriteBehindBuffer:
+    """
+    レコードを積んでおき、まとめて insert(records) を呼ぶバッファ。
+    start() でスプールの引き取りと定期的な書き出しを始め、drain() で止めます。
+    """
+    def __init__(
+        self,
+        name: str,
+        insert: InsertBatch,
+        *,
+        batch_size: int,
+        flush_interval: float,
+        spill_dir: str | Path,
+    ) -> None:
+        self.name = name
+        self._insert = insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = Path(spill_dir)
+        self._pending: list[dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._spill_fd: int | None = None
+        self._spill_path: Path | None = None
+        self._failures = 0
+        self.last_error: str | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    # -----------------------------------------------------------------
+    # スプールファイル
+    # -----------------------------------------------------------------
+
+    def _new_spill_file(self, records: list[dict[str, Any]]) -> tuple[int, Path]:
+        """
+        records を書いた自分用のスプールファイルを作り、ロックした状態で返します。
+        ロックしてから正式な名前に変えるため、他のワーカーに作成途中のファイルを引き取られることはありません。
+        """
+        path = self._spill_path or self.spill_dir / f"{self.name}-{os.getpid()}-{secrets.token_hex(4)}.jsonl"
+        tmp = path.with_name(f".{path.name}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if records:
+                os.write(fd, _encode_lines(records))
+            os.replace(tmp, path)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd, path
+
+    def _append_spill(self, records: list[dict[str, Any]]) -> None:
+        if self._spill_fd is None:
+            return
+        try:
+            os.write(self._spill_fd, _encode_lines(records))
+        except OSError as e:
+            # ディスクの問題でもメモリ上には残っているため、受け付けは止めない
+            logger.warning(f"Failed to spill {self.name} records: {e}")
+
+    def _compact_spill(self) -> None:
+        """挿入できたレコードを除いた内容でスプールファイルを作り直します。"""
+        if self._spill_fd is None:
+            return
+        try:
+            fd, path = self._new_spill_file(self._pending)
+        except OSError as e:
+            logger.warning(f"Failed to compact {self.name} spill file: {e}")
+            return
+        os.close(self._spill_fd)
+        self._spill_fd, self._spill_path = fd, path
+
+    @staticmethod
+    def _lock_orphaned(path: Path) -> int | None:
+        """
+        持ち主のプロセスが終了したファイルなら、ロックして開いた fd を返します（稼働中・消えていれば None）。
+        開いた直後に持ち主が作り直し（os.replace）をすると、古い inode のロックが取れてしまうため、
+        ロック後にその名前がまだ同じ inode を指しているかを確かめます。
+        """
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                raise FileNotFoundError(path)
+        except (BlockingIOError, FileNotFoundError):
+            os.close(fd)
+            return None
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def _recover_spill_files(self) -> list[dict[str, Any]]:
+        """持ち主のプロセスが終了したスプールファイルを読み込み、削除します。"""
+        # 作り直しの途中で落ちたワーカーの一時ファイル。中身は元のファイルにも残っているので消すだけでよい
+        # （作成中のものに触れないよう、しばらく更新されていないものに限る）
+        for tmp in self.spill_dir.glob(f".{self.name}-*.jsonl.tmp"):
+            try:
+                if time.time() - tmp.stat().st_mtime < STALE_TMP_SECONDS:
+                    continue
+            except FileNotFoundError:
+                continue
+            fd = self._lock_orphaned(tmp)
+            if fd is not None:
+                try:
+                    tmp.unlink(missing_ok=True)
+                finally:
+                    os.close(fd)
+
+        records: list[dict[str, Any]] = []
+        for path in sorted(self.spill_dir.glob(f"{self.name}-*.jsonl")):
+            if path == self._spill_path:
+                continue
+            fd = self._lock_orphaned(path)
+            if fd is None:
+                continue  # 稼働中のワーカーのファイル
+            try:
+                with os.fdopen(os.dup(fd), "rb") as f:
+                    data = f.read()
+                recovered = _decode_lines(data, path)
+                # 引き取った分を自分のファイルへ書いてから削除する（途中で落ちても失われない）
+                self._append_spill(recovered)
+                records.extend(recovered)
+                path.unlink(missing_ok=True)
+            finally:
+                os.close(fd)
+        return records
+
+    # -----------------------------------------------------------------
+    # 受け付けと書き出し
+    # -----------------------------------------------------------------
+
+    def enqueue(self, record: dict[str, Any]) -> None:
+        """レコードを積みます（データベースは呼びません）。"""
+        self._pending.append(record)
+        self._append_spill([record])
+        WRITE_BEHIND_RECORDS_TOTAL.inc(buffer=self.name, result="enqueued")
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """スプールファイルを用意し、残っていたレコードを引き取って、定期的な書き出しを始めます。"""
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._spill_fd, self._spill_path = self._new_spill_file(self._pending)
+        recovered = self._recover_spill_files()
+        if recovered:
+            self._pending[:0] = recovered
+            WRITE_BEHIND_RECORDS_TOTAL.inc(len(recovered), buffer=self.name, result="recovered")
+            logger.info(f"Recovered {len(recovered)} {self.name} records from spill files")
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            self._wakeup.clear()
+            if not await self.flush():
+                await asyncio.sleep(self._retry_delay())
+
+    def _retry_delay(self) -> float:
+        return min(RETRY_BASE_SECONDS * 2 ** max(self._failures - 1, 0), RETRY_MAX_SECONDS)
+
+    async def flush(self) -> bool:
+        """積まれているレコードを batch_size 件ずつ挿入します。途中で失敗したら False を返します。"""
+        flushed = False
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            if not await self._flush_batch(batch):
+                break
+            # 挿入中に積まれたレコードは末尾に追加されるため、先頭の batch 分だけを取り除く
+            del self._pending[:len(batch)]
+            flushed = True
+        if flushed:
+            self._compact_spill()
+        return not self._pending
+
+    async def _flush_batch(self, batch: list[dict[str, Any]]) -> bool:
+        started = time.perf_counter()
+        try:
+            try:
+                await self._insert(batch)
+            except APIError as e:
+                if not _is_data_error(e):
+                    raise
+                logger.warning(f"{self.name} batch insert rejected, retrying one by one: {e}")
+                await self._insert_one_by_one(batch)
+        except Exception as e:
+            self._failures += 1
+            self.last_error = str(e)
+            WRITE_BEHIND_FLUSH_SECONDS.observe(time.perf_counter() - started, buffer=self.name, outcome="error")
+            logger.warning(f"Failed to flush {len(batch)} {self.name} records (attempt {self._failures}): {e}")
+            return False
+
+        self._failures = 0
+        WRITE_BEHIND_FLUSH_SECONDS.observe(time.perf_counter() - started, buffer=self.name, outcome="ok")
+        WRITE_BEHIND_RECORDS_TOTAL.inc(len(batch), buffer=self.name, result="flushed")
+        return True
+
+    async def _insert_one_by_one(self, batch: list[dict[str, Any]]) -> None:
+        for record in batch:
+            try:
+                await self._insert([record])
+            except APIError as e:
+                # 途中で接続などが失敗したら、一括挿入の失敗として全体を再試行する（挿入済みの分は重複が無視される）
+                if not _is_data_error(e):
+                    raise
+                WRITE_BEHIND_RECORDS_TOTAL.inc(buffer=self.name, result="dropped")
+                logger.error(f"Dropped {self.name} record {record}: {e}")
+
+    async def drain(self, timeout: float) -> None:
+        """定期的な書き出しを止め、残りのレコードを最大 timeout 秒かけて挿入します。"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        deadline = time.monotonic() + timeout
+        while not await self.flush():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                logger.warning(f"{len(self._pending)} {self.name} records left in {self._spill_path}")
+                break
+            await asyncio.sleep(min(self._retry_delay(), left))
+
+        if self._spill_fd is not None:
+            os.close(self._spill_fd)
+            self._spill_fd = None
+            if not self._pending and self._spill_path is not None:
+                self._spill_path.unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "consecutive_failures": self._failures,
+            "last_error": self.last_error,
+        }
+
+
+def _is_data_error(error: APIError) -> bool:
+    """
+    挿入したレコード自体が原因のエラー（再試行しても成功しない）なら True を返します。
+    SQLSTATE のクラス 22（データ例外）・23（制約違反）、PostgREST のリクエストエラー（PGRST1xx）、
+    応答を解析できなかった場合の 4xx ステータスが該当します。
+    PGRST000 番台（接続・プールの枯渇）やタイムアウト、5xx などは False です。
+    """
+    code = str(error.code or "")
+    if code.startswith("PGRST"):
+        return code.startswith("PGRST1")
+    if len(code) == 5:
+        return code[:2] in ("22", "23")
+    if code.isdigit():
+        status = int(code)
+        return 400 <= status < 500 and status not in _RETRYABLE_STATUSES
+    return False
+
+
+def _encode_lines(records: list[dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records).encode()
+
+
+def _decode_lines(data: bytes, path: Path) -> list[dict[str, Any]]:
+    records = []
+    for line in data.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # 書き込み途中で落ちた最後の行など
+            logger.warning(f"Skipped a broken line in {path}")
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records
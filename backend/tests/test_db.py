@@ -0,0 +1,49 @@
+"""
+execute_raw が頼っている postgrest-py のクエリビルダーの属性（db/db.py の _send_raw）
+
+RequestConfig は postgrest-py の公開 API ではないため、更新で属性がなくなったらここで気づけるようにします。
+"""
+import httpx
+import pytest
+from postgrest import APIError, SyncPostgrestClient
+
+from db.db import _send_raw
+
+
+def _query(handler):
+    client = SyncPostgrestClient("http://db.test/rest/v1", headers={"apikey": "key"})
+    query = client.from_("receipts").select("id, created_at").eq("user_id", "u1").limit(2)
+    query.request.session = httpx.Client(transport=httpx.MockTransport(handler))
+    return query
+
+
+def test_request_config_attributes():
+    config = _query(lambda request: httpx.Response(200)).request
+    for name in ("session", "path", "params", "headers", "auth"):
+        assert hasattr(config, name), name
+    assert isinstance(config.session, httpx.Client)
+
+
+def test_send_raw_returns_body_as_is():
+    seen: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, content=b'[{"id":"r1"}]')
+
+    assert _send_raw(_query(handler)) == b'[{"id":"r1"}]'
+    (request,) = seen
+    assert request.method == "GET"
+    assert request.url.path == "/rest/v1/receipts"
+    assert request.url.params["user_id"] == "eq.u1"
+    assert request.url.params["limit"] == "2"
+    assert request.headers["apikey"] == "key"
+
+
+def test_send_raw_raises_api_error():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, json={"code": "22P02", "message": "invalid input syntax"})
+
+    with pytest.raises(APIError) as e:
+        _send_raw(_query(handler))
+    assert e.value.code == "22P02"
@@ -0,0 +1,52 @@
+"""
+文字列正規化（normalize_text / simplify_key / fold_key）のゴールデン出力
+
+正規化の結果が変わると、保存済みの名寄せ結果や e-Stat の品目名との照合がずれるため、
+変換テーブルやキャッシュの実装を変えても出力が変わらないことを確認します。
+"""
+import pytest
+from schemas import fold_key, normalize_text, simplify_key
+from schemas.normalize import normalize_uncached
+
+# (入力, normalize_text, simplify_key, fold_key)
+# 長音「ー」は "-" に置換された後、simplify_key で除去される（既存の挙動を維持）
+GOLDEN_CASES: list[tuple[str, str, str, str]] = [
+    ("ｷｬﾍﾞﾂ　１玉", "キャベツ 1玉", "キャベツ1玉", "キャベツ1玉"),
+    ("玉ねぎ（国産）3個", "玉ねぎ(国産)3個", "玉ねぎ国産3個", "玉ねぎ国産3個"),
+    ("食パン【6枚切】", "食パン【6枚切】", "食パン6枚切", "食パン6枚切"),
+    ("ＭＩＬＫ　１０００ｍｌ", "MILK 1000ml", "MILK1000ml", "milk1000ml"),
+    ("￥１，２８０", "¥1,280", "¥1280", "¥1280"),
+    ("  豚バラ   スライス  ", "豚バラ スライス", "豚バラスライス", "豚バラスライス"),
+    ("カップラーメン・しょうゆ", "カップラ-メン・しょうゆ", "カップラメンしょうゆ", "カップラメンしょうゆ"),
+    ("サバ水煮／缶 190g", "サバ水煮/缶 190g", "サバ水煮缶190g", "サバ水煮缶190g"),
+    ("バター", "バタ-", "バタ", "バタ"),
+    ("Apple\\ 198", "Apple¥ 198", "Apple¥198", "apple¥198"),
+    ("「特売」たまご10コ入", "「特売」たまご10コ入", "特売たまご10コ入", "特売たまご10コ入"),
+    ("ﾃｨｯｼｭ 5ｺ-ﾊﾟｯｸ", "ティッシュ 5コ-パック", "ティッシュ5コパック", "ティッシュ5コパック"),
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_caches() -> None:
+    normalize_text.cache_clear()
+    simplify_key.cache_clear()
+    fold_key.cache_clear()
+
+
+@pytest.mark.parametrize(("raw", "normalized", "simplified", "folded"), GOLDEN_CASES)
+def test_golden(raw: str, normalized: str, simplified: str, folded: str) -> None:
+    assert normalize_text(raw) == normalized
+    assert simplify_key(raw) == simplified
+    assert fold_key(raw) == folded
+
+
+@pytest.mark.parametrize(("raw", "normalized"), [(raw, normalized) for raw, normalized, *_ in GOLDEN_CASES])
+def test_uncached_matches_cached(raw: str, normalized: str) -> None:
+    assert normalize_uncached(raw) == normalized
+
+
+def test_cached_results_are_stable() -> None:
+    # 2回目はキャッシュから返る。結果は1回目と同じ
+    first = [fold_key(raw) for raw, *_ in GOLDEN_CASES]
+    assert [fold_key(raw) for raw, *_ in GOLDEN_CASES] == first
+    assert fold_key.cache_info().hits >= len(GOLDEN_CASES)
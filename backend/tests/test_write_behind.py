@@ -0,0 +1,66 @@
+"""
+write-behind バッファの一括挿入の失敗時の扱い（services/write_behind.py）
+
+レコードの中身が原因のエラーではそのレコードだけを捨て、接続などの失敗では捨てずに再試行します。
+"""
+import asyncio
+from typing import Any
+
+import pytest
+from postgrest import APIError
+
+from services.write_behind import WriteBehindBuffer
+
+
+def _buffer(tmp_path, insert) -> WriteBehindBuffer:
+    return WriteBehindBuffer("test", insert, batch_size=10, flush_interval=60, spill_dir=tmp_path)
+
+
+@pytest.mark.parametrize("code", ["23505", "22P02", "PGRST102", 400])
+def test_data_error_drops_only_bad_record(tmp_path, code):
+    inserted: list[dict[str, Any]] = []
+
+    async def insert(records: list[dict[str, Any]]) -> None:
+        if any(r["bad"] for r in records):
+            raise APIError({"code": code, "message": "rejected"})
+        inserted.extend(records)
+
+    buffer = _buffer(tmp_path, insert)
+    for i in range(3):
+        buffer.enqueue({"id": i, "bad": i == 1})
+
+    assert asyncio.run(buffer.flush())
+    assert [r["id"] for r in inserted] == [0, 2]
+    assert len(buffer) == 0
+
+
+@pytest.mark.parametrize("code", ["PGRST000", "PGRST003", "57014", "53300", 401, 503, None])
+def test_other_errors_keep_batch_pending(tmp_path, code):
+    async def insert(records: list[dict[str, Any]]) -> None:
+        raise APIError({"code": code, "message": "unavailable"})
+
+    buffer = _buffer(tmp_path, insert)
+    for i in range(3):
+        buffer.enqueue({"id": i})
+
+    assert not asyncio.run(buffer.flush())
+    assert len(buffer) == 3
+    assert buffer.stats()["consecutive_failures"] == 1
+
+
+def test_failure_while_retrying_one_by_one_keeps_batch_pending(tmp_path):
+    calls = 0
+
+    async def insert(records: list[dict[str, Any]]) -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise APIError({"code": "23502", "message": "null value"})
+        raise APIError({"code": "PGRST000", "message": "connection lost"})
+
+    buffer = _buffer(tmp_path, insert)
+    for i in range(3):
+        buffer.enqueue({"id": i})
+
+    assert not asyncio.run(buffer.flush())
+    assert len(buffer) == 3
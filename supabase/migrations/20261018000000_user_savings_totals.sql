@@ -0,0 +1,131 @@
+-- ユーザーごとの節約額合計（ランキング用）
+-- savings_records への INSERT / UPDATE / DELETE をトリガーで反映し、
+-- /ranking が履歴件数に関係なく上位N名と自分の順位だけを取得できるようにする
+CREATE TABLE IF NOT EXISTS user_savings_totals (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    total_saved BIGINT NOT NULL DEFAULT 0,
+    total_overpaid BIGINT NOT NULL DEFAULT 0,
+    -- 純節約額 = 節約額 - 過払い額
+    net_saved BIGINT NOT NULL DEFAULT 0,
+    record_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 同額の場合は user_id 順で順位を確定させる
+CREATE INDEX IF NOT EXISTS idx_user_savings_totals_net
+ON user_savings_totals (net_saved DESC, user_id);
+
+ALTER TABLE user_savings_totals ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Everyone can read totals for ranking" ON user_savings_totals
+    FOR SELECT USING (true);
+
+-- 1ユーザー分の合計に差分を加算する（件数が0になった行は削除）
+CREATE OR REPLACE FUNCTION public.apply_savings_delta(
+    p_user_id UUID,
+    p_saved BIGINT,
+    p_overpaid BIGINT,
+    p_count INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO public.user_savings_totals AS t
+        (user_id, total_saved, total_overpaid, net_saved, record_count)
+    VALUES (p_user_id, p_saved, p_overpaid, p_saved - p_overpaid, p_count)
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_saved = t.total_saved + EXCLUDED.total_saved,
+        total_overpaid = t.total_overpaid + EXCLUDED.total_overpaid,
+        net_saved = t.net_saved + EXCLUDED.net_saved,
+        record_count = t.record_count + EXCLUDED.record_count,
+        updated_at = NOW();
+
+    DELETE FROM public.user_savings_totals
+    WHERE user_id = p_user_id AND record_count <= 0;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- トリガーからだけ使う。所有者の権限で書き込むため、PostgREST（/rpc）から直接呼べないようにする
+REVOKE EXECUTE ON FUNCTION public.apply_savings_delta(UUID, BIGINT, BIGINT, INTEGER) FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION public.sync_user_savings_totals()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.apply_savings_delta(
+            OLD.user_id, -OLD.total_saved_amount, -OLD.total_overpaid_amount, -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM public.apply_savings_delta(
+            NEW.user_id, NEW.total_saved_amount, NEW.total_overpaid_amount, 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.sync_user_savings_totals() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS trigger_sync_user_savings_totals ON savings_records;
+CREATE TRIGGER trigger_sync_user_savings_totals
+    AFTER INSERT OR UPDATE OF user_id, total_saved_amount, total_overpaid_amount OR DELETE
+    ON savings_records
+    FOR EACH ROW EXECUTE FUNCTION public.sync_user_savings_totals();
+
+-- 既存の履歴から初期値を作成
+INSERT INTO user_savings_totals (user_id, total_saved, total_overpaid, net_saved, record_count)
+SELECT
+    user_id,
+    SUM(total_saved_amount),
+    SUM(total_overpaid_amount),
+    SUM(total_saved_amount - total_overpaid_amount),
+    COUNT(*)
+FROM savings_records
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET
+    total_saved = EXCLUDED.total_saved,
+    total_overpaid = EXCLUDED.total_overpaid,
+    net_saved = EXCLUDED.net_saved,
+    record_count = EXCLUDED.record_count,
+    updated_at = NOW();
+
+-- 上位 p_limit 名（is_me = false）と、呼び出しユーザー自身の行（is_me = true）を返す
+-- 自分の順位は「自分より上にいるユーザー数 + 1」をインデックスで数える
+CREATE OR REPLACE FUNCTION public.get_ranking(p_user_id UUID, p_limit INTEGER DEFAULT 10)
+RETURNS TABLE (
+    rank BIGINT,
+    user_id UUID,
+    nickname VARCHAR,
+    total_saved BIGINT,
+    total_overpaid BIGINT,
+    is_me BOOLEAN
+) AS $$
+    WITH top AS (
+        SELECT t.user_id, t.net_saved, t.total_overpaid
+        FROM public.user_savings_totals t
+        ORDER BY t.net_saved DESC, t.user_id
+        LIMIT GREATEST(p_limit, 0)
+    ),
+    me AS (
+        SELECT t.user_id, t.net_saved, t.total_overpaid
+        FROM public.user_savings_totals t
+        WHERE t.user_id = p_user_id
+    )
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY top.net_saved DESC, top.user_id),
+        top.user_id, p.nickname, top.net_saved, top.total_overpaid, FALSE
+    FROM top
+    LEFT JOIN public.profiles p ON p.id = top.user_id
+    UNION ALL
+    SELECT
+        (
+            SELECT COUNT(*) + 1
+            FROM public.user_savings_totals o
+            WHERE o.net_saved > me.net_saved
+               OR (o.net_saved = me.net_saved AND o.user_id < me.user_id)
+        ),
+        me.user_id, p.nickname, me.net_saved, me.total_overpaid, TRUE
+    FROM me
+    LEFT JOIN public.profiles p ON p.id = me.user_id
+    ORDER BY 6, 1;
+$$ LANGUAGE sql STABLE;
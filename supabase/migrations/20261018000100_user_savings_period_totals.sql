@@ -0,0 +1,182 @@
+-- 週間・月間ランキング用の期間別集計
+-- savings_records の purchase_date が属する週（月曜始まり）・月ごとに、ユーザー別の合計を保持する
+-- 期間の読み出しは (period, period_start) で絞った範囲をインデックス順に読むだけで、通算と同じコストになる
+CREATE TABLE IF NOT EXISTS user_savings_period_totals (
+    period TEXT NOT NULL CHECK (period IN ('week', 'month')),
+    period_start DATE NOT NULL,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    total_saved BIGINT NOT NULL DEFAULT 0,
+    total_overpaid BIGINT NOT NULL DEFAULT 0,
+    net_saved BIGINT NOT NULL DEFAULT 0,
+    record_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (period, period_start, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_savings_period_totals_net
+ON user_savings_period_totals (period, period_start, net_saved DESC, user_id);
+
+ALTER TABLE user_savings_period_totals ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Everyone can read period totals for ranking" ON user_savings_period_totals
+    FOR SELECT USING (true);
+
+-- 1ユーザー・1期間分の合計に差分を加算する（件数が0になった行は削除）
+CREATE OR REPLACE FUNCTION public.apply_period_savings_delta(
+    p_user_id UUID,
+    p_purchase_date DATE,
+    p_saved BIGINT,
+    p_overpaid BIGINT,
+    p_count INTEGER
+)
+RETURNS VOID AS $$
+DECLARE
+    v_period TEXT;
+    v_start DATE;
+BEGIN
+    FOREACH v_period IN ARRAY ARRAY['week', 'month'] LOOP
+        v_start := date_trunc(v_period, p_purchase_date)::DATE;
+
+        INSERT INTO public.user_savings_period_totals AS t
+            (period, period_start, user_id, total_saved, total_overpaid, net_saved, record_count)
+        VALUES (v_period, v_start, p_user_id, p_saved, p_overpaid, p_saved - p_overpaid, p_count)
+        ON CONFLICT (period, period_start, user_id) DO UPDATE SET
+            total_saved = t.total_saved + EXCLUDED.total_saved,
+            total_overpaid = t.total_overpaid + EXCLUDED.total_overpaid,
+            net_saved = t.net_saved + EXCLUDED.net_saved,
+            record_count = t.record_count + EXCLUDED.record_count,
+            updated_at = NOW();
+
+        DELETE FROM public.user_savings_period_totals
+        WHERE period = v_period AND period_start = v_start AND user_id = p_user_id AND record_count <= 0;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- トリガーからだけ使う。所有者の権限で書き込むため、PostgREST（/rpc）から直接呼べないようにする
+REVOKE EXECUTE ON FUNCTION public.apply_period_savings_delta(UUID, DATE, BIGINT, BIGINT, INTEGER)
+    FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION public.sync_user_savings_period_totals()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.apply_period_savings_delta(
+            OLD.user_id, OLD.purchase_date, -OLD.total_saved_amount, -OLD.total_overpaid_amount, -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM public.apply_period_savings_delta(
+            NEW.user_id, NEW.purchase_date, NEW.total_saved_amount, NEW.total_overpaid_amount, 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.sync_user_savings_period_totals() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS trigger_sync_user_savings_period_totals ON savings_records;
+CREATE TRIGGER trigger_sync_user_savings_period_totals
+    AFTER INSERT OR UPDATE OF user_id, purchase_date, total_saved_amount, total_overpaid_amount OR DELETE
+    ON savings_records
+    FOR EACH ROW EXECUTE FUNCTION public.sync_user_savings_period_totals();
+
+-- 既存の履歴から初期値を作成
+INSERT INTO user_savings_period_totals
+    (period, period_start, user_id, total_saved, total_overpaid, net_saved, record_count)
+SELECT
+    p.period,
+    date_trunc(p.period, s.purchase_date)::DATE,
+    s.user_id,
+    SUM(s.total_saved_amount),
+    SUM(s.total_overpaid_amount),
+    SUM(s.total_saved_amount - s.total_overpaid_amount),
+    COUNT(*)
+FROM savings_records s
+CROSS JOIN (VALUES ('week'), ('month')) AS p(period)
+GROUP BY p.period, date_trunc(p.period, s.purchase_date)::DATE, s.user_id
+ON CONFLICT (period, period_start, user_id) DO UPDATE SET
+    total_saved = EXCLUDED.total_saved,
+    total_overpaid = EXCLUDED.total_overpaid,
+    net_saved = EXCLUDED.net_saved,
+    record_count = EXCLUDED.record_count,
+    updated_at = NOW();
+
+-- get_ranking の期間版。p_period_start はアプリ側（日本時間）で決めた期間の開始日
+CREATE OR REPLACE FUNCTION public.get_period_ranking(
+    p_user_id UUID,
+    p_period TEXT,
+    p_period_start DATE,
+    p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE (
+    rank BIGINT,
+    user_id UUID,
+    nickname VARCHAR,
+    total_saved BIGINT,
+    total_overpaid BIGINT,
+    is_me BOOLEAN
+) AS $$
+    WITH totals AS (
+        SELECT t.user_id, t.net_saved, t.total_overpaid
+        FROM public.user_savings_period_totals t
+        WHERE t.period = p_period AND t.period_start = p_period_start
+    ),
+    top AS (
+        SELECT * FROM totals
+        ORDER BY net_saved DESC, user_id
+        LIMIT GREATEST(p_limit, 0)
+    ),
+    me AS (
+        SELECT * FROM totals WHERE totals.user_id = p_user_id
+    )
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY top.net_saved DESC, top.user_id),
+        top.user_id, p.nickname, top.net_saved, top.total_overpaid, FALSE
+    FROM top
+    LEFT JOIN public.profiles p ON p.id = top.user_id
+    UNION ALL
+    SELECT
+        (
+            SELECT COUNT(*) + 1
+            FROM totals o
+            WHERE o.net_saved > me.net_saved
+               OR (o.net_saved = me.net_saved AND o.user_id < me.user_id)
+        ),
+        me.user_id, p.nickname, me.net_saved, me.total_overpaid, TRUE
+    FROM me
+    LEFT JOIN public.profiles p ON p.id = me.user_id
+    ORDER BY 6, 1;
+$$ LANGUAGE sql STABLE;
+
+-- 古い期間の集計を削除する（期間の開始日でインデックスの範囲削除になる）
+-- pg_cron を使う場合の例:
+--   SELECT cron.schedule('expire-savings-period-totals', '30 4 * * *',
+--     $$SELECT public.expire_savings_period_totals()$$);
+CREATE OR REPLACE FUNCTION public.expire_savings_period_totals(
+    p_keep_weeks INTEGER DEFAULT 8,
+    p_keep_months INTEGER DEFAULT 13
+)
+RETURNS BIGINT AS $$
+DECLARE
+    v_today DATE := (NOW() AT TIME ZONE 'Asia/Tokyo')::DATE;
+    v_weeks BIGINT;
+    v_months BIGINT;
+BEGIN
+    DELETE FROM public.user_savings_period_totals
+    WHERE period = 'week'
+      AND period_start < date_trunc('week', v_today)::DATE - p_keep_weeks * 7;
+    GET DIAGNOSTICS v_weeks = ROW_COUNT;
+
+    DELETE FROM public.user_savings_period_totals
+    WHERE period = 'month'
+      AND period_start < (date_trunc('month', v_today) - make_interval(months => p_keep_months))::DATE;
+    GET DIAGNOSTICS v_months = ROW_COUNT;
+
+    RETURN v_weeks + v_months;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 定期実行（service role / pg_cron）からだけ呼ぶ
+REVOKE EXECUTE ON FUNCTION public.expire_savings_period_totals(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
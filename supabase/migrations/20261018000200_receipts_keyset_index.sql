@@ -0,0 +1,4 @@
+-- レシート履歴のキーセット・ページネーション用
+-- user_id で絞り (created_at, id) の降順に読むため、ページの位置に関係なく読む行数はページサイズ分だけになる
+CREATE INDEX IF NOT EXISTS idx_receipts_user_created_id
+ON receipts (user_id, created_at DESC, id DESC);
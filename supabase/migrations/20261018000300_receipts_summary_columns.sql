@@ -0,0 +1,28 @@
+-- レシートの集計値を型付きの列として保持する（result JSONB を解析せずに一覧・集計できるように）
+-- 値はアプリ側（create_receipt / update_receipt）が result から計算して書き込む
+ALTER TABLE receipts
+    ADD COLUMN IF NOT EXISTS total_payment NUMERIC(12, 2),
+    ADD COLUMN IF NOT EXISTS total_saved NUMERIC(12, 2),
+    ADD COLUMN IF NOT EXISTS total_overpaid NUMERIC(12, 2),
+    ADD COLUMN IF NOT EXISTS item_count INTEGER;
+
+-- 既存行の値を result から埋める（数値でない値と、NUMERIC(12, 2) に収まらない金額は NULL のまま）
+UPDATE receipts SET
+    total_payment = CASE WHEN jsonb_typeof(result->'summary'->'total_payment') = 'number' THEN
+        CASE WHEN abs(round((result->'summary'->>'total_payment')::NUMERIC, 2)) <= 9999999999.99
+            THEN round((result->'summary'->>'total_payment')::NUMERIC, 2) END
+    END,
+    total_saved = CASE WHEN jsonb_typeof(result->'summary'->'total_saved_amount') = 'number' THEN
+        CASE WHEN abs(round((result->'summary'->>'total_saved_amount')::NUMERIC, 2)) <= 9999999999.99
+            THEN round((result->'summary'->>'total_saved_amount')::NUMERIC, 2) END
+    END,
+    total_overpaid = CASE WHEN jsonb_typeof(result->'summary'->'total_overpaid_amount') = 'number' THEN
+        CASE WHEN abs(round((result->'summary'->>'total_overpaid_amount')::NUMERIC, 2)) <= 9999999999.99
+            THEN round((result->'summary'->>'total_overpaid_amount')::NUMERIC, 2) END
+    END,
+    item_count = CASE WHEN jsonb_typeof(result->'items') = 'array'
+        THEN jsonb_array_length(result->'items') END
+WHERE item_count IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_receipts_user_total_saved
+ON receipts (user_id, total_saved DESC);
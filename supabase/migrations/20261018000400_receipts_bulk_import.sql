@@ -0,0 +1,51 @@
+-- 端末に保存された履歴の一括取り込み（POST /receipts:bulk）
+-- client_id は端末側の履歴ID（冪等キー）。同じユーザーの同じ client_id は1回だけ取り込む
+ALTER TABLE receipts ADD COLUMN IF NOT EXISTS client_id TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS receipts_user_client_id_unique
+ON receipts (user_id, client_id) WHERE client_id IS NOT NULL;
+
+-- p_receipts: [{client_id, purchase_date, store_name, result, created_at,
+--               total_payment, total_saved, total_overpaid, item_count}, ...]
+-- receipts を1文で挿入し、client_id ごとに作成したか（created）既存だったかを返す
+-- 端末の履歴は解析時に savings_records へ記録済みで、金額もクライアントが送ったものなので、
+-- 取り込みでは savings_records（ランキング）に記録しない
+DROP FUNCTION IF EXISTS public.import_receipts(UUID, JSONB, BOOLEAN);
+CREATE OR REPLACE FUNCTION public.import_receipts(
+    p_user_id UUID,
+    p_receipts JSONB
+)
+RETURNS TABLE (client_id TEXT, id UUID, created BOOLEAN) AS $$
+    WITH input AS (
+        SELECT
+            r->>'client_id' AS client_id,
+            (r->>'purchase_date')::DATE AS purchase_date,
+            r->>'store_name' AS store_name,
+            r->'result' AS result,
+            COALESCE((r->>'created_at')::TIMESTAMPTZ, NOW()) AS created_at,
+            (r->>'total_payment')::NUMERIC AS total_payment,
+            (r->>'total_saved')::NUMERIC AS total_saved,
+            (r->>'total_overpaid')::NUMERIC AS total_overpaid,
+            (r->>'item_count')::INTEGER AS item_count
+        FROM jsonb_array_elements(p_receipts) AS r
+    ),
+    inserted AS (
+        INSERT INTO public.receipts (
+            user_id, client_id, purchase_date, store_name, result, created_at,
+            total_payment, total_saved, total_overpaid, item_count
+        )
+        SELECT
+            p_user_id, i.client_id, i.purchase_date, i.store_name, i.result, i.created_at,
+            i.total_payment, i.total_saved, i.total_overpaid, i.item_count
+        FROM input i
+        ON CONFLICT (user_id, client_id) WHERE client_id IS NOT NULL DO NOTHING
+        RETURNING receipts.id, receipts.client_id
+    )
+    -- 同じ文の中で挿入した行は receipts からは見えないため、後半は取り込み前から存在した行になる
+    SELECT ins.client_id, ins.id, TRUE FROM inserted ins
+    UNION ALL
+    SELECT r.client_id, r.id, FALSE
+    FROM public.receipts r
+    WHERE r.user_id = p_user_id
+      AND r.client_id IN (SELECT input.client_id FROM input);
+$$ LANGUAGE sql VOLATILE;
@@ -0,0 +1,51 @@
+-- ユーザーごとのデータのバージョン（ETag 用）
+-- receipts / profiles への書き込みのたびにトリガーで version を1増やす。
+-- API はこの1行だけを読んで、前回の応答から変更がなければ 304 を返す
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    scope TEXT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, scope)
+);
+
+ALTER TABLE data_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own data versions" ON data_versions
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- TG_ARGV[0]: スコープ名, TG_ARGV[1]: ユーザーIDの列名
+-- ユーザー削除の CASCADE 中は auth.users の行が見えないため、何もしない
+CREATE OR REPLACE FUNCTION public.bump_data_version()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_user_id UUID;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_user_id := (to_jsonb(OLD)->>TG_ARGV[1])::UUID;
+    ELSE
+        v_user_id := (to_jsonb(NEW)->>TG_ARGV[1])::UUID;
+    END IF;
+
+    INSERT INTO public.data_versions AS d (user_id, scope, version)
+    SELECT v_user_id, TG_ARGV[0], 1
+    WHERE EXISTS (SELECT 1 FROM auth.users u WHERE u.id = v_user_id)
+    ON CONFLICT (user_id, scope) DO UPDATE SET
+        version = d.version + 1,
+        updated_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- トリガーからだけ使う。所有者の権限で書き込むため、PostgREST（/rpc）から直接呼べないようにする
+REVOKE EXECUTE ON FUNCTION public.bump_data_version() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS trigger_receipts_data_version ON receipts;
+CREATE TRIGGER trigger_receipts_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON receipts
+    FOR EACH ROW EXECUTE FUNCTION public.bump_data_version('receipts', 'user_id');
+
+DROP TRIGGER IF EXISTS trigger_profiles_data_version ON profiles;
+CREATE TRIGGER trigger_profiles_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON profiles
+    FOR EACH ROW EXECUTE FUNCTION public.bump_data_version('profile', 'id');
@@ -0,0 +1,256 @@
+-- 支出分析（GET /analytics）
+-- receipts.result の商品を1行ずつの明細（receipt_items）に展開し、
+-- 月 × 店舗 × 商品（canonical）ごとの合計（user_spending_rollups）をトリガーで差分更新する。
+-- 分析の問い合わせは集計済みの行を読むだけなので、レシートの件数に比例して遅くならない
+
+-- 商品明細。receipts の作成・result 等の更新のたびに、そのレシートの分を作り直す
+CREATE TABLE IF NOT EXISTS receipt_items (
+    receipt_id UUID NOT NULL REFERENCES receipts(id) ON DELETE CASCADE,
+    line_no INTEGER NOT NULL,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    purchase_month DATE NOT NULL,
+    purchase_date DATE,
+    store_name TEXT NOT NULL DEFAULT '',  -- 不明は ''（集計のキーにするため NULL にしない）
+    canonical TEXT NOT NULL DEFAULT '',
+    raw_name TEXT,
+    quantity NUMERIC,
+    paid_unit_price NUMERIC,
+    spend NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    saved NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    overpaid NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    judgement TEXT,
+    PRIMARY KEY (receipt_id, line_no)
+);
+
+CREATE INDEX IF NOT EXISTS idx_receipt_items_user_month
+ON receipt_items (user_id, purchase_month);
+
+ALTER TABLE receipt_items ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own receipt items" ON receipt_items
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- ユーザー × 月 × 店舗 × 商品ごとの合計
+CREATE TABLE IF NOT EXISTS user_spending_rollups (
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    store_name TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    -- 明細の金額の合計は件数しだいで桁が増えるため、精度を制限しない（明細側で小数2桁に丸め済み）
+    spend NUMERIC NOT NULL DEFAULT 0,
+    saved NUMERIC NOT NULL DEFAULT 0,
+    overpaid NUMERIC NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, month, store_name, canonical)
+);
+
+ALTER TABLE user_spending_rollups ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own spending rollups" ON user_spending_rollups
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- JSONB の数値を NUMERIC に（数値でなければ NULL）
+CREATE OR REPLACE FUNCTION public.jsonb_numeric(p_value JSONB)
+RETURNS NUMERIC AS $$
+    SELECT CASE WHEN jsonb_typeof(p_value) = 'number' THEN (p_value #>> '{}')::NUMERIC END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 金額を小数2桁に丸める（NUMERIC(12, 2) に収まらなければ NULL。receipts の集計列と同じ扱い）
+CREATE OR REPLACE FUNCTION public.receipt_amount(p_value NUMERIC)
+RETURNS NUMERIC AS $$
+    SELECT CASE WHEN abs(round(p_value, 2)) <= 9999999999.99 THEN round(p_value, 2) END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 単価 × 個数（個数がなければ1）を金額に丸める
+-- 掛け算の前に範囲を確かめ、極端な値どうしの積で NUMERIC があふれないようにする
+CREATE OR REPLACE FUNCTION public.receipt_line_amount(p_price NUMERIC, p_quantity NUMERIC)
+RETURNS NUMERIC AS $$
+    SELECT CASE WHEN abs(p_price) <= 9999999999.99 AND abs(COALESCE(p_quantity, 1)) <= 9999999999.99
+        THEN public.receipt_amount(p_price * COALESCE(p_quantity, 1)) END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- レシート1件分の明細行
+-- 支出 = 単価 × 個数（個数がなければ1）、節約額・過払い額は summary と同じく DEAL / OVERPAY の |diff|
+-- 金額が spend / saved / overpaid（NUMERIC(12, 2)）に収まらない明細は 0 として扱い、レシートの書き込みを失敗させない
+CREATE OR REPLACE FUNCTION public.receipt_item_rows(p_receipt receipts)
+RETURNS SETOF receipt_items AS $$
+    SELECT
+        p_receipt.id,
+        e.ord::INTEGER,
+        p_receipt.user_id,
+        date_trunc('month', COALESCE(
+            p_receipt.purchase_date,
+            (COALESCE(p_receipt.created_at, NOW()) AT TIME ZONE 'Asia/Tokyo')::DATE
+        ))::DATE,
+        p_receipt.purchase_date,
+        COALESCE(p_receipt.store_name, ''),
+        COALESCE(e.item->>'canonical', ''),
+        e.item->>'raw_name',
+        public.jsonb_numeric(e.item->'quantity'),
+        public.jsonb_numeric(e.item->'paid_unit_price'),
+        COALESCE(
+            public.receipt_line_amount(
+                public.jsonb_numeric(e.item->'paid_unit_price'),
+                public.jsonb_numeric(e.item->'quantity')
+            ),
+            0
+        ),
+        CASE WHEN e.item->'estat'->>'judgement' = 'DEAL'
+            THEN COALESCE(public.receipt_amount(ABS(public.jsonb_numeric(e.item->'estat'->'diff'))), 0) ELSE 0 END,
+        CASE WHEN e.item->'estat'->>'judgement' = 'OVERPAY'
+            THEN COALESCE(public.receipt_amount(ABS(public.jsonb_numeric(e.item->'estat'->'diff'))), 0) ELSE 0 END,
+        e.item->'estat'->>'judgement'
+    FROM jsonb_array_elements(
+        CASE WHEN jsonb_typeof(p_receipt.result->'items') = 'array'
+            THEN p_receipt.result->'items' ELSE '[]'::JSONB END
+    ) WITH ORDINALITY AS e(item, ord)
+    WHERE jsonb_typeof(e.item) = 'object';
+$$ LANGUAGE sql STABLE;
+
+-- レシートの作成・更新のたびに、そのレシートの明細を作り直す
+CREATE OR REPLACE FUNCTION public.sync_receipt_items()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        DELETE FROM public.receipt_items WHERE receipt_id = OLD.id;
+    END IF;
+    INSERT INTO public.receipt_items SELECT * FROM public.receipt_item_rows(NEW);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- トリガーからだけ使う。所有者の権限で書き込むため、PostgREST（/rpc）から直接呼べないようにする
+REVOKE EXECUTE ON FUNCTION public.sync_receipt_items() FROM PUBLIC, anon, authenticated;
+
+-- 削除は receipt_items の ON DELETE CASCADE に任せる
+DROP TRIGGER IF EXISTS trigger_sync_receipt_items ON receipts;
+CREATE TRIGGER trigger_sync_receipt_items
+    AFTER INSERT OR UPDATE OF user_id, purchase_date, store_name, result ON receipts
+    FOR EACH ROW EXECUTE FUNCTION public.sync_receipt_items();
+
+-- 明細の増減を、文ごとにまとめて（GROUP BY してから）集計へ加算する
+-- 一括取り込みで数千明細が入っても、集計の行ごとに1回の更新で済む
+CREATE OR REPLACE FUNCTION public.apply_receipt_items_rollup()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.user_spending_rollups AS r
+            (user_id, month, store_name, canonical, spend, saved, overpaid, item_count)
+        SELECT user_id, purchase_month, store_name, canonical,
+               SUM(spend), SUM(saved), SUM(overpaid), COUNT(*)
+        FROM new_items
+        GROUP BY user_id, purchase_month, store_name, canonical
+        ON CONFLICT (user_id, month, store_name, canonical) DO UPDATE SET
+            spend = r.spend + EXCLUDED.spend,
+            saved = r.saved + EXCLUDED.saved,
+            overpaid = r.overpaid + EXCLUDED.overpaid,
+            item_count = r.item_count + EXCLUDED.item_count,
+            updated_at = NOW();
+    ELSE
+        UPDATE public.user_spending_rollups AS r SET
+            spend = r.spend - d.spend,
+            saved = r.saved - d.saved,
+            overpaid = r.overpaid - d.overpaid,
+            item_count = r.item_count - d.item_count,
+            updated_at = NOW()
+        FROM (
+            SELECT user_id, purchase_month, store_name, canonical,
+                   SUM(spend) AS spend, SUM(saved) AS saved, SUM(overpaid) AS overpaid,
+                   COUNT(*) AS item_count
+            FROM old_items
+            GROUP BY user_id, purchase_month, store_name, canonical
+        ) AS d
+        WHERE r.user_id = d.user_id AND r.month = d.purchase_month
+          AND r.store_name = d.store_name AND r.canonical = d.canonical;
+
+        DELETE FROM public.user_spending_rollups r
+        USING (SELECT DISTINCT user_id, purchase_month, store_name, canonical FROM old_items) AS d
+        WHERE r.user_id = d.user_id AND r.month = d.purchase_month
+          AND r.store_name = d.store_name AND r.canonical = d.canonical
+          AND r.item_count <= 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.apply_receipt_items_rollup() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS trigger_receipt_items_rollup_insert ON receipt_items;
+CREATE TRIGGER trigger_receipt_items_rollup_insert
+    AFTER INSERT ON receipt_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_receipt_items_rollup();
+
+DROP TRIGGER IF EXISTS trigger_receipt_items_rollup_delete ON receipt_items;
+CREATE TRIGGER trigger_receipt_items_rollup_delete
+    AFTER DELETE ON receipt_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_receipt_items_rollup();
+
+-- 既存のレシートから明細を作成（集計は上のトリガーで作られる）
+INSERT INTO receipt_items
+SELECT i.*
+FROM receipts r
+CROSS JOIN LATERAL public.receipt_item_rows(r) AS i
+WHERE NOT EXISTS (SELECT 1 FROM receipt_items x WHERE x.receipt_id = r.id);
+
+-- p_group_by: month=月別, store=店舗別, item=商品（canonical）別
+-- p_from / p_to は月の範囲（日付を含む月で絞り込む。NULL は制限なし）
+-- 月別は月の昇順、店舗別・商品別は支出の降順で p_limit 件まで返し、最後に期間全体の合計（is_total）を返す
+CREATE OR REPLACE FUNCTION public.get_spending_analytics(
+    p_user_id UUID,
+    p_group_by TEXT DEFAULT 'month',
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL,
+    p_limit INTEGER DEFAULT 50
+)
+RETURNS TABLE (
+    key TEXT,
+    spend NUMERIC,
+    saved NUMERIC,
+    overpaid NUMERIC,
+    item_count BIGINT,
+    is_total BOOLEAN
+) AS $$
+    WITH scoped AS (
+        SELECT
+            CASE p_group_by
+                WHEN 'store' THEN r.store_name
+                WHEN 'item' THEN r.canonical
+                ELSE to_char(r.month, 'YYYY-MM')
+            END AS key,
+            r.spend, r.saved, r.overpaid, r.item_count
+        FROM public.user_spending_rollups r
+        WHERE r.user_id = p_user_id
+          AND (p_from IS NULL OR r.month >= date_trunc('month', p_from)::DATE)
+          AND (p_to IS NULL OR r.month <= date_trunc('month', p_to)::DATE)
+    ),
+    grouped AS (
+        SELECT scoped.key, SUM(scoped.spend) AS spend, SUM(scoped.saved) AS saved,
+               SUM(scoped.overpaid) AS overpaid, SUM(scoped.item_count)::BIGINT AS item_count
+        FROM scoped
+        GROUP BY scoped.key
+    ),
+    buckets AS (
+        SELECT grouped.*, ROW_NUMBER() OVER (
+            ORDER BY
+                CASE WHEN p_group_by = 'month' THEN grouped.key END,
+                grouped.spend DESC,
+                grouped.key
+        ) AS ord
+        FROM grouped
+    )
+    SELECT t.key, t.spend, t.saved, t.overpaid, t.item_count, t.is_total
+    FROM (
+        SELECT buckets.key, buckets.spend, buckets.saved, buckets.overpaid, buckets.item_count,
+               FALSE AS is_total, buckets.ord
+        FROM buckets
+        WHERE buckets.ord <= p_limit
+        UNION ALL
+        SELECT NULL, COALESCE(SUM(scoped.spend), 0), COALESCE(SUM(scoped.saved), 0),
+               COALESCE(SUM(scoped.overpaid), 0), COALESCE(SUM(scoped.item_count), 0)::BIGINT, TRUE, NULL
+        FROM scoped
+    ) AS t
+    ORDER BY t.is_total, t.ord;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,192 @@
+-- ユーザーごとの商品（canonical）の価格履歴
+-- 最安値とその店舗、前回の価格、指数移動平均（EWMA）を (user_id, canonical) ごとに1行で持つ。
+-- receipt_items の増減（レシートの作成・更新・削除）のたびに、変わった商品の行だけを作り直すため、
+-- 解析時の参照は主キーでの1行読みで済み、履歴が何年分あっても遅くならない
+
+CREATE TABLE IF NOT EXISTS user_item_prices (
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    canonical TEXT NOT NULL,
+    purchase_count INTEGER NOT NULL,
+    min_price NUMERIC(12, 2) NOT NULL,
+    min_store_name TEXT,
+    min_purchase_date DATE,
+    last_price NUMERIC(12, 2) NOT NULL,
+    last_store_name TEXT,
+    last_purchase_date DATE,
+    ewma_price NUMERIC(12, 2) NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, canonical)
+);
+
+ALTER TABLE user_item_prices ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own item prices" ON user_item_prices
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- 商品1つ分の明細を読むための索引（作り直しで使う）
+CREATE INDEX IF NOT EXISTS idx_receipt_items_user_canonical
+ON receipt_items (user_id, canonical);
+
+-- 価格の指数移動平均。最初の値から始め、新しい価格ほど重く（alpha = 0.3）扱う
+CREATE OR REPLACE FUNCTION public.price_ewma_step(p_state NUMERIC, p_price NUMERIC)
+RETURNS NUMERIC AS $$
+    SELECT CASE
+        WHEN p_price IS NULL THEN p_state
+        WHEN p_state IS NULL THEN p_price
+        ELSE 0.3 * p_price + 0.7 * p_state
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE AGGREGATE public.price_ewma(NUMERIC) (
+    SFUNC = public.price_ewma_step,
+    STYPE = NUMERIC
+);
+
+-- 指定した (user_id, canonical) の行を receipt_items から作り直す
+-- 購入日（なければレシートの作成日）の順に並べ、支払単価のない明細と、
+-- 単価が金額の列（NUMERIC(12, 2)）に収まらない明細は数えない（receipt_amount が NULL）
+-- ユーザー削除の CASCADE 中は auth.users の行が見えないため、作り直さない
+-- p_lock_keys = FALSE は、呼び出し側が receipt_items をテーブルごとロックしている場合（移行時の一括作成）
+CREATE OR REPLACE FUNCTION public.refresh_user_item_prices(
+    p_user_ids UUID[],
+    p_canonicals TEXT[],
+    p_lock_keys BOOLEAN DEFAULT TRUE
+)
+RETURNS VOID AS $$
+DECLARE
+    v_key INTEGER;
+BEGIN
+    -- 同じ商品を作り直すトランザクションどうしを直列にする。ロックを待った後の文は相手のコミット後の
+    -- 明細を読むため、古い明細から作った行で上書きされない。デッドロックしないよう、キーの順にロックする
+    IF p_lock_keys THEN
+        FOR v_key IN
+            SELECT DISTINCT hashtext(t.user_id::text || t.canonical)
+            FROM unnest(p_user_ids, p_canonicals) AS t(user_id, canonical)
+            WHERE t.canonical <> ''
+            ORDER BY 1
+        LOOP
+            PERFORM pg_advisory_xact_lock(v_key);
+        END LOOP;
+    END IF;
+
+    WITH touched AS (
+        SELECT DISTINCT t.user_id, t.canonical
+        FROM unnest(p_user_ids, p_canonicals) AS t(user_id, canonical)
+        WHERE t.canonical <> ''
+          AND EXISTS (SELECT 1 FROM auth.users u WHERE u.id = t.user_id)
+    ),
+    series AS (
+        SELECT
+            i.user_id,
+            i.canonical,
+            public.receipt_amount(i.paid_unit_price) AS price,
+            NULLIF(i.store_name, '') AS store_name,
+            COALESCE(i.purchase_date, (r.created_at AT TIME ZONE 'Asia/Tokyo')::DATE) AS purchased_on,
+            r.created_at,
+            i.receipt_id,
+            i.line_no
+        FROM touched t
+        JOIN public.receipt_items i ON i.user_id = t.user_id AND i.canonical = t.canonical
+        JOIN public.receipts r ON r.id = i.receipt_id
+        WHERE public.receipt_amount(i.paid_unit_price) > 0
+    )
+    INSERT INTO public.user_item_prices AS p (
+        user_id, canonical, purchase_count,
+        min_price, min_store_name, min_purchase_date,
+        last_price, last_store_name, last_purchase_date,
+        ewma_price
+    )
+    SELECT
+        s.user_id,
+        s.canonical,
+        COUNT(*),
+        MIN(s.price),
+        -- 同じ最安値が複数あれば、新しい方の店舗・日付
+        (array_agg(s.store_name ORDER BY s.price, s.purchased_on DESC, s.created_at DESC))[1],
+        (array_agg(s.purchased_on ORDER BY s.price, s.purchased_on DESC, s.created_at DESC))[1],
+        (array_agg(s.price ORDER BY s.purchased_on DESC, s.created_at DESC, s.line_no DESC))[1],
+        (array_agg(s.store_name ORDER BY s.purchased_on DESC, s.created_at DESC, s.line_no DESC))[1],
+        MAX(s.purchased_on),
+        public.price_ewma(s.price ORDER BY s.purchased_on, s.created_at, s.receipt_id, s.line_no)
+    FROM series s
+    GROUP BY s.user_id, s.canonical
+    ON CONFLICT (user_id, canonical) DO UPDATE SET
+        purchase_count = EXCLUDED.purchase_count,
+        min_price = EXCLUDED.min_price,
+        min_store_name = EXCLUDED.min_store_name,
+        min_purchase_date = EXCLUDED.min_purchase_date,
+        last_price = EXCLUDED.last_price,
+        last_store_name = EXCLUDED.last_store_name,
+        last_purchase_date = EXCLUDED.last_purchase_date,
+        ewma_price = EXCLUDED.ewma_price,
+        updated_at = NOW();
+
+    -- 明細がなくなった商品の行を消す
+    DELETE FROM public.user_item_prices p
+    USING unnest(p_user_ids, p_canonicals) AS t(user_id, canonical)
+    WHERE p.user_id = t.user_id AND p.canonical = t.canonical
+      AND NOT EXISTS (
+          SELECT 1 FROM public.receipt_items i
+          WHERE i.user_id = t.user_id AND i.canonical = t.canonical
+            AND public.receipt_amount(i.paid_unit_price) > 0
+      );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- トリガーからだけ使う。所有者の権限で書き込むため、PostgREST（/rpc）から直接呼べないようにする
+REVOKE EXECUTE ON FUNCTION public.refresh_user_item_prices(UUID[], TEXT[], BOOLEAN) FROM PUBLIC, anon, authenticated;
+
+-- 明細の増減を、文ごとに（変わった商品をまとめて）反映する
+CREATE OR REPLACE FUNCTION public.sync_user_item_prices()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_user_ids UUID[];
+    v_canonicals TEXT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(k.user_id), array_agg(k.canonical) INTO v_user_ids, v_canonicals
+        FROM (SELECT DISTINCT user_id, canonical FROM new_items WHERE canonical <> '') AS k;
+    ELSE
+        SELECT array_agg(k.user_id), array_agg(k.canonical) INTO v_user_ids, v_canonicals
+        FROM (SELECT DISTINCT user_id, canonical FROM old_items WHERE canonical <> '') AS k;
+    END IF;
+
+    IF v_user_ids IS NOT NULL THEN
+        PERFORM public.refresh_user_item_prices(v_user_ids, v_canonicals);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION public.sync_user_item_prices() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS trigger_user_item_prices_insert ON receipt_items;
+CREATE TRIGGER trigger_user_item_prices_insert
+    AFTER INSERT ON receipt_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION public.sync_user_item_prices();
+
+DROP TRIGGER IF EXISTS trigger_user_item_prices_delete ON receipt_items;
+CREATE TRIGGER trigger_user_item_prices_delete
+    AFTER DELETE ON receipt_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE FUNCTION public.sync_user_item_prices();
+
+-- 既存の明細から作成
+-- 全商品分のキーごとのロックは共有メモリのロック表に収まらないことがあるため、
+-- 作成中は明細の書き込みをテーブルごと止め、キーごとのロックは取らない
+DO $$
+DECLARE
+    v_user_ids UUID[];
+    v_canonicals TEXT[];
+BEGIN
+    LOCK TABLE public.receipt_items IN SHARE MODE;
+
+    SELECT array_agg(k.user_id), array_agg(k.canonical) INTO v_user_ids, v_canonicals
+    FROM (SELECT DISTINCT user_id, canonical FROM receipt_items WHERE canonical <> '') AS k;
+
+    IF v_user_ids IS NOT NULL THEN
+        PERFORM public.refresh_user_item_prices(v_user_ids, v_canonicals, FALSE);
+    END IF;
+END;
+$$;
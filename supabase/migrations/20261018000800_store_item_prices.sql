@@ -0,0 +1,82 @@
+-- 全ユーザーの解析結果から集めた、店舗 × 商品の実売価格（GET /prices/observed）
+-- store_name = '' は全店舗の集計。centroids は分位点スケッチの重心 [[平均, 重み], ...]（平均の昇順）
+-- API の各ワーカーが前回からの差分を merge_store_item_prices で定期的に併合する
+CREATE TABLE IF NOT EXISTS store_item_prices (
+    store_name TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    observation_count BIGINT NOT NULL DEFAULT 0,
+    price_sum NUMERIC(16, 2) NOT NULL DEFAULT 0,
+    min_price NUMERIC(12, 2),
+    max_price NUMERIC(12, 2),
+    centroids JSONB NOT NULL DEFAULT '[]'::JSONB,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (store_name, canonical)
+);
+
+-- 商品ごとの一覧（観測数の多い順）
+CREATE INDEX IF NOT EXISTS idx_store_item_prices_canonical
+ON store_item_prices (canonical, observation_count DESC);
+
+-- 個々のユーザーの購入は含まれないが、読み取りは API（service role）経由に限る
+ALTER TABLE store_item_prices ENABLE ROW LEVEL SECURITY;
+
+-- 重心の併合（backend/services/price_digest.py と同じ規則）
+-- 累積分位 q の中央を k(q) = compression / π × (asin(2q − 1) + π/2) で写し、整数部が同じ重心をまとめる
+CREATE OR REPLACE FUNCTION public.compress_price_centroids(p_centroids JSONB, p_compression INTEGER)
+RETURNS JSONB AS $$
+    WITH c AS (
+        SELECT (e->>0)::FLOAT8 AS mean, (e->>1)::FLOAT8 AS weight
+        FROM jsonb_array_elements(p_centroids) AS e
+        WHERE jsonb_typeof(e) = 'array' AND (e->>1)::FLOAT8 > 0
+    ),
+    positioned AS (
+        SELECT
+            c.mean,
+            c.weight,
+            SUM(c.weight) OVER (ORDER BY c.mean ROWS UNBOUNDED PRECEDING) - c.weight / 2 AS mid,
+            SUM(c.weight) OVER () AS total
+        FROM c
+    ),
+    bucketed AS (
+        SELECT
+            p.mean,
+            p.weight,
+            floor(p_compression / pi() * (asin(LEAST(GREATEST(2 * p.mid / p.total - 1, -1), 1)) + pi() / 2)) AS k
+        FROM positioned p
+    ),
+    merged AS (
+        SELECT SUM(b.mean * b.weight) / SUM(b.weight) AS mean, SUM(b.weight) AS weight
+        FROM bucketed b
+        GROUP BY b.k
+    )
+    SELECT COALESCE(
+        jsonb_agg(jsonb_build_array(round(m.mean::NUMERIC, 4), m.weight) ORDER BY m.mean),
+        '[]'::JSONB
+    )
+    FROM merged m;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- p_rows: [{store_name, canonical, count, sum, min, max, centroids}, ...]（キーの重複なし）
+CREATE OR REPLACE FUNCTION public.merge_store_item_prices(p_rows JSONB, p_compression INTEGER DEFAULT 100)
+RETURNS VOID AS $$
+    INSERT INTO public.store_item_prices AS s (
+        store_name, canonical, observation_count, price_sum, min_price, max_price, centroids
+    )
+    SELECT
+        r->>'store_name',
+        r->>'canonical',
+        (r->>'count')::BIGINT,
+        (r->>'sum')::NUMERIC,
+        (r->>'min')::NUMERIC,
+        (r->>'max')::NUMERIC,
+        public.compress_price_centroids(r->'centroids', p_compression)
+    FROM jsonb_array_elements(p_rows) AS r
+    WHERE r->>'canonical' <> '' AND (r->>'count')::BIGINT > 0
+    ON CONFLICT (store_name, canonical) DO UPDATE SET
+        observation_count = s.observation_count + EXCLUDED.observation_count,
+        price_sum = s.price_sum + EXCLUDED.price_sum,
+        min_price = LEAST(s.min_price, EXCLUDED.min_price),
+        max_price = GREATEST(s.max_price, EXCLUDED.max_price),
+        centroids = public.compress_price_centroids(s.centroids || EXCLUDED.centroids, p_compression),
+        updated_at = NOW();
+$$ LANGUAGE sql VOLATILE;